@@ -1,44 +1,113 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import os
+import time
+import asyncio
 import tempfile
 import json
+from dataclasses import asdict
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Sequence
 
-from app.services.ai_analyzer import AIAnalyzer
+from app.services.ai_analyzer import AIAnalyzer, current_ai_model
 from app.services.vulnerability_detector import VulnerabilityDetector
 from app.services.solidity_parser import SolidityParser
+from app.services.finding_merger import FindingMerger
+from app.services.history_store import AnalysisHistoryStore
+from app.services.similarity_index import ContractSimilarityIndex
+from app.services.library_index import KnownLibraryIndex
+from app.services.single_flight import AnalysisCoalescer
+from app.services.contract_units import ContractUnitAnalyzer
+from app.services.token_budget import TokenUsage, current_token_usage
+from app.services.triage import TriageGate, ROUTE_PATTERN_ONLY, ROUTE_LIGHT
+from app.services.model_router import RoutingContext, current_model_routing
+from app.services.editor_session import EditorSession, EditorSessionManager
+from app.services.request_profiler import (
+    RequestProfiler,
+    current_profiler,
+    merge_rule_stats,
+    profile_path,
+    profile_stage
+)
+from app.utils.source_diff import map_unchanged_lines
+from app.utils.source_buffer import SourceBuffer
 from app.models.schemas import (
+    AnalysisRequest,
+    EditorSessionRequest,
+    EditorChangeRequest,
+    EditorSessionResponse,
     AnalysisResponse, 
     VulnerabilityReport, 
     HealthResponse,
-    ContractInfo
+    ContractInfo,
+    TriageReport,
+    ModelLatencyReport,
+    VulnerabilityStats,
+    FindingsPage,
+    ComparisonResponse
 )
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="Smart Contract AI Auditor",
-    description="AI-powered smart contract vulnerability detection and analysis",
-    version="1.0.0"
-)
+router = APIRouter()
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def create_app() -> FastAPI:
+    """
+    Application factory. Services and rule tables below are built at import,
+    so a preforking runner can import this module once and share them with workers.
+    """
+    app = FastAPI(
+        title="Smart Contract AI Auditor",
+        description="AI-powered smart contract vulnerability detection and analysis",
+        version="1.0.0"
+    )
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    app.include_router(router)
+    app.add_event_handler("shutdown", contract_unit_analyzer.shutdown)
+    app.add_event_handler("shutdown", editor_sessions.shutdown)
+    return app
 
 # Initialize services
 ai_analyzer = AIAnalyzer()
 vulnerability_detector = VulnerabilityDetector()
 solidity_parser = SolidityParser()
+finding_merger = FindingMerger()
+history_store = AnalysisHistoryStore()
+similarity_index = ContractSimilarityIndex()
+library_index = KnownLibraryIndex()
+contract_unit_analyzer = ContractUnitAnalyzer(solidity_parser, vulnerability_detector)
+triage_gate = TriageGate(solidity_parser)
+editor_sessions = EditorSessionManager(
+    vulnerability_detector,
+    solidity_parser,
+    reviewer=lambda source, filename: review_editor_source(source, filename)
+)
+analysis_coalescer = AnalysisCoalescer(
+    serialize=lambda result: result.model_dump_json(),
+    deserialize=AnalysisResponse.model_validate_json
+)
+
+# Minimum estimated similarity for reusing a near-duplicate's AI findings
+REUSE_SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.8"))
+
+# Most functions given their own focused AI pass in deep analysis
+DEEP_ANALYSIS_MAX_FUNCTIONS = int(os.getenv("DEEP_ANALYSIS_MAX_FUNCTIONS", "20"))
+
+MAX_CONTRACT_SIZE = 50 * 1024 * 1024  # 50MB limit
+
+# Whether clients may ask for a request to be profiled
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "false").lower() == "true"
 
-@app.get("/", response_model=dict)
+@router.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information"""
     return {
@@ -48,11 +117,18 @@ async def root():
         "endpoints": {
             "health": "/health",
             "analyze": "/analyze",
+            "analyze_code": "/analyze/code",
+            "analyze_stream": "/analyze/stream",
+            "editor_sessions": "/editor/sessions",
+            "compare": "/compare",
+            "profiles": "/profiles/{profile_id}",
+            "stats": "/stats",
+            "history_export": "/history/export",
             "sample_contracts": "/sample-contracts"
         }
     }
 
-@app.get("/health", response_model=HealthResponse)
+@router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     return HealthResponse(
@@ -65,65 +141,518 @@ async def health_check():
         }
     )
 
-@app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_contract(file: UploadFile = File(...)):
+@router.post("/analyze", response_model=AnalysisResponse)
+async def analyze_contract(
+    response: Response,
+    file: UploadFile = File(...),
+    analysisType: str = Form("comprehensive", pattern="^(quick|comprehensive|deep)$"),
+    includeGasAnalysis: bool = Form(True),
+    includeBusinessLogic: bool = Form(True),
+    profile: bool = Query(False, description="Profile this request (requires REQUEST_PROFILING)"),
+    x_profile: Optional[str] = Header(None)
+):
     """
     Analyze uploaded smart contract for vulnerabilities
     """
     try:
-        # Validate file type
-        if not file.filename.endswith(('.sol', '.vy')):
-            raise HTTPException(
-                status_code=400, 
-                detail="Only Solidity (.sol) and Vyper (.vy) files are supported"
-            )
+        validate_contract_filename(file.filename)
         
         # Read file content
         content = await file.read()
-        if len(content) > 50 * 1024 * 1024:  # 50MB limit
-            raise HTTPException(
-                status_code=413,
-                detail="File too large. Maximum size is 50MB"
-            )
+        validate_contract_size(len(content))
         
-        contract_code = content.decode('utf-8')
+        source = SourceBuffer.from_bytes(content, file.filename)
         
-        # Parse contract
-        contract_info = solidity_parser.parse_contract(contract_code, file.filename)
+        return await run_requested_analysis(
+            source,
+            file.filename,
+            analysisType,
+            excluded_finding_types(includeGasAnalysis, includeBusinessLogic),
+            create_profiler(response, profile, x_profile)
+        )
         
+    except HTTPException:
+        raise
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid file encoding. Please upload a valid text file."
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Analysis failed: {str(e)}"
+        )
+
+@router.post("/analyze/code", response_model=AnalysisResponse)
+async def analyze_contract_code(
+    request: AnalysisRequest,
+    response: Response,
+    profile: bool = Query(False, description="Profile this request (requires REQUEST_PROFILING)"),
+    x_profile: Optional[str] = Header(None)
+):
+    """
+    Analyze contract source sent as JSON, for editor and CI integrations
+    """
+    try:
+        validate_contract_filename(request.filename)
+        validate_contract_size(len(request.contractCode))
+        
+        return await run_requested_analysis(
+            SourceBuffer(request.contractCode, request.filename),
+            request.filename,
+            request.analysisType,
+            excluded_finding_types(request.includeGasAnalysis, request.includeBusinessLogic),
+            create_profiler(response, profile, x_profile)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Analysis failed: {str(e)}"
+        )
+
+@router.post("/analyze/stream")
+async def analyze_contract_stream(
+    file: UploadFile = File(...),
+    analysisType: str = Form("comprehensive", pattern="^(quick|comprehensive|deep)$"),
+    includeGasAnalysis: bool = Form(True),
+    includeBusinessLogic: bool = Form(True)
+):
+    """
+    Analyze an uploaded contract, streaming NDJSON events: each finding as
+    soon as it is known, then the full analysis result
+    """
+    validate_contract_filename(file.filename)
+    content = await file.read()
+    validate_contract_size(len(content))
+    
+    try:
+        source = SourceBuffer.from_bytes(content, file.filename)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid file encoding. Please upload a valid text file."
+        )
+    
+    exclude_types = excluded_finding_types(includeGasAnalysis, includeBusinessLogic)
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_vulnerability(vuln: VulnerabilityReport) -> None:
+        events.put_nowait({"event": "vulnerability", "data": vuln.model_dump(mode="json")})
+    
+    async def produce() -> None:
+        try:
+            # Streams are per client, so they bypass request coalescing
+            result = await run_analysis_pipeline(source, file.filename, analysisType, exclude_types, on_vulnerability)
+            events.put_nowait({"event": "result", "data": result.model_dump(mode="json")})
+        except Exception as e:
+            events.put_nowait({"event": "error", "data": {"detail": f"Analysis failed: {str(e)}"}})
+        finally:
+            events.put_nowait(None)
+    
+    async def stream_events():
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield json.dumps(event, separators=(',', ':')) + "\n"
+        finally:
+            # Stop the analysis if the client goes away
+            producer.cancel()
+    
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+@router.post("/editor/sessions", response_model=EditorSessionResponse)
+async def open_editor_session(request: EditorSessionRequest):
+    """
+    Open a long-lived session on a document being edited. Send edits to
+    /editor/sessions/{id}/changes for incremental pattern diagnostics; an AI
+    review runs once the document stops changing.
+    """
+    validate_contract_filename(request.filename)
+    validate_contract_size(len(request.contractCode))
+    session = editor_sessions.open(request.filename, request.contractCode, request.review)
+    return editor_session_response(session)
+
+@router.post("/editor/sessions/{session_id}/changes", response_model=EditorSessionResponse)
+async def change_editor_session(session_id: str, request: EditorChangeRequest):
+    """Apply text edits (zero-based line/character ranges) and return the updated diagnostics"""
+    session = editor_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Editor session not found")
+    if request.version <= session.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Stale document version {request.version}; session is at version {session.version}"
+        )
+    return editor_session_response(editor_sessions.edit(session, request.version, request.changes))
+
+@router.get("/editor/sessions/{session_id}", response_model=EditorSessionResponse)
+async def get_editor_session(session_id: str):
+    """Current diagnostics of a session, with the AI review once it has finished"""
+    session = editor_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Editor session not found")
+    return editor_session_response(session)
+
+@router.delete("/editor/sessions/{session_id}")
+async def close_editor_session(session_id: str):
+    """Close a session and cancel its pending AI review"""
+    if not editor_sessions.close(session_id):
+        raise HTTPException(status_code=404, detail="Editor session not found")
+    return {"closed": session_id}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|pstats)$")):
+    """
+    Download a stored request profile: the JSON summary, or the raw pstats
+    file for snakeviz or python -m pstats
+    """
+    path = profile_path(profile_id, "json" if format == "json" else "prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if format == "json":
+        return FileResponse(path, media_type="application/json")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+def create_profiler(response: Response, query_flag: bool, header_flag: Optional[str]) -> Optional[RequestProfiler]:
+    """Profiler for a request that asked for one, exposing its id in the X-Profile-Id header"""
+    requested = query_flag or (header_flag or "").lower() in ("1", "true", "yes")
+    if not (requested and REQUEST_PROFILING):
+        return None
+    
+    profiler = RequestProfiler()
+    response.headers["X-Profile-Id"] = profiler.profile_id
+    return profiler
+
+def editor_session_response(session: EditorSession) -> EditorSessionResponse:
+    return EditorSessionResponse(
+        sessionId=session.id,
+        version=session.version,
+        diagnostics=session.diagnostics(),
+        incremental=session.incremental,
+        reindexedFunctions=session.reindexed_functions,
+        elapsedMs=round(session.elapsed_ms, 2),
+        reviewStatus=session.review_status,
+        reviewVersion=session.review_version,
+        aiFindings=session.ai_findings
+    )
+
+async def review_editor_source(source: SourceBuffer, filename: str) -> List[VulnerabilityReport]:
+    """AI review of an editor session's document, run once it has been idle"""
+    contract_info = solidity_parser.parse_contract(source, filename)
+    current_model_routing.set(RoutingContext(complexity=contract_info.complexity))
+    ai_analysis = await ai_analyzer.analyze_contract(source, filename, contract_info)
+    return ai_analysis['vulnerabilities']
+
+def validate_contract_filename(filename: str) -> None:
+    """Reject unsupported file types"""
+    if not filename.endswith(('.sol', '.vy')):
+        raise HTTPException(
+            status_code=400, 
+            detail="Only Solidity (.sol) and Vyper (.vy) files are supported"
+        )
+
+def validate_contract_size(size: int) -> None:
+    """Reject contracts over the size limit"""
+    if size > MAX_CONTRACT_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail="File too large. Maximum size is 50MB"
+        )
+
+def excluded_finding_types(include_gas_analysis: bool, include_business_logic: bool) -> List[str]:
+    """Finding categories left out of the analysis, as FindingMerger type keys"""
+    excluded = []
+    if not include_gas_analysis:
+        excluded.append("gas")
+    if not include_business_logic:
+        excluded.append("logic_error")
+    return excluded
+
+async def run_requested_analysis(source: SourceBuffer, filename: str, analysis_type: str,
+                                 exclude_types: Sequence[str],
+                                 profiler: Optional[RequestProfiler] = None) -> AnalysisResponse:
+    """Run the requested analysis tier"""
+    if profiler is not None:
+        # Profiled requests run on their own so the profile covers the real work
+        current_profiler.set(profiler)
+        profiler.start()
+        try:
+            return await run_analysis_pipeline(source, filename, analysis_type, exclude_types)
+        finally:
+            profiler.stop()
+            try:
+                profiler.save()
+            except Exception as e:
+                print(f"Profile save error: {str(e)}")
+    
+    # Quick analysis is cheap enough that coalescing would only add overhead
+    if analysis_type == "quick":
+        return await run_analysis_pipeline(source, filename, analysis_type, exclude_types)
+    
+    # Identical concurrent requests attach to a single running analysis
+    return await analysis_coalescer.run(
+        f"{source.content_hash}:{filename}:{analysis_type}:{','.join(exclude_types)}",
+        lambda: run_analysis_pipeline(source, filename, analysis_type, exclude_types)
+    )
+
+async def run_analysis_pipeline(source: SourceBuffer, filename: str, analysis_type: str = "comprehensive",
+                                exclude_types: Sequence[str] = (),
+                                on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None) -> AnalysisResponse:
+    """
+    Full analysis pipeline: parse, AI analysis, pattern detection, merge and persist.
+    Quick analysis is pattern-only and is not persisted; deep analysis adds
+    focused AI passes over each externally callable, state-changing function.
+    on_vulnerability receives pattern findings, then AI findings as they
+    stream in, before duplicates are merged.
+    """
+    started = time.perf_counter()
+
+    # AI calls for this request record here, including spawned fix and per-contract
+    # tasks, which copy the context. Each request runs in its own task.
+    token_usage = TokenUsage()
+    current_token_usage.set(token_usage)
+    profiler = current_profiler.get()
+
+    # Parse contract
+    with profile_stage("parse"):
+        contract_info = solidity_parser.parse_contract(source, filename)
+
+    # Vetted library code (e.g. flattened OpenZeppelin) is excluded from scans and prompts
+    with profile_stage("known_libraries"):
+        known_libraries = library_index.find_known_libraries(source)
+        analysis_code = library_index.mask_known_libraries(source, known_libraries)
+
+    # Per-contract parsing and pattern detection, in worker processes for large files
+    with profile_stage("pattern_detection"):
+        unit_analysis = await contract_unit_analyzer.analyze(
+            source, analysis_code, contract_info, known_libraries, profile_rules=profiler is not None
+        )
+        contracts = [ContractInfo(**info) for info in unit_analysis.contracts]
+    if profiler is not None:
+        merge_rule_stats(profiler.rule_stats, unit_analysis.rule_stats)
+
+    # Pattern-based findings from the per-contract scan
+    pattern_vulnerabilities = vulnerability_detector.build_reports(unit_analysis.vulnerabilities)
+    if on_vulnerability:
+        for vuln in pattern_vulnerabilities:
+            if finding_merger.normalize_type(vuln.type) not in exclude_types:
+                on_vulnerability(vuln)
+
+    # AI calls are routed per prompt type; contracts with severe pattern findings and
+    # deep analyses keep the primary model for everything but the light prompts
+    model_routing = RoutingContext(
+        complexity=contract_info.complexity,
+        high_risk=analysis_type == "deep" or any(
+            vuln.severity.upper() in ("CRITICAL", "HIGH") for vuln in pattern_vulnerabilities
+        )
+    )
+    current_model_routing.set(model_routing)
+
+    # Comprehensive analyses of low-signal contracts skip the AI or use a cheaper model;
+    # deep analysis is an explicit request for the full review
+    triage = None
+    signature = None
+    if analysis_type == "comprehensive":
+        with profile_stage("triage"):
+            triage = triage_gate.assess(
+                analysis_code, contract_info.complexity, unit_analysis.vulnerabilities, ai_analyzer.model
+            )
+        if triage.route == ROUTE_LIGHT:
+            current_ai_model.set(triage.model)
+        model_routing.high_risk |= triage.score >= triage_gate.full_at
+
+    if analysis_type == "quick" or (triage and triage.route == ROUTE_PATTERN_ONLY):
+        ai_analysis = {
+            "vulnerabilities": [],
+            "insights": [],
+            "fixes": [],
+            "analysis_metadata": {"model": "pattern-only"}
+        }
+    else:
+        with profile_stage("ai_analysis"):
+            signature = similarity_index.signature(source.text)
+            ai_analysis = await run_ai_analysis(
+                source, analysis_code, filename, contract_info, contracts, unit_analysis, signature, exclude_types,
+                triage.model if triage and triage.route == ROUTE_LIGHT else None,
+                on_vulnerability,
+                speculative_findings=[
+                    vuln for vuln in pattern_vulnerabilities
+                    if finding_merger.normalize_type(vuln.type) not in exclude_types
+                ]
+            )
+
+    if analysis_type == "deep":
+        with profile_stage("function_passes"):
+            ai_analysis['vulnerabilities'] = ai_analysis['vulnerabilities'] + await ai_analyzer.analyze_functions(
+                analysis_code,
+                filename,
+                get_deep_analysis_focuses(analysis_code),
+                exclude_types,
+                on_vulnerability
+            )
+
+    # Combine results, merging duplicates reported by both AI and pattern detection
+    with profile_stage("merge"):
+        all_vulnerabilities = [
+            vuln for vuln in finding_merger.merge(ai_analysis['vulnerabilities'] + pattern_vulnerabilities)
+            if finding_merger.normalize_type(vuln.type) not in exclude_types
+        ]
+
+    # Calculate overall risk score
+    risk_score = calculate_risk_score(all_vulnerabilities)
+    severity_counts = count_severities(all_vulnerabilities)
+
+    # Generate report
+    analysis_result = AnalysisResponse(
+        contractName=contract_info.name,
+        fileName=filename,
+        analysisTimestamp=datetime.now().isoformat(),
+        overallRiskScore=risk_score,
+        totalVulnerabilities=len(all_vulnerabilities),
+        vulnerabilities=all_vulnerabilities,
+        contractInfo=contract_info,
+        criticalCount=severity_counts["CRITICAL"],
+        highCount=severity_counts["HIGH"],
+        mediumCount=severity_counts["MEDIUM"],
+        lowCount=severity_counts["LOW"],
+        infoCount=severity_counts["INFO"],
+        aiInsights=ai_analysis.get('insights', []),
+        recommendedFixes=ai_analysis.get('fixes', []),
+        knownLibraries=known_libraries,
+        contracts=contracts if len(contracts) > 1 else [],
+        analysisType=analysis_type,
+        analysisTimeMs=int((time.perf_counter() - started) * 1000),
+        tokenUsage=token_usage.report() if analysis_type != "quick" else None,
+        triage=TriageReport(**asdict(triage)) if triage else None,
+        modelRouting=model_routing.decisions,
+        excludedTypes=list(exclude_types),
+        aiModel=ai_analysis.get('analysis_metadata', {}).get('model', ai_analyzer.model)
+    )
+
+    # Persist for statistics, history export and near-duplicate reuse; SQLite runs off the event loop
+    if analysis_type != "quick":
+        try:
+            with profile_stage("persist"):
+                analysis_result.analysisId = await run_in_threadpool(
+                    history_store.save_analysis, source.content_hash, analysis_result
+                )
+                await run_in_threadpool(similarity_index.add, source.content_hash, source.text, signature)
+        except Exception as e:
+            print(f"History store error: {str(e)}")
+
+    return analysis_result
+
+async def run_ai_analysis(source: SourceBuffer, analysis_code: SourceBuffer, filename: str,
+                          contract_info: ContractInfo, contracts: List[ContractInfo], unit_analysis,
+                          signature, exclude_types: Sequence[str], light_model: Optional[str],
+                          on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None,
+                          speculative_findings: Sequence[VulnerabilityReport] = ()) -> dict:
+    """
+    AI review: near-duplicate reuse, per-contract review for large files, or a
+    whole-file review. The last two start fixes for severe speculative_findings
+    (pattern findings) while the AI analysis runs. light_model is the cheaper
+    model triage pinned the review to, if any.
+    """
+    # Reuse AI findings from a near-duplicate and only send its diff to the AI
+    reusable = await run_in_threadpool(find_reusable_analysis, source, signature, exclude_types, light_model)
+    if reusable:
+        prior_analysis, line_map, changed_ranges = reusable
+        ai_analysis = await ai_analyzer.analyze_changed_regions(
+            analysis_code,
+            filename,
+            contract_info,
+            changed_ranges,
+            exclude_types=exclude_types,
+            on_vulnerability=on_vulnerability
+        )
+        ai_analysis['vulnerabilities'] = similarity_index.remap_prior_findings(
+            prior_analysis['vulnerabilities'],
+            line_map,
+            filename
+        ) + ai_analysis['vulnerabilities']
+        if not ai_analysis.get('insights'):
+            ai_analysis['insights'] = prior_analysis.get('aiInsights', [])
+    elif unit_analysis.split and unit_analysis.review_units:
+        # Large multi-contract files are reviewed one contract at a time, concurrently
+        contracts_by_line = {info.startLine: info for info in contracts}
+        ai_analysis = await ai_analyzer.analyze_contract_units(
+            [
+                (unit_source, contracts_by_line[unit.start_line], unit.start_line)
+                for unit, unit_source in unit_analysis.review_units
+            ],
+            filename,
+            exclude_types,
+            on_vulnerability,
+            speculative_findings
+        )
+    else:
         # Run AI analysis
         ai_analysis = await ai_analyzer.analyze_contract(
-            contract_code, 
-            file.filename,
-            contract_info
+            analysis_code, 
+            filename,
+            contract_info,
+            exclude_types=exclude_types,
+            on_vulnerability=on_vulnerability,
+            speculative_findings=speculative_findings
         )
+
+    return ai_analysis
+
+def get_deep_analysis_focuses(analysis_code: SourceBuffer) -> List[tuple]:
+    """(function name, line ranges) for each function given a focused pass in deep analysis"""
+    units = solidity_parser.split_contracts(analysis_code)
+    spans = solidity_parser.extract_function_spans(analysis_code, units)
+
+    # Externally callable, state-changing functions are where exploits start
+    targets = [
+        span for span in spans
+        if span.has_body
+        and span.visibility in ('public', 'external')
+        and span.mutability not in ('view', 'pure')
+        and span.name != 'constructor'
+    ]
+
+    return [
+        (span.name, solidity_parser.function_focus_ranges(span, spans, units))
+        for span in targets[:DEEP_ANALYSIS_MAX_FUNCTIONS]
+    ]
+
+@router.post("/compare", response_model=ComparisonResponse)
+async def compare_contracts(file1: UploadFile = File(...), file2: UploadFile = File(...)):
+    """
+    Compare two contracts: similarity plus common and unique vulnerabilities
+    """
+    try:
+        source1 = SourceBuffer.from_bytes(await file1.read(), file1.filename)
+        source2 = SourceBuffer.from_bytes(await file2.read(), file2.filename)
         
-        # Run pattern-based vulnerability detection
-        pattern_vulnerabilities = vulnerability_detector.detect_vulnerabilities(
-            contract_code,
-            contract_info
-        )
+        vulnerabilities1 = await run_in_threadpool(get_comparison_findings, source1, file1.filename)
+        vulnerabilities2 = await run_in_threadpool(get_comparison_findings, source2, file2.filename)
         
-        # Combine results
-        all_vulnerabilities = ai_analysis['vulnerabilities'] + pattern_vulnerabilities
+        line_map, _ = map_unchanged_lines(source1, source2)
+        common, unique1, unique2 = finding_merger.split_common(vulnerabilities1, vulnerabilities2, line_map)
         
-        # Calculate overall risk score
-        risk_score = calculate_risk_score(all_vulnerabilities)
+        similarity = round(similarity_index.exact_similarity(source1.text, source2.text), 3)
         
-        # Generate report
-        analysis_result = AnalysisResponse(
-            contractName=contract_info.name,
-            fileName=file.filename,
-            analysisTimestamp=datetime.now().isoformat(),
-            overallRiskScore=risk_score,
-            totalVulnerabilities=len(all_vulnerabilities),
-            vulnerabilities=all_vulnerabilities,
-            contractInfo=contract_info,
-            aiInsights=ai_analysis.get('insights', []),
-            recommendedFixes=ai_analysis.get('fixes', [])
-        )
+        name1 = file1.filename
+        name2 = file2.filename if file2.filename != file1.filename else f"{file2.filename} (2)"
         
-        return analysis_result
+        return ComparisonResponse(
+            contract1=name1,
+            contract2=name2,
+            similarityScore=similarity,
+            commonVulnerabilities=common,
+            uniqueVulnerabilities={name1: unique1, name2: unique2},
+            recommendation=get_comparison_recommendation(similarity, len(unique2))
+        )
         
     except UnicodeDecodeError:
         raise HTTPException(
@@ -133,10 +662,50 @@ async def analyze_contract(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Analysis failed: {str(e)}"
+            detail=f"Comparison failed: {str(e)}"
         )
 
-@app.get("/sample-contracts")
+# History endpoints are plain functions, which FastAPI runs in its threadpool,
+# so SQLite reads do not block the event loop
+@router.get("/stats", response_model=VulnerabilityStats)
+def get_stats(
+    severity: Optional[str] = Query(None, description="Only count findings of this severity"),
+    type: Optional[str] = Query(None, description="Only count findings of this vulnerability type"),
+    cweId: Optional[str] = Query(None, description="Only count findings with this CWE ID"),
+    limit: int = Query(10, ge=1, le=100, description="Number of common vulnerability types to return")
+):
+    """Aggregate statistics over all stored analyses"""
+    return history_store.get_stats(severity=severity, vuln_type=type, cwe_id=cweId, limit=limit)
+
+@router.get("/stats/models", response_model=List[ModelLatencyReport])
+async def get_model_stats():
+    """Median latency of recent AI calls per prompt type and model, in this worker process"""
+    return ai_analyzer.model_router.latency_summary()
+
+@router.get("/history/{analysis_id}/findings", response_model=FindingsPage)
+def get_findings(
+    analysis_id: int,
+    severity: Optional[str] = Query(None, description="Only return findings of this severity"),
+    type: Optional[str] = Query(None, description="Only return findings of this vulnerability type"),
+    offset: int = Query(0, ge=0, description="Number of findings to skip"),
+    limit: int = Query(50, ge=1, le=500, description="Number of findings to return")
+):
+    """Page through a stored analysis's findings, most severe first"""
+    page = history_store.get_findings(analysis_id, severity=severity, vuln_type=type, offset=offset, limit=limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return page
+
+@router.get("/history/export")
+async def export_history(kind: str = Query("analyses", pattern="^(analyses|findings)$")):
+    """Bulk export of stored analyses or findings as NDJSON"""
+    return StreamingResponse(
+        history_store.export_ndjson(kind),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={kind}.ndjson"}
+    )
+
+@router.get("/sample-contracts")
 async def get_sample_contracts():
     """Get list of sample vulnerable contracts for testing"""
     sample_dir = "app/sample_contracts"
@@ -158,7 +727,7 @@ async def get_sample_contracts():
     
     return {"samples": samples}
 
-@app.get("/sample-contracts/{contract_name}")
+@router.get("/sample-contracts/{contract_name}")
 async def get_sample_contract(contract_name: str):
     """Get specific sample contract content"""
     filepath = f"app/sample_contracts/{contract_name}"
@@ -175,7 +744,16 @@ async def get_sample_contract(contract_name: str):
         "description": get_contract_description(contract_name)
     }
 
-def calculate_risk_score(vulnerabilities: List[dict]) -> float:
+def count_severities(vulnerabilities: List[VulnerabilityReport]) -> Dict[str, int]:
+    """Findings per severity level, counted once so clients need not filter the list"""
+    counts = dict.fromkeys(("CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO"), 0)
+    for vuln in vulnerabilities:
+        severity = vuln.severity.upper()
+        if severity in counts:
+            counts[severity] += 1
+    return counts
+
+def calculate_risk_score(vulnerabilities: List[VulnerabilityReport]) -> float:
     """Calculate overall risk score based on vulnerabilities"""
     if not vulnerabilities:
         return 0.0
@@ -188,7 +766,7 @@ def calculate_risk_score(vulnerabilities: List[dict]) -> float:
         "INFO": 0.5
     }
     
-    total_weight = sum(severity_weights.get(vuln.get('severity', 'LOW'), 1.0) 
+    total_weight = sum(severity_weights.get(vuln.severity, 1.0) 
                       for vuln in vulnerabilities)
     
     # Normalize to 0-10 scale
@@ -197,6 +775,77 @@ def calculate_risk_score(vulnerabilities: List[dict]) -> float:
     
     return round(risk_score, 1)
 
+def covers_request(prior_analysis: dict, exclude_types: Sequence[str], light_model: Optional[str]) -> bool:
+    """
+    Whether a stored analysis's AI review covers all a new request asks for:
+    every finding category the request keeps, on a review tier at least as full
+    """
+    # Analyses saved before exclusions were recorded may have left categories out
+    prior_excluded = prior_analysis.get('excludedTypes')
+    if prior_excluded is None or not set(prior_excluded) <= set(exclude_types):
+        return False
+    # A light review only stands in for another light review on the same model
+    prior_triage = prior_analysis.get('triage')
+    if prior_triage and prior_triage.get('route') == ROUTE_LIGHT:
+        return light_model is not None and prior_triage.get('model') == light_model
+    return True
+
+def find_reusable_analysis(source: SourceBuffer, signature, exclude_types: Sequence[str] = (),
+                           light_model: Optional[str] = None) -> Optional[tuple]:
+    """
+    Find a stored AI analysis of a near-duplicate contract that covers the
+    request (see covers_request).
+    Returns (prior analysis, old->new line map, changed line ranges) or None.
+    """
+    try:
+        matches = similarity_index.find_similar(
+            source.text,
+            signature,
+            threshold=REUSE_SIMILARITY_THRESHOLD
+        )
+        for match in matches:
+            for stored in history_store.find_by_contract_hash(match.contract_hash):
+                prior_analysis = stored['analysis']
+                # Fallback and pattern-only analyses never had an AI review to reuse
+                if prior_analysis.get('aiModel') in ('fallback', 'pattern-only'):
+                    continue
+                if not covers_request(prior_analysis, exclude_types, light_model):
+                    continue
+                line_map, changed_ranges = map_unchanged_lines(match.source, source)
+                return prior_analysis, line_map, changed_ranges
+    except Exception as e:
+        print(f"Similarity lookup error: {str(e)}")
+    
+    return None
+
+def get_comparison_findings(source: SourceBuffer, filename: str) -> List[VulnerabilityReport]:
+    """Findings for a compared contract: stored analysis if known, else pattern detection"""
+    for stored in history_store.find_by_contract_hash(source.content_hash):
+        return [
+            VulnerabilityReport(**vuln_data)
+            for vuln_data in stored['analysis']['vulnerabilities']
+        ]
+    
+    contract_info = solidity_parser.parse_contract(source, filename)
+    known_libraries = library_index.find_known_libraries(source)
+    analysis_code = library_index.mask_known_libraries(source, known_libraries)
+    unit_analysis = contract_unit_analyzer.analyze_inline(source, analysis_code, contract_info, known_libraries)
+    return finding_merger.merge(vulnerability_detector.build_reports(unit_analysis.vulnerabilities))
+
+def get_comparison_recommendation(similarity: float, new_vulnerabilities: int) -> str:
+    """Recommendation text for a contract comparison"""
+    if similarity >= 0.95:
+        advice = "Contracts are near-identical; focus review on the changed regions"
+    elif similarity >= 0.7:
+        advice = "Contract is a modified fork; re-audit changed functions and their callers"
+    else:
+        advice = "Contracts differ substantially; audit each independently"
+    
+    if new_vulnerabilities:
+        advice += f". The second contract introduces {new_vulnerabilities} vulnerabilities not present in the first"
+    
+    return advice
+
 def get_contract_description(filename: str) -> str:
     """Get description for sample contracts"""
     descriptions = {
@@ -221,4 +870,4 @@ def get_expected_vulnerabilities(filename: str) -> List[str]:
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:create_app", factory=True, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
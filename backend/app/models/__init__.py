@@ -8,13 +8,29 @@ from .schemas import (
     VulnerabilityLocation,
     CodeFix,
     AIInsight,
+    KnownLibraryMatch,
+    StructuredFindingLocation,
+    StructuredFinding,
+    StructuredFix,
+    StageTokenUsage,
+    TokenUsageReport,
+    TriageReport,
+    ModelRoutingDecision,
+    ModelLatencyReport,
     AnalysisResponse,
     HealthResponse,
     ErrorResponse,
     UploadResponse,
     AnalysisRequest,
+    TextPosition,
+    TextRange,
+    TextEdit,
+    EditorSessionRequest,
+    EditorChangeRequest,
+    EditorSessionResponse,
     BatchAnalysisRequest,
     VulnerabilityStats,
+    FindingsPage,
     ComparisonResponse
 )
 
@@ -24,13 +40,29 @@ __all__ = [
     "VulnerabilityLocation",
     "CodeFix",
     "AIInsight",
+    "KnownLibraryMatch",
+    "StructuredFindingLocation",
+    "StructuredFinding",
+    "StructuredFix",
+    "StageTokenUsage",
+    "TokenUsageReport",
+    "TriageReport",
+    "ModelRoutingDecision",
+    "ModelLatencyReport",
     "AnalysisResponse",
     "HealthResponse",
     "ErrorResponse",
     "UploadResponse",
     "AnalysisRequest",
+    "TextPosition",
+    "TextRange",
+    "TextEdit",
+    "EditorSessionRequest",
+    "EditorChangeRequest",
+    "EditorSessionResponse",
     "BatchAnalysisRequest",
     "VulnerabilityStats",
+    "FindingsPage",
     "ComparisonResponse"
 ]
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 
 class ContractInfo(BaseModel):
@@ -11,6 +11,9 @@ class ContractInfo(BaseModel):
     modifiers: List[str]
     linesOfCode: int
     complexity: str  # "Low", "Medium", "High"
+    kind: Optional[str] = None  # "contract", "library", "interface" for a single unit of a file
+    startLine: Optional[int] = None
+    endLine: Optional[int] = None
 
 class VulnerabilityLocation(BaseModel):
     """Location information for vulnerabilities"""
@@ -41,6 +44,7 @@ class VulnerabilityReport(BaseModel):
     cweId: Optional[str] = None  # Common Weakness Enumeration ID
     recommendation: str
     detectionMethod: str  # "AI Analysis", "Pattern Matching", "Static Analysis"
+    detectionMethods: List[str] = []  # All methods that reported this finding after merging
     potentialLoss: Optional[str] = None  # Estimated financial impact
     suggestedFix: Optional[CodeFix] = None
     references: List[str] = []
@@ -52,6 +56,81 @@ class AIInsight(BaseModel):
     confidence: float  # 0-1 scale
     actionable: bool
 
+class KnownLibraryMatch(BaseModel):
+    """Span of vetted library code excluded from analysis"""
+    name: str
+    version: str
+    startLine: int
+    endLine: int
+    matchedFunctions: List[str] = []
+    fullyMatched: bool = True
+
+# Structured LLM output models
+class StructuredFindingLocation(BaseModel):
+    """Location of a finding in the structured LLM response"""
+    startLine: int
+    endLine: int
+    function: Optional[str] = None
+
+class StructuredFinding(BaseModel):
+    """Vulnerability as returned by the single-pass structured LLM analysis"""
+    id: str
+    title: str
+    severity: Literal["CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO"]
+    type: str
+    description: str
+    location: StructuredFindingLocation
+    impact: str = "Unknown impact"
+    likelihood: str = "Unknown likelihood"
+    riskScore: float = 5.0
+    recommendation: str = "Review and fix"
+    potentialLoss: Optional[str] = None
+    cweId: Optional[str] = None
+
+class StructuredFix(CodeFix):
+    """Code fix tied to a finding in the structured LLM response"""
+    vulnerabilityId: str
+
+class StageTokenUsage(BaseModel):
+    """Tokens spent by one stage of the AI analysis"""
+    calls: int = 0
+    promptTokens: int = 0
+    completionTokens: int = 0
+    cachedPromptTokens: int = 0  # Prompt tokens the provider served from its prompt cache
+
+class TokenUsageReport(BaseModel):
+    """Tokens spent on AI calls for one analysis"""
+    promptTokens: int = 0
+    completionTokens: int = 0
+    totalTokens: int = 0
+    cachedPromptTokens: int = 0  # Included in promptTokens; only counted when the provider reports them
+    trimmedPrompts: int = 0  # Prompts cut down to fit the model's context window
+    estimated: bool = False  # Counted without the model's tokenizer
+    stages: Dict[str, StageTokenUsage] = {}
+
+class TriageReport(BaseModel):
+    """Static triage that decided how much AI review an analysis got"""
+    route: Literal["pattern-only", "light", "full"]
+    score: int
+    signals: Dict[str, int] = {}  # Payable functions, external calls, delegatecalls, ...
+    model: Optional[str] = None  # Model used for the AI review; None when it was skipped
+
+class ModelRoutingDecision(BaseModel):
+    """Model an AI call was routed to, why, and how long it took"""
+    stage: str  # Prompt type: analysis, insights, fixes, ...
+    model: str
+    reason: str
+    promptTokens: int
+    latencyMs: float
+    ok: bool = True  # False when the call failed (and was escalated or given up)
+
+class ModelLatencyReport(BaseModel):
+    """Median latency of recent AI calls of one prompt type on one model"""
+    stage: str
+    model: str
+    calls: int
+    medianMs: float
+
 class AnalysisResponse(BaseModel):
     """Complete analysis response"""
     contractName: str
@@ -63,6 +142,8 @@ class AnalysisResponse(BaseModel):
     contractInfo: ContractInfo
     aiInsights: List[AIInsight] = []
     recommendedFixes: List[CodeFix] = []
+    knownLibraries: List[KnownLibraryMatch] = []
+    contracts: List[ContractInfo] = []  # Per-unit info for files declaring several contracts
     
     # Risk breakdown
     criticalCount: int = Field(default=0)
@@ -72,7 +153,13 @@ class AnalysisResponse(BaseModel):
     infoCount: int = Field(default=0)
     
     # Analysis metadata
+    analysisId: Optional[int] = None  # History id for paging findings; unset for unpersisted analyses
+    analysisType: str = "comprehensive"
     analysisTimeMs: Optional[int] = None
+    tokenUsage: Optional[TokenUsageReport] = None
+    triage: Optional[TriageReport] = None
+    modelRouting: List[ModelRoutingDecision] = []  # One entry per AI call
+    excludedTypes: List[str] = []  # Finding categories left out of the analysis, as FindingMerger type keys
     aiModel: str = "GPT-4"
     version: str = "1.0.0"
 
@@ -101,22 +188,71 @@ class AnalysisRequest(BaseModel):
     """Analysis request parameters"""
     contractCode: str
     filename: str
-    analysisType: str = "comprehensive"  # "quick", "comprehensive", "deep"
+    analysisType: Literal["quick", "comprehensive", "deep"] = "comprehensive"
     includeGasAnalysis: bool = True
     includeBusinessLogic: bool = True
     
+class TextPosition(BaseModel):
+    """Zero-based line and character offset in a document, as editors send them"""
+    line: int = Field(ge=0)
+    character: int = Field(ge=0)
+
+class TextRange(BaseModel):
+    """Range of document text replaced by an edit"""
+    start: TextPosition
+    end: TextPosition
+
+class TextEdit(BaseModel):
+    """One text change; without a range the text replaces the whole document"""
+    range: Optional[TextRange] = None
+    text: str
+
+class EditorSessionRequest(BaseModel):
+    """Open an editor session on a document"""
+    contractCode: str
+    filename: str
+    review: bool = True  # AI review once the editor goes idle
+
+class EditorChangeRequest(BaseModel):
+    """Edits applied in order, and the document version they produce"""
+    version: int
+    changes: List[TextEdit]
+
+class EditorSessionResponse(BaseModel):
+    """Diagnostics of an editor session's current document version"""
+    sessionId: str
+    version: int
+    diagnostics: List[VulnerabilityReport]
+    incremental: bool = False  # Updated in place rather than rescanned
+    reindexedFunctions: int = 0
+    elapsedMs: float = 0.0
+    reviewStatus: Literal["disabled", "idle", "scheduled", "running", "complete", "failed"] = "idle"
+    reviewVersion: Optional[int] = None  # Document version the AI findings were made for
+    aiFindings: List[VulnerabilityReport] = []
+    
 class BatchAnalysisRequest(BaseModel):
     """Batch analysis for multiple contracts"""
     contracts: List[Dict[str, str]]  # [{"filename": "contract.sol", "code": "..."}]
     analysisType: str = "comprehensive"
 
 # Response models for specific endpoints
+class FindingsPage(BaseModel):
+    """One page of a stored analysis's findings, most severe first"""
+    analysisId: int
+    total: int  # Findings matching the filters, across all pages
+    offset: int
+    limit: int
+    vulnerabilities: List[VulnerabilityReport]
+
 class VulnerabilityStats(BaseModel):
     """Vulnerability statistics"""
     totalContracts: int
     totalVulnerabilities: int
-    averageRiskScore: float
+    averageRiskScore: float  # Mean overall risk score of the counted analyses
+    averageFindingRiskScore: float = 0.0  # Mean risk score of the counted findings
     commonVulnerabilities: List[Dict[str, int]]
+    totalPromptTokens: int = 0
+    totalCompletionTokens: int = 0
     
 class ComparisonResponse(BaseModel):
     """Contract comparison response"""
@@ -6,9 +6,11 @@ Core services for smart contract analysis
 from .ai_analyzer import AIAnalyzer
 from .vulnerability_detector import VulnerabilityDetector
 from .solidity_parser import SolidityParser
+from .finding_merger import FindingMerger
 
 __all__ = [
     "AIAnalyzer",
     "VulnerabilityDetector", 
-    "SolidityParser"
+    "SolidityParser",
+    "FindingMerger"
 ]
\ No newline at end of file
@@ -1,23 +1,114 @@
 import os
 import json
+import time
 import asyncio
-from typing import List, Dict, Any, Optional
-import openai
-from openai import AsyncOpenAI
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple, Union
+from pydantic import TypeAdapter, ValidationError
 import re
 import hashlib
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime
 
-from app.models.schemas import VulnerabilityReport, VulnerabilityLocation, CodeFix, AIInsight
+from app.models.schemas import (
+    VulnerabilityReport,
+    VulnerabilityLocation,
+    CodeFix,
+    AIInsight,
+    StructuredFinding,
+    StructuredFix
+)
+from app.services.finding_merger import FindingMerger, SEVERITY_RANK, UNLOCATED_LINE
+from app.services.fix_cache import FixCache
+from app.utils.source_buffer import SourceBuffer
+from app.services.token_budget import TokenCounter, current_token_usage
+from app.services.model_router import ModelRouter, current_model_routing, ROUTE_ESCALATED
+from app.utils.json_stream import IncrementalJSONParser, parse_json_object
+from app.utils.solidity_text import strip_comments
+
+# Finding categories a request can leave out, keyed by FindingMerger.normalize_type
+EXCLUDABLE_CATEGORIES = {
+    "gas": "gas optimization or gas limit issues",
+    "logic_error": "business logic errors"
+}
+
+SYSTEM_PROMPT = (
+    "You are a world-class smart contract security auditor with expertise in finding critical "
+    "vulnerabilities that have caused millions in losses. Provide detailed, actionable security analysis."
+)
+
+# Stand-in contract used to measure the fixed part of a prompt template
+EMPTY_SOURCE = SourceBuffer("")
+
+# Shortest prompt prefix providers serve from their prompt cache, in tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# Model chosen for the request running in the current task, overriding the
+# analyzer's default; spawned fix and per-contract tasks copy the context
+current_ai_model: ContextVar[Optional[str]] = ContextVar("current_ai_model", default=None)
+
+@dataclass
+class PromptConversation:
+    """
+    Messages every AI call about one contract starts with: the fixed system
+    prompt, the contract block and, once it has been answered, the analysis
+    request and its response. Each call appends only its own task, so calls
+    share a prefix the provider can serve from its prompt cache.
+    """
+    messages: List[Dict[str, str]]
+    model: Optional[str] = None  # Model that answered the analysis, whose cache holds the prefix
+    
+    def ask(self, prompt: str) -> List[Dict[str, str]]:
+        """Messages for a task asked after the shared prefix"""
+        return self.messages + [{"role": "user", "content": prompt}]
+    
+    def answered(self, prompt: str, response: str, model: str) -> None:
+        """Extend the prefix with a task and its response, for follow-up calls"""
+        self.messages = self.ask(prompt) + [{"role": "assistant", "content": response}]
+        self.model = model
 
 class AIAnalyzer:
     """AI-powered smart contract analyzer using GPT-4"""
     
     def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        self.model = "gpt-4-1106-preview"  # Latest GPT-4 model
+        # The OpenAI SDK is imported on first use to keep application startup fast
+        self._client = None
+        self.default_model = os.getenv("PRIMARY_AI_MODEL", "gpt-4-1106-preview")
+        self.finding_merger = FindingMerger()
+        
+        # Completion budget per call; prompts are trimmed to leave room for it
+        self.max_tokens = int(os.getenv("MAX_AI_TOKENS", "4000"))
+        self.token_counter = TokenCounter()
+        
+        # Ask for the usage block (with cached prompt tokens) at the end of streamed responses
+        self.stream_usage = os.getenv("AI_STREAM_USAGE", "true").lower() == "true"
+        
+        # Each call goes to the primary or fallback model by prompt type, size and contract complexity
+        self.model_router = ModelRouter(self.token_counter)
+        
+        # Single-round-trip mode: analysis, insights and fixes in one structured request
+        self.structured_mode = os.getenv("AI_STRUCTURED_MODE", "false").lower() == "true"
+        self.fix_severity_threshold = os.getenv("AI_FIX_SEVERITY_THRESHOLD", "HIGH").upper()
+        self.structured_max_retries = 1
+        
+        # Concurrent requests when the contracts of one file are reviewed separately
+        self.max_concurrency = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+        
+        # Findings given an AI-generated fix in multi-call mode
+        self.max_fixes = 3
+        
+        # Start fixes for severe pattern findings alongside the AI analysis instead of after it
+        self.speculative_fixes = os.getenv("AI_SPECULATIVE_FIXES", "true").lower() == "true"
+        
+        # Fixes for recurring vulnerable snippets, shared across contracts
+        self.fix_cache = FixCache()
+        
+        # Validators for each section of the structured response
+        self.section_validators = {
+            "vulnerabilities": TypeAdapter(List[StructuredFinding]),
+            "insights": TypeAdapter(List[AIInsight]),
+            "fixes": TypeAdapter(List[StructuredFix])
+        }
         
         # Vulnerability patterns and descriptions
         self.vulnerability_patterns = {
@@ -43,42 +134,109 @@ class AIAnalyzer:
             }
         }
     
-    async def analyze_contract(self, contract_code: str, filename: str, contract_info: Dict) -> Dict[str, Any]:
+    @property
+    def model(self) -> str:
+        """Model for AI calls: the current request's choice, else the default"""
+        return current_ai_model.get() or self.default_model
+    
+    @property
+    def client(self):
+        """OpenAI client, created on first use"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY")
+            )
+        return self._client
+    
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+    
+    async def analyze_contract(self, contract_code: Union[str, SourceBuffer], filename: str, contract_info: Dict,
+                               structured: Optional[bool] = None,
+                               exclude_types: Sequence[str] = (),
+                               on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None,
+                               speculative_findings: Sequence[VulnerabilityReport] = ()) -> Dict[str, Any]:
         """
-        Main AI analysis function
+        Main AI analysis function. exclude_types lists EXCLUDABLE_CATEGORIES
+        keys left out of the review; on_vulnerability is called with each AI
+        finding as soon as it has streamed in. speculative_findings are
+        pattern findings whose fixes may start before the AI has confirmed them.
         """
+        source = SourceBuffer.of(contract_code, filename)
+        use_structured = self.structured_mode if structured is None else structured
+        
+        # Fix requests started while the analysis is still streaming, by finding id,
+        # and those started for pattern findings before it, with their findings
+        early_fixes: Dict[str, asyncio.Future] = {}
+        speculative: List[Tuple[VulnerabilityReport, asyncio.Future]] = []
+        conversation: Optional[PromptConversation] = None
+        
+        def on_finding(vuln: VulnerabilityReport) -> None:
+            if (
+                len(early_fixes) < self.max_fixes
+                and vuln.id not in early_fixes
+                and not any(self.finding_merger.same_issue(vuln, pattern) for pattern, _ in speculative)
+            ):
+                early_fixes[vuln.id] = asyncio.ensure_future(self._generate_fix(source, vuln, conversation))
+            if on_vulnerability:
+                on_vulnerability(vuln)
+        
         try:
-            # Prepare analysis prompt
-            analysis_prompt = self._create_analysis_prompt(contract_code, filename)
+            if use_structured:
+                return await self._analyze_structured(source, filename, exclude_types)
+            
+            # The contract is trimmed to the model's context window once, leaving room for
+            # follow-ups, and every call below shares the conversation built around it
+            analysis_prompt = self._create_analysis_prompt(exclude_types)
+            conversation = self._conversation(
+                self._fit_source(source, filename, analysis_prompt, follow_ups=True), filename
+            )
             
-            # Get AI analysis
-            ai_response = await self._call_openai_api(analysis_prompt)
+            # Severe pattern findings almost always come back from the AI too, so their
+            # fixes run alongside the analysis rather than a round trip after it
+            speculative.extend(
+                (vuln, asyncio.ensure_future(self._generate_fix(source, vuln, conversation, stage="speculative_fixes")))
+                for vuln in self._speculative_targets(speculative_findings)
+            )
+            
+            # Stream the AI analysis, handling each finding as it completes
+            parsed_analysis = await self._stream_analysis(
+                conversation, analysis_prompt, filename, exclude_types, on_finding
+            )
             
-            # Parse AI response
-            parsed_analysis = self._parse_ai_response(ai_response, contract_code, filename)
+            # Collapse duplicate AI findings so fix slots go to distinct issues
+            parsed_analysis['vulnerabilities'] = self.finding_merger.merge(parsed_analysis['vulnerabilities'])
             
             # Generate insights
-            insights = await self._generate_insights(contract_code, parsed_analysis)
+            insights = await self._generate_insights(conversation, parsed_analysis)
             
-            # Generate fixes
-            fixes = await self._generate_fixes(contract_code, parsed_analysis['vulnerabilities'])
+            # Generate fixes, reusing requests already started for surviving findings
+            fixes = await self._generate_fixes(
+                source, parsed_analysis['vulnerabilities'], conversation, early_fixes, speculative
+            )
             
             return {
                 "vulnerabilities": parsed_analysis['vulnerabilities'],
                 "insights": insights,
                 "fixes": fixes,
                 "analysis_metadata": {
-                    "model": self.model,
+                    "model": self._routed_model("analysis"),
                     "timestamp": datetime.now().isoformat(),
-                    "confidence": parsed_analysis.get('confidence', 0.8)
+                    "confidence": parsed_analysis.get('confidence', 0.8),
+                    "mode": "multi-call",
+                    "speculative_fixes": len(speculative)
                 }
             }
             
         except Exception as e:
             print(f"AI Analysis error: {str(e)}")
+            for task in list(early_fixes.values()) + [task for _, task in speculative]:
+                task.cancel()
             # Return fallback analysis
             return {
-                "vulnerabilities": self._fallback_analysis(contract_code, filename),
+                "vulnerabilities": self._fallback_analysis(source, filename),
                 "insights": [],
                 "fixes": [],
                 "analysis_metadata": {
@@ -88,16 +246,10 @@ class AIAnalyzer:
                 }
             }
     
-    def _create_analysis_prompt(self, contract_code: str, filename: str) -> str:
-        """Create comprehensive analysis prompt for AI"""
+    def _create_analysis_prompt(self, exclude_types: Sequence[str] = ()) -> str:
+        """Create comprehensive analysis prompt for AI, asked after the contract block"""
         return f"""
-You are an expert smart contract security auditor. Analyze this Solidity contract for vulnerabilities, security issues, and provide detailed recommendations.
-
-CONTRACT FILE: {filename}
-CONTRACT CODE:
-```solidity
-{contract_code}
-```
+You are an expert smart contract security auditor. Analyze the Solidity contract above for vulnerabilities, security issues, and provide detailed recommendations.
 
 Please provide a comprehensive security analysis in the following JSON format:
 
@@ -143,83 +295,691 @@ For each vulnerability found:
 - Rate severity accurately
 
 Be thorough but practical. Focus on exploitable vulnerabilities that could cause real financial loss.
-"""
+{self._focus_instructions(exclude_types)}"""
 
-    async def _call_openai_api(self, prompt: str) -> str:
-        """Call OpenAI API with error handling"""
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a world-class smart contract security auditor with expertise in finding critical vulnerabilities that have caused millions in losses. Provide detailed, actionable security analysis."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,  # Low temperature for consistency
-                max_tokens=4000,
-                timeout=30
+    async def analyze_contract_units(self, units: List[tuple], filename: str, exclude_types: Sequence[str] = (),
+                                     on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None,
+                                     speculative_findings: Sequence[VulnerabilityReport] = ()) -> Dict[str, Any]:
+        """
+        Review each contract of a large multi-contract file separately and
+        concurrently. units holds (unit source, ContractInfo, first line) and
+        finding lines are shifted back onto the whole file; speculative_findings
+        (on the whole file) go to the unit they fall in.
+        """
+        slots = asyncio.Semaphore(self.max_concurrency)
+        
+        async def review(unit_source: SourceBuffer, contract_info, start_line: int) -> Dict[str, Any]:
+            def on_unit_finding(vuln: VulnerabilityReport) -> None:
+                on_vulnerability(self._shift_location(vuln, start_line - 1))
+            
+            unit_findings = [
+                self._shift_location(vuln, 1 - start_line) for vuln in speculative_findings
+                if start_line <= vuln.location.startLine < start_line + unit_source.line_count
+            ]
+            
+            async with slots:
+                analysis = await self.analyze_contract(
+                    unit_source, filename, contract_info, exclude_types=exclude_types,
+                    on_vulnerability=on_unit_finding if on_vulnerability else None,
+                    speculative_findings=unit_findings
+                )
+            analysis['vulnerabilities'] = [
+                self._shift_location(vuln, start_line - 1) for vuln in analysis['vulnerabilities']
+            ]
+            return analysis
+        
+        analyses = await asyncio.gather(*(review(*unit) for unit in units))
+        
+        insights: List[AIInsight] = []
+        for analysis in analyses:
+            for insight in analysis.get('insights', []):
+                if all(insight.insight != existing.insight for existing in insights):
+                    insights.append(insight)
+        
+        models = [analysis['analysis_metadata'].get('model') for analysis in analyses]
+        return {
+            "vulnerabilities": [vuln for analysis in analyses for vuln in analysis['vulnerabilities']],
+            "insights": insights,
+            "fixes": [fix for analysis in analyses for fix in analysis.get('fixes', [])],
+            "analysis_metadata": {
+                "model": next((model for model in models if model != "fallback"), "fallback"),
+                "timestamp": datetime.now().isoformat(),
+                "mode": "per-contract",
+                "units": len(analyses)
+            }
+        }
+    
+    async def analyze_functions(self, contract_code: Union[str, SourceBuffer], filename: str,
+                                focuses: List[tuple], exclude_types: Sequence[str] = (),
+                                on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None) -> List[VulnerabilityReport]:
+        """
+        Focused vulnerability passes, one per function. focuses holds
+        (function name, line ranges to keep); everything else is blanked so
+        reported lines still match the full contract.
+        """
+        source = SourceBuffer.of(contract_code, filename)
+        slots = asyncio.Semaphore(self.max_concurrency)
+        
+        async def review(function_name: str, ranges: List[tuple]) -> List[VulnerabilityReport]:
+            prompt = self._create_analysis_prompt(exclude_types) + (
+                f"\nReview only the function {function_name}() in depth; the rest is context.\n"
             )
+            excerpt = self._build_region_excerpt(source, ranges, 0, placeholder="// ... other code omitted ...")
+            conversation = self._conversation(self._fit_source(excerpt, filename, prompt), filename)
             
-            return response.choices[0].message.content
+            def on_function_finding(vuln: VulnerabilityReport) -> None:
+                on_vulnerability(self._as_function_pass(vuln))
             
-        except Exception as e:
-            print(f"OpenAI API error: {str(e)}")
-            raise e
+            try:
+                async with slots:
+                    analysis = await self._stream_analysis(
+                        conversation, prompt, filename, exclude_types, on_function_finding if on_vulnerability else None,
+                        stage="function_pass"
+                    )
+            except Exception as e:
+                print(f"Function analysis error in {function_name}: {str(e)}")
+                return []
+            
+            return [self._as_function_pass(vuln) for vuln in analysis['vulnerabilities']]
+        
+        results = await asyncio.gather(*(review(name, ranges) for name, ranges in focuses))
+        return [vuln for vulnerabilities in results for vuln in vulnerabilities]
     
-    def _parse_ai_response(self, ai_response: str, contract_code: str, filename: str) -> Dict[str, Any]:
-        """Parse AI response and convert to structured format"""
+    def _as_function_pass(self, vuln: VulnerabilityReport) -> VulnerabilityReport:
+        """Mark a finding as coming from a deep-analysis function pass"""
+        return vuln.model_copy(update={"detectionMethod": "AI Analysis (Function Pass)"})
+    
+    def _focus_instructions(self, exclude_types: Sequence[str]) -> str:
+        """Prompt lines excluding finding categories the request opted out of"""
+        labels = [EXCLUDABLE_CATEGORIES[key] for key in exclude_types if key in EXCLUDABLE_CATEGORIES]
+        if not labels:
+            return ""
+        return f"Do not report {' or '.join(labels)}.\n"
+    
+    def _without_types(self, vulnerabilities: List[VulnerabilityReport],
+                       exclude_types: Sequence[str]) -> List[VulnerabilityReport]:
+        """Drop findings in excluded categories"""
+        if not exclude_types:
+            return vulnerabilities
+        return [
+            vuln for vuln in vulnerabilities
+            if self.finding_merger.normalize_type(vuln.type) not in exclude_types
+        ]
+    
+    def _shift_location(self, vuln: VulnerabilityReport, line_offset: int) -> VulnerabilityReport:
+        """Move a finding reported against a unit excerpt onto the full file"""
+        if not line_offset or not self.finding_merger.is_located(vuln):
+            return vuln
+        return vuln.model_copy(update={
+            "location": vuln.location.model_copy(update={
+                "startLine": vuln.location.startLine + line_offset,
+                "endLine": vuln.location.endLine + line_offset
+            })
+        })
+    
+    async def analyze_changed_regions(self, contract_code: Union[str, SourceBuffer], filename: str, contract_info: Dict,
+                                      changed_ranges: List[tuple], context_lines: int = 3,
+                                      exclude_types: Sequence[str] = (),
+                                      on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None) -> Dict[str, Any]:
+        """
+        Analyze only the changed regions of a contract whose remaining code was
+        already reviewed as part of a near-duplicate. Without changed ranges
+        (an identical contract) the prior review is reused as is.
+        """
+        if not changed_ranges:
+            return {
+                "vulnerabilities": [],
+                "insights": [],
+                "fixes": [],
+                "analysis_metadata": {
+                    "model": self.model,
+                    "timestamp": datetime.now().isoformat(),
+                    "mode": "reused"
+                }
+            }
+        
+        excerpt = self._build_region_excerpt(SourceBuffer.of(contract_code), changed_ranges, context_lines)
+        return await self.analyze_contract(
+            excerpt, filename, contract_info, exclude_types=exclude_types, on_vulnerability=on_vulnerability
+        )
+    
+    def _build_region_excerpt(self, source: SourceBuffer, changed_ranges: List[tuple], context_lines: int,
+                              placeholder: str = "// ... unchanged code omitted (previously reviewed) ...") -> SourceBuffer:
+        """
+        Blank out unchanged lines outside the changed regions. Line numbers are
+        preserved so findings map straight back onto the full contract, and runs
+        of empty lines cost almost nothing in tokens.
+        """
+        lines = source.lines
+        keep = [False] * len(lines)
+        for start, end in changed_ranges:
+            for line in range(max(1, start - context_lines), min(len(lines), end + context_lines) + 1):
+                keep[line - 1] = True
+        
+        excerpt = []
+        for i, line in enumerate(lines):
+            if keep[i]:
+                excerpt.append(line)
+            elif i == 0 or keep[i - 1]:
+                excerpt.append(placeholder)
+            else:
+                excerpt.append("")
+        
+        return SourceBuffer('\n'.join(excerpt), source.filename)
+    
+    async def _analyze_structured(self, source: SourceBuffer, filename: str,
+                                  exclude_types: Sequence[str] = ()) -> Dict[str, Any]:
+        """
+        Single-round-trip analysis returning vulnerabilities, insights and fixes together.
+        Sections that fail schema validation are retried on their own.
+        """
+        prompt = self._create_structured_prompt(exclude_types)
+        conversation = self._conversation(self._fit_source(source, filename, prompt, follow_ups=True), filename)
+        response = await self._call_openai_api(conversation, prompt, json_mode=True, stage="structured")
+        conversation.answered(prompt, response, self._routed_model("structured"))
+        data = self._load_json_object(response)
+        round_trips = 1
+        
+        sections, errors = self._validate_structured_sections(data)
+        
+        retries = 0
+        while errors and retries < self.structured_max_retries:
+            # Fixes reference finding ids, so they are re-requested whenever findings are
+            if "vulnerabilities" in errors:
+                errors.setdefault("fixes", "re-requested with vulnerabilities")
+                sections.pop("fixes", None)
+            
+            retry_prompt = self._create_section_retry_prompt(errors, sections)
+            retry_data = self._load_json_object(
+                await self._call_openai_api(conversation, retry_prompt, json_mode=True, stage="structured_retry")
+            )
+            round_trips += 1
+            retries += 1
+            
+            retried_sections, errors = self._validate_structured_sections(retry_data, only=list(errors))
+            sections.update(retried_sections)
+        
+        if "vulnerabilities" not in sections:
+            raise ValueError(f"Structured analysis failed validation: {errors.get('vulnerabilities')}")
+        
+        # Keep only fixes for findings that exist and meet the severity threshold,
+        # whichever round trip the fixes and the findings came from
+        if "fixes" in sections:
+            threshold = SEVERITY_RANK.get(self.fix_severity_threshold, 0)
+            eligible = {
+                f.id for f in sections["vulnerabilities"]
+                if SEVERITY_RANK.get(f.severity, 0) >= threshold
+            }
+            sections["fixes"] = [fix for fix in sections["fixes"] if fix.vulnerabilityId in eligible]
+        
+        # Attach fixes to the findings they belong to
+        fixes_by_id = {fix.vulnerabilityId: fix for fix in sections.get("fixes", [])}
+        vulnerabilities = []
+        fixes = []
+        for finding in sections["vulnerabilities"]:
+            fix = fixes_by_id.get(finding.id)
+            code_fix = CodeFix(**fix.model_dump(exclude={"vulnerabilityId"})) if fix else None
+            if code_fix:
+                fixes.append(code_fix)
+            vulnerabilities.append(self._build_vulnerability(finding.model_dump(), filename, code_fix))
+        
+        return {
+            "vulnerabilities": self.finding_merger.merge(self._without_types(vulnerabilities, exclude_types)),
+            "insights": sections.get("insights") or self._default_insights(),
+            "fixes": fixes,
+            "analysis_metadata": {
+                "model": self._routed_model("structured"),
+                "timestamp": datetime.now().isoformat(),
+                "confidence": data.get("confidence", 0.8) if isinstance(data, dict) else 0.8,
+                "mode": "structured",
+                "round_trips": round_trips,
+                "failed_sections": list(errors)
+            }
+        }
+    
+    def _create_structured_prompt(self, exclude_types: Sequence[str] = ()) -> str:
+        """Create a single prompt requesting findings, insights and fixes together, asked after the contract block"""
+        return f"""
+You are an expert smart contract security auditor. Analyze the Solidity contract above and return
+vulnerabilities, insights and code fixes in ONE JSON object.
+
+Respond with a single JSON object matching exactly this schema:
+
+{{
+    "vulnerabilities": [
+        {{
+            "id": "V1",
+            "title": "Vulnerability Title",
+            "severity": "CRITICAL|HIGH|MEDIUM|LOW|INFO",
+            "type": "Reentrancy|Access Control|Integer Overflow|etc",
+            "description": "Detailed description of the vulnerability",
+            "location": {{"startLine": 10, "endLine": 15, "function": "function_name"}},
+            "impact": "What could happen if exploited",
+            "likelihood": "How likely is exploitation",
+            "riskScore": 8.5,
+            "recommendation": "How to fix this issue",
+            "potentialLoss": "Estimated financial impact",
+            "cweId": "CWE-841"
+        }}
+    ],
+    "insights": [
+        {{
+            "category": "Security|Performance|Best Practice",
+            "insight": "Specific insight about the contract",
+            "confidence": 0.9,
+            "actionable": true
+        }}
+    ],
+    "fixes": [
+        {{
+            "vulnerabilityId": "V1",
+            "description": "Brief description of the fix",
+            "originalCode": "The vulnerable code snippet",
+            "fixedCode": "The secure code replacement",
+            "explanation": "Why this fix works",
+            "riskReduction": "Percentage of risk reduced"
+        }}
+    ],
+    "confidence": 0.9
+}}
+
+Rules:
+- Give every vulnerability a unique short id and report each issue only once
+- Provide 3-5 insights about security posture and code quality
+- Provide one fix for every vulnerability with severity {self.fix_severity_threshold} or above,
+  referencing it by vulnerabilityId; keep originalCode and fixedCode to the minimal snippet
+- Focus on exploitable vulnerabilities that could cause real financial loss
+{self._focus_instructions(exclude_types)}"""
+    
+    def _create_section_retry_prompt(self, errors: Dict[str, str], sections: Dict[str, Any]) -> str:
+        """
+        Create a prompt re-requesting only the sections that failed validation,
+        asked as a follow-up to the structured request and its response
+        """
+        failed = ", ".join(errors)
+        error_lines = "\n".join(f"- {section}: {error}" for section, error in errors.items())
+        
+        known_findings = ""
+        if "vulnerabilities" in sections:
+            summary = [
+                {"id": f.id, "title": f.title, "severity": f.severity, "type": f.type,
+                 "startLine": f.location.startLine, "endLine": f.location.endLine}
+                for f in sections["vulnerabilities"]
+            ]
+            known_findings = f"\nALREADY VALIDATED VULNERABILITIES:\n{json.dumps(summary, indent=2)}\n"
+        
+        return f"""
+Your previous smart contract audit response had invalid sections: {failed}.
+
+VALIDATION ERRORS:
+{error_lines}
+{known_findings}
+Return a JSON object containing ONLY the keys: {failed}.
+Use the same schema as before: "vulnerabilities" items need id, title, severity
+(CRITICAL|HIGH|MEDIUM|LOW|INFO), type, description and location {{startLine, endLine, function}};
+"insights" items need category, insight, confidence (0-1) and actionable (boolean);
+"fixes" items need vulnerabilityId, description, originalCode, fixedCode, explanation and
+riskReduction, one for every vulnerability with severity {self.fix_severity_threshold} or above.
+"""
+    
+    def _validate_structured_sections(self, data: Any, only: Optional[List[str]] = None) -> tuple:
+        """Validate each section of a structured response, returning (sections, errors)"""
+        sections: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        
+        if not isinstance(data, dict):
+            data = {}
+        
+        for section, validator in self.section_validators.items():
+            if only is not None and section not in only:
+                continue
+            
+            if section not in data:
+                errors[section] = "section missing"
+                continue
+            
+            try:
+                sections[section] = validator.validate_python(data[section])
+            except ValidationError as e:
+                errors[section] = str(e)[:500]
+        
+        return sections, errors
+    
+    def _load_json_object(self, response: str) -> Dict[str, Any]:
+        """Load a JSON object from a model response, tolerating surrounding text"""
         try:
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
+            return json.loads(response)
+        except (json.JSONDecodeError, TypeError):
+            json_match = re.search(r'\{.*\}', response or "", re.DOTALL)
             if json_match:
-                ai_data = json.loads(json_match.group())
-            else:
-                # Fallback if JSON parsing fails
-                return {"vulnerabilities": [], "confidence": 0.5}
+                try:
+                    return json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    pass
+        return {}
+    
+    async def _call_openai_api(self, conversation: PromptConversation, prompt: str, json_mode: bool = False,
+                               stage: str = "analysis") -> str:
+        """
+        Call OpenAI API with error handling, asking prompt after the conversation's
+        shared prefix and recording token usage under stage. A call routed away
+        from the request's model is retried on it once if it fails.
+        """
+        messages = conversation.ask(prompt)
+        extra_args = {"response_format": {"type": "json_object"}} if json_mode else {}
+        prompt_tokens, routes = self._routes(stage, messages, conversation)
+        failure = None
+        for model, reason in routes:
+            max_tokens = self._completion_budget(messages, model)
+            started = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.1,  # Low temperature for consistency
+                    max_tokens=max_tokens,
+                    timeout=30,
+                    **extra_args
+                )
+            except Exception as e:
+                print(f"OpenAI API error: {str(e)}")
+                self.model_router.record(stage, model, reason, prompt_tokens, self._elapsed_ms(started), ok=False)
+                failure = e
+                continue
+            self.model_router.record(stage, model, reason, prompt_tokens, self._elapsed_ms(started))
+            
+            content = response.choices[0].message.content
+            if not self._record_reported_usage(stage, getattr(response, "usage", None)):
+                self._record_usage(
+                    stage,
+                    self.token_counter.count_messages(messages, model),
+                    self.token_counter.count(content or "", model),
+                    model=model
+                )
+            
+            return content
+        
+        raise failure
+    
+    async def _stream_openai_api(self, conversation: PromptConversation, prompt: str,
+                                 on_item: Callable[[Dict[str, Any]], None], stage: str = "analysis") -> Dict[str, Any]:
+        """
+        Stream a completion through an incremental JSON parser, calling on_item
+        with each vulnerability object as soon as it is complete. A response cut
+        short keeps every finding completed before the cut; one that failed
+        before any finding is retried like _call_openai_api. The exchange is
+        added to the conversation's prefix for follow-up calls.
+        """
+        messages = conversation.ask(prompt)
+        extra_args = {"extra_body": {"stream_options": {"include_usage": True}}} if self.stream_usage else {}
+        prompt_tokens, routes = self._routes(stage, messages, conversation)
+        failure = None
+        for model, reason in routes:
+            parser = IncrementalJSONParser("vulnerabilities")
+            max_tokens = self._completion_budget(messages, model)
+            completion: List[str] = []
+            usage = None
+            started = time.perf_counter()
+            failure = None
+            streamed = False
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.1,  # Low temperature for consistency
+                    max_tokens=max_tokens,
+                    timeout=30,
+                    stream=True,
+                    **extra_args
+                )
+                streamed = True
+                
+                async for chunk in stream:
+                    # The usage block, when requested, comes in a final chunk without choices
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content or ""
+                    completion.append(content)
+                    for item in parser.feed(content):
+                        on_item(item)
+                    
+            except Exception as e:
+                print(f"OpenAI API error: {str(e)}")
+                if not parser.items:
+                    failure = e
+            finally:
+                # A request that failed before a response used nothing; without
+                # a usage block both sides are counted locally
+                if streamed and not self._record_reported_usage(stage, usage):
+                    self._record_usage(
+                        stage,
+                        self.token_counter.count_messages(messages, model),
+                        self.token_counter.count(''.join(completion), model),
+                        model=model
+                    )
+            
+            self.model_router.record(stage, model, reason, prompt_tokens, self._elapsed_ms(started), ok=failure is None)
+            if failure is None:
+                conversation.answered(prompt, ''.join(completion), model)
+                return parser.result()
+        
+        raise failure
+    
+    def _routes(self, stage: str, messages: List[Dict[str, str]],
+                conversation: PromptConversation) -> Tuple[int, List[Tuple[str, str]]]:
+        """
+        Prompt tokens of a call and the (model, reason) pairs to try in order:
+        the routed model, then the request's own model if routing chose another.
+        Follow-ups stay on the model that answered the analysis while their
+        shared prefix is long enough to be cached.
+        """
+        prompt_tokens = self.token_counter.count_messages(messages, self.model)
+        affinity = None
+        if conversation.model and (
+            self.token_counter.count_messages(conversation.messages, self.model) >= PROMPT_CACHE_MIN_TOKENS
+        ):
+            affinity = conversation.model
+        model, reason = self.model_router.route(
+            stage, prompt_tokens, min(self.max_tokens, 256), current_ai_model.get(), affinity
+        )
+        routes = [(model, reason)]
+        if model != self.model:
+            routes.append((self.model, ROUTE_ESCALATED))
+        return prompt_tokens, routes
+    
+    def _routed_model(self, stage: str) -> str:
+        """Model that served the current request's last successful call of a stage, else the request's model"""
+        routing = current_model_routing.get()
+        if routing is not None:
+            for decision in reversed(routing.decisions):
+                if decision.stage == stage and decision.ok:
+                    return decision.model
+        return self.model
+    
+    def _elapsed_ms(self, started: float) -> float:
+        """Milliseconds since a perf_counter reading"""
+        return (time.perf_counter() - started) * 1000
+    
+    def _conversation(self, source: SourceBuffer, filename: str) -> PromptConversation:
+        """
+        Conversation about a contract: the system prompt, then the contract
+        block. Nothing that varies between calls may come before the contract.
+        """
+        return PromptConversation([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"""CONTRACT FILE: {filename}
+CONTRACT CODE:
+```solidity
+{source.text}
+```"""}
+        ])
+    
+    def _completion_budget(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+        """
+        max_tokens for a call: the configured budget, shrunk to what the context
+        window leaves. Prompts that leave no useful room fail here instead of
+        costing a rejected API call.
+        """
+        model = model or self.model
+        prompt_tokens = self.token_counter.count_messages(messages, model)
+        available = self.token_counter.context_window(model) - prompt_tokens
+        if available < min(self.max_tokens, 256):
+            raise ValueError(
+                f"Prompt of {prompt_tokens} tokens exceeds the {model} context window"
+            )
+        return min(self.max_tokens, available)
+    
+    def _fit_source(self, source: SourceBuffer, filename: str, prompt: str, follow_ups: bool = False) -> SourceBuffer:
+        """
+        Trim a contract so its conversation and prompt fit the model's context
+        window with room for the completion, and with follow_ups also for the
+        response carried into follow-up calls. Comments go first, then
+        trailing code; line numbers are preserved either way.
+        """
+        template_tokens = self.token_counter.count_messages(
+            self._conversation(EMPTY_SOURCE, filename).ask(prompt), self.model
+        )
+        completions = 2 if follow_ups else 1
+        available = self.token_counter.context_window(self.model) - completions * self.max_tokens - template_tokens
+        source_tokens = self.token_counter.count(source.text, self.model)
+        if source_tokens <= available:
+            return source
+        
+        usage = current_token_usage.get()
+        if usage is not None:
+            usage.trimmed_prompts += 1
+        
+        stripped = SourceBuffer(strip_comments(source.text), source.filename)
+        fitted = stripped
+        source_tokens = self.token_counter.count(fitted.text, self.model)
+        keep_chars = len(stripped)
+        while source_tokens > available and keep_chars > 0:
+            # Keep the leading code that fits, assuming tokens spread evenly over characters
+            keep_chars = min(keep_chars - 1, int(keep_chars * available / source_tokens * 0.95))
+            last_line = stripped.line_of(max(keep_chars, 0))
+            fitted = self._build_region_excerpt(
+                stripped, [(1, last_line)], 0, placeholder="// ... remaining code omitted to fit the model context ..."
+            )
+            source_tokens = self.token_counter.count(fitted.text, self.model)
+        
+        print(f"Trimmed {source.filename or 'contract'} to {source_tokens} tokens for {self.model}")
+        return fitted
+    
+    def _record_usage(self, stage: str, prompt_tokens: int, completion_tokens: int, exact: bool = False,
+                      model: Optional[str] = None, cached_tokens: int = 0) -> None:
+        """Add a call's tokens to the current request's usage, if one is being tracked"""
+        usage = current_token_usage.get()
+        if usage is None:
+            return
+        usage.record(stage, prompt_tokens, completion_tokens, cached_tokens)
+        if not exact and not self.token_counter.is_exact(model or self.model):
+            usage.estimated = True
+    
+    def _record_reported_usage(self, stage: str, usage: Any) -> bool:
+        """
+        Record the usage block of a response, including the prompt tokens the
+        provider served from its cache. False when the response had none.
+        """
+        def field(value: Any, name: str) -> Any:
+            # Fields newer than the SDK's models arrive as plain dicts
+            return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+        
+        if usage is None or field(usage, "prompt_tokens") is None:
+            return False
+        details = field(usage, "prompt_tokens_details")
+        self._record_usage(
+            stage,
+            field(usage, "prompt_tokens"),
+            field(usage, "completion_tokens") or 0,
+            exact=True,
+            cached_tokens=(field(details, "cached_tokens") if details is not None else 0) or 0
+        )
+        return True
+    
+    async def _stream_analysis(self, conversation: PromptConversation, prompt: str, filename: str,
+                               exclude_types: Sequence[str] = (),
+                               on_vulnerability: Optional[Callable[[VulnerabilityReport], None]] = None,
+                               stage: str = "analysis") -> Dict[str, Any]:
+        """Stream an analysis prompt, building each finding as it arrives"""
+        vulnerabilities: List[VulnerabilityReport] = []
+        
+        def on_item(vuln_data: Dict[str, Any]) -> None:
+            vuln = self._build_finding(vuln_data, filename)
+            if vuln is None or not self._without_types([vuln], exclude_types):
+                return
+            vulnerabilities.append(vuln)
+            if on_vulnerability:
+                on_vulnerability(vuln)
+        
+        ai_data = await self._stream_openai_api(conversation, prompt, on_item, stage)
+        return {
+            "vulnerabilities": vulnerabilities,
+            "confidence": ai_data.get("confidence", 0.8)
+        }
+    
+    def _parse_ai_response(self, ai_response: str, source: SourceBuffer, filename: str) -> Dict[str, Any]:
+        """Parse AI response and convert to structured format"""
+        try:
+            ai_data = parse_json_object(ai_response)
             
             vulnerabilities = []
             for vuln_data in ai_data.get("vulnerabilities", []):
-                # Create vulnerability report
-                vulnerability = VulnerabilityReport(
-                    id=self._generate_vuln_id(vuln_data.get("title", "unknown")),
-                    title=vuln_data.get("title", "Unknown Vulnerability"),
-                    severity=vuln_data.get("severity", "MEDIUM"),
-                    type=vuln_data.get("type", "Unknown"),
-                    description=vuln_data.get("description", ""),
-                    location=VulnerabilityLocation(
-                        file=filename,
-                        startLine=vuln_data.get("location", {}).get("startLine", 1),
-                        endLine=vuln_data.get("location", {}).get("endLine", 1),
-                        function=vuln_data.get("location", {}).get("function")
-                    ),
-                    impact=vuln_data.get("impact", "Unknown impact"),
-                    likelihood=vuln_data.get("likelihood", "Unknown likelihood"),
-                    riskScore=float(vuln_data.get("riskScore", 5.0)),
-                    recommendation=vuln_data.get("recommendation", "Review and fix"),
-                    detectionMethod="AI Analysis",
-                    potentialLoss=vuln_data.get("potentialLoss"),
-                    references=[]
-                )
-                vulnerabilities.append(vulnerability)
+                vuln = self._build_finding(vuln_data, filename)
+                if vuln is not None:
+                    vulnerabilities.append(vuln)
             
             return {
                 "vulnerabilities": vulnerabilities,
                 "confidence": ai_data.get("confidence", 0.8)
             }
             
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)}")
-            return {"vulnerabilities": [], "confidence": 0.3}
         except Exception as e:
             print(f"Response parsing error: {str(e)}")
             return {"vulnerabilities": [], "confidence": 0.3}
     
-    async def _generate_insights(self, contract_code: str, analysis: Dict) -> List[AIInsight]:
-        """Generate AI insights about the contract"""
+    def _build_finding(self, vuln_data: Any, filename: str) -> Optional[VulnerabilityReport]:
+        """Build a finding from one streamed item, skipping items that do not fit the schema"""
+        try:
+            return self._build_vulnerability(vuln_data, filename)
+        except (AttributeError, TypeError, ValueError) as e:
+            print(f"Skipping malformed AI finding: {str(e)}")
+            return None
+    
+    def _build_vulnerability(self, vuln_data: Dict[str, Any], filename: str,
+                             suggested_fix: Optional[CodeFix] = None) -> VulnerabilityReport:
+        """Create a vulnerability report from AI-provided finding data"""
+        location = vuln_data.get("location") or {}
+        # A finding the model gave no line for stays unlocated rather than pinned to line 1
+        start_line = location.get("startLine") or UNLOCATED_LINE
+        end_line = (location.get("endLine") or start_line) if start_line else UNLOCATED_LINE
+        return VulnerabilityReport(
+            id=self._generate_vuln_id(vuln_data.get("title", "unknown"), location),
+            title=vuln_data.get("title", "Unknown Vulnerability"),
+            severity=vuln_data.get("severity", "MEDIUM"),
+            type=vuln_data.get("type", "Unknown"),
+            description=vuln_data.get("description", ""),
+            location=VulnerabilityLocation(
+                file=filename,
+                startLine=start_line,
+                endLine=end_line,
+                function=location.get("function")
+            ),
+            impact=vuln_data.get("impact", "Unknown impact"),
+            likelihood=vuln_data.get("likelihood", "Unknown likelihood"),
+            riskScore=float(vuln_data.get("riskScore", 5.0)),
+            cweId=vuln_data.get("cweId"),
+            recommendation=vuln_data.get("recommendation", "Review and fix"),
+            detectionMethod="AI Analysis",
+            potentialLoss=vuln_data.get("potentialLoss"),
+            suggestedFix=suggested_fix,
+            references=[]
+        )
+    
+    async def _generate_insights(self, conversation: PromptConversation, analysis: Dict) -> List[AIInsight]:
+        """Generate AI insights about the contract, as a follow-up to its analysis"""
         insights_prompt = f"""
-Based on this smart contract analysis, provide 3-5 key insights about the contract's security posture, code quality, and recommendations.
+Based on your analysis of the contract above, provide 3-5 key insights about the contract's security posture, code quality, and recommendations.
 
 CONTRACT ANALYSIS:
 - Found {len(analysis['vulnerabilities'])} vulnerabilities
@@ -237,7 +997,7 @@ Provide insights in JSON format:
 """
         
         try:
-            response = await self._call_openai_api(insights_prompt)
+            response = await self._call_openai_api(conversation, insights_prompt, stage="insights")
             json_match = re.search(r'\[.*\]', response, re.DOTALL)
             
             if json_match:
@@ -259,6 +1019,10 @@ Provide insights in JSON format:
             print(f"Insights generation error: {str(e)}")
         
         # Fallback insights
+        return self._default_insights()
+    
+    def _default_insights(self) -> List[AIInsight]:
+        """Insights used when the AI does not return usable ones"""
         return [
             AIInsight(
                 category="Security",
@@ -268,26 +1032,101 @@ Provide insights in JSON format:
             )
         ]
     
-    async def _generate_fixes(self, contract_code: str, vulnerabilities: List[VulnerabilityReport]) -> List[CodeFix]:
-        """Generate AI-powered code fixes for vulnerabilities"""
-        if not vulnerabilities:
-            return []
+    async def _generate_fixes(self, source: SourceBuffer, vulnerabilities: List[VulnerabilityReport],
+                              conversation: PromptConversation,
+                              started: Optional[Dict[str, asyncio.Future]] = None,
+                              speculative: Sequence[Tuple[VulnerabilityReport, asyncio.Future]] = ()) -> List[CodeFix]:
+        """
+        Generate AI-powered code fixes for the top vulnerabilities concurrently.
+        started maps finding ids to fix requests already in flight; those for
+        findings that did not survive merging are cancelled. speculative holds
+        fix requests for pattern findings: one duplicating a vulnerability is
+        used for it, unmatched ones fill fix slots left over and the rest are
+        cancelled.
+        """
+        started = dict(started or {})
+        unclaimed = list(speculative)
+        tasks = []
+        for vuln in vulnerabilities[:self.max_fixes]:
+            task = started.pop(vuln.id, None)
+            if task is None:
+                match = next(
+                    (i for i, (pattern, _) in enumerate(unclaimed) if self.finding_merger.same_issue(vuln, pattern)),
+                    None
+                )
+                if match is not None:
+                    task = unclaimed.pop(match)[1]
+            tasks.append(
+                task if task is not None else asyncio.ensure_future(self._generate_fix(source, vuln, conversation))
+            )
         
-        fixes = []
+        while unclaimed and len(tasks) < self.max_fixes:
+            tasks.append(unclaimed.pop(0)[1])
+        
+        for task in list(started.values()) + [task for _, task in unclaimed]:
+            task.cancel()
+        
+        results = await asyncio.gather(*tasks)
+        return [fix for fix in results if fix is not None]
+    
+    async def _generate_fix(self, source: SourceBuffer, vuln: VulnerabilityReport,
+                            conversation: PromptConversation, stage: str = "fixes") -> Optional[CodeFix]:
+        """
+        Generate an AI-powered code fix for one vulnerability, asked in the
+        contract's conversation. Snippets seen before in any contract are
+        served from the fix cache without a call.
+        """
+        try:
+            fingerprint = self.fix_cache.fingerprint(source, vuln)
+            if fingerprint:
+                cached = self.fix_cache.lookup(fingerprint)
+                if cached:
+                    return cached
+            
+            response = await self._call_openai_api(conversation, self._create_fix_prompt(vuln), stage=stage)
+            fix_data = self._load_json_object(response)
+            
+            if fix_data:
+                fix = CodeFix(
+                    description=fix_data.get("description", f"Fix for {vuln.title}"),
+                    originalCode=fix_data.get("originalCode", "Code snippet not available"),
+                    fixedCode=fix_data.get("fixedCode", "Fix not available"),
+                    explanation=fix_data.get("explanation", "Explanation not available"),
+                    riskReduction=fix_data.get("riskReduction", "Unknown")
+                )
+                if fingerprint and "originalCode" in fix_data and "fixedCode" in fix_data:
+                    self.fix_cache.store(fingerprint, fix, source, vuln.type)
+                return fix
+                
+        except Exception as e:
+            print(f"Fix generation error for {vuln.title}: {str(e)}")
         
-        for vuln in vulnerabilities[:3]:  # Limit to top 3 vulnerabilities
-            fix_prompt = f"""
-Generate a code fix for this vulnerability:
+        return None
+    
+    def _speculative_targets(self, findings: Sequence[VulnerabilityReport]) -> List[VulnerabilityReport]:
+        """Distinct CRITICAL and HIGH pattern findings worth a fix before the AI confirms them, most severe first"""
+        if not self.speculative_fixes:
+            return []
+        severe = [
+            vuln for vuln in self.finding_merger.merge(list(findings))
+            if SEVERITY_RANK.get(vuln.severity.upper(), 0) >= SEVERITY_RANK["HIGH"]
+        ]
+        severe.sort(key=lambda vuln: SEVERITY_RANK.get(vuln.severity.upper(), 0), reverse=True)
+        return severe[:self.max_fixes]
+    
+    def _create_fix_prompt(self, vuln: VulnerabilityReport) -> str:
+        """Create the prompt asking for a fix to one vulnerability, asked after the contract block"""
+        lines = (
+            f"Lines {vuln.location.startLine}-{vuln.location.endLine}"
+            if self.finding_merger.is_located(vuln) else "Not given"
+        )
+        return f"""
+Generate a code fix for this vulnerability in the contract above:
 
 VULNERABILITY: {vuln.title}
 TYPE: {vuln.type}
 DESCRIPTION: {vuln.description}
-LOCATION: Lines {vuln.location.startLine}-{vuln.location.endLine}
-
-ORIGINAL CONTRACT CODE:
-```solidity
-{contract_code}
-```
+LOCATION: {lines}
 
 Provide a fix in JSON format:
 {{
@@ -300,39 +1139,19 @@ Provide a fix in JSON format:
 
 Focus on practical, secure, and minimal changes that fix the specific vulnerability.
 """
-            
-            try:
-                response = await self._call_openai_api(fix_prompt)
-                json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                
-                if json_match:
-                    fix_data = json.loads(json_match.group())
-                    fix = CodeFix(
-                        description=fix_data.get("description", f"Fix for {vuln.title}"),
-                        originalCode=fix_data.get("originalCode", "Code snippet not available"),
-                        fixedCode=fix_data.get("fixedCode", "Fix not available"),
-                        explanation=fix_data.get("explanation", "Explanation not available"),
-                        riskReduction=fix_data.get("riskReduction", "Unknown")
-                    )
-                    fixes.append(fix)
-                    
-            except Exception as e:
-                print(f"Fix generation error for {vuln.title}: {str(e)}")
-                continue
-        
-        return fixes
     
-    def _generate_vuln_id(self, title: str) -> str:
-        """Generate unique vulnerability ID"""
-        title_hash = hashlib.md5(title.encode()).hexdigest()[:8]
+    def _generate_vuln_id(self, title: str, location: Dict[str, Any]) -> str:
+        """Generate a vulnerability ID unique per title and location, so same-title findings stay apart"""
+        key = f"{title}:{location.get('startLine')}:{location.get('endLine')}:{location.get('function')}"
+        title_hash = hashlib.md5(key.encode()).hexdigest()[:8]
         return f"VULN_{title_hash.upper()}"
     
-    def _fallback_analysis(self, contract_code: str, filename: str) -> List[VulnerabilityReport]:
+    def _fallback_analysis(self, source: SourceBuffer, filename: str) -> List[VulnerabilityReport]:
         """Fallback analysis when AI fails"""
         vulnerabilities = []
         
         # Simple pattern-based detection
-        lines = contract_code.split('\n')
+        lines = source.lines
         
         for i, line in enumerate(lines):
             line_lower = line.lower().strip()
@@ -0,0 +1,304 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from app.services.dataflow import FunctionDataflow
+from app.services.solidity_parser import SolidityParser, FunctionSpan, PARSER_REGEXES, declaration_end
+from app.utils.source_buffer import SourceBuffer
+from app.utils.solidity_text import strip_comments_and_strings, match_braces
+
+# Index regexes compiled once at import so preforked workers share them copy-on-write
+INDEX_REGEXES = {
+    'identifier': re.compile(r'(?<![\w.])[A-Za-z_]\w*'),
+    'assignment_target': re.compile(
+        r'(?<![\w.])([A-Za-z_]\w*)(?:\s*\[(?:[^\[\]]|\[[^\[\]]*\])*\]|\s*\.\s*\w+)*\s*(?:[-+*/%&|^]|<<|>>)?=(?!=)'
+    ),
+    'increment_target': re.compile(
+        r'(?<![\w.])([A-Za-z_]\w*)(?:\s*\[(?:[^\[\]]|\[[^\[\]]*\])*\]|\s*\.\s*\w+)*\s*(?:\+\+|--)|(?:\+\+|--)\s*([A-Za-z_]\w*)'
+    ),
+    'delete_target': re.compile(r'\bdelete\s+([A-Za-z_]\w*)'),
+    'array_mutation': re.compile(r'(?<![\w.])([A-Za-z_]\w*)\s*\.\s*(?:push|pop)\s*\('),
+    'internal_call': re.compile(r'(?<![\w.])([A-Za-z_]\w*)\s*\('),
+    'value_transfer': re.compile(r'\.call\{value:|\.send\(|\.transfer\('),
+    'low_level_call': re.compile(r'\.\s*(?:call|delegatecall|staticcall|send)\b'),
+    # A condition's statement runs to the next ';', where checks_sender looks for msg.sender
+    'sender_guard': re.compile(r'\b(?:require|assert|if)\s*\('),
+    'role_check': re.compile(r'\b(?:hasRole|_checkOwner|_checkRole)\s*\('),
+    'modifier_declaration': re.compile(r'\bmodifier\s+(\w+)[^{;]*([{;])'),
+    'parameter_name': re.compile(r'(?<![\w.])[A-Za-z_]\w*')
+}
+
+def checks_sender(text: str) -> bool:
+    """Whether text has a role check, or a require/assert/if reading msg.sender before its statement ends"""
+    if INDEX_REGEXES['role_check'].search(text):
+        return True
+    position = 0
+    while True:
+        guard = INDEX_REGEXES['sender_guard'].search(text, position)
+        if not guard:
+            return False
+        end = text.find(';', guard.end())
+        end = len(text) if end == -1 else end
+        if text.find('msg.sender', guard.end(), end) != -1:
+            return True
+        # Later conditions of the same statement see no more of it
+        position = end
+
+# Trailing words of a parameter declaration that are not its name
+PARAMETER_KEYWORDS = frozenset(('memory', 'storage', 'calldata', 'payable', 'indexed'))
+
+# Modifier names (lowercased) taken to be reentrancy guards
+REENTRANCY_GUARD_MARKERS = ('nonreentrant', 'noreentrancy', 'reentrancyguard')
+REENTRANCY_GUARD_NAMES = frozenset(('lock', 'mutex'))
+
+@dataclass
+class FunctionNode:
+    """
+    Facts about one function. State variables and callees are bitsets:
+    bit i of reads/writes is index.variables[i], bit j of callees is
+    index.functions[j].
+    """
+    span: FunctionSpan
+    reads: int = 0
+    writes: int = 0
+    callees: int = 0
+    sender_check: bool = False
+    low_level_calls: bool = False
+    # (line, writes, callees, value transfer) for every line that has any of them
+    events: List[Tuple[int, int, int, bool]] = field(default_factory=list)
+
+    @property
+    def is_entry_point(self) -> bool:
+        return self.span.has_body and self.span.visibility in ('public', 'external')
+
+class ContractIndex:
+    """
+    Call graph and per-function state-variable read/write sets of a source
+    file, built in one pass over the stripped text. Facts through internal
+    calls are closed over the call graph once, so rules answer
+    cross-function questions with bitwise set operations.
+    """
+
+    def __init__(self, contract_code: Union[str, SourceBuffer], parser: Optional[SolidityParser] = None):
+        parser = parser or SolidityParser()
+        source = SourceBuffer.of(contract_code)
+        stripped = strip_comments_and_strings(source.text)
+        self.lines = stripped.split('\n')
+
+        units = parser.split_contracts(source)
+        state_variables = parser.extract_state_variables(source, units)
+        self.variables: List[str] = list(dict.fromkeys(variable['name'] for variable in state_variables))
+        self.variable_bits: Dict[str, int] = {name: 1 << i for i, name in enumerate(self.variables)}
+
+        self.functions: List[FunctionNode] = [
+            FunctionNode(span) for span in parser.extract_function_spans(source, units) if span.has_body
+        ]
+        # Function masks by name, by (contract, name) and by contract; entry_points masks public/external
+        self._functions_by_name: Dict[str, int] = {}
+        self._functions_by_member: Dict[Tuple[str, str], int] = {}
+        self.contract_functions: Dict[str, int] = {}
+        self.entry_points = 0
+        for i, node in enumerate(self.functions):
+            bit = 1 << i
+            self._functions_by_name[node.span.name] = self._functions_by_name.get(node.span.name, 0) | bit
+            member = (node.span.contract, node.span.name)
+            self._functions_by_member[member] = self._functions_by_member.get(member, 0) | bit
+            self.contract_functions[node.span.contract] = self.contract_functions.get(node.span.contract, 0) | bit
+            if node.is_entry_point:
+                self.entry_points |= bit
+
+        self.sender_check_modifiers = self._sender_check_modifiers(stripped)
+        for i, node in enumerate(self.functions):
+            self._index_function(i, node)
+
+        self.total_reads, self.total_writes, self.total_transfers, self.total_sender_check = self._close_over_calls()
+        self._dataflow: Dict[int, FunctionDataflow] = {}
+        # Mask of the functions per-function rules visit; None visits all of them
+        self.targets: Optional[int] = None
+
+    def bits(self, mask: int) -> Iterator[int]:
+        """Positions of the set bits of a mask"""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def target_functions(self) -> Iterator[Tuple[int, FunctionNode]]:
+        """(position, node) of every function per-function rules should visit"""
+        if self.targets is None:
+            yield from enumerate(self.functions)
+        else:
+            for i in self.bits(self.targets):
+                yield i, self.functions[i]
+
+    def reindex_function(self, i: int, lines: List[str], line_delta: int) -> int:
+        """
+        Re-index function i after an edit inside its body, from the new stripped
+        lines; functions from its last line on move by line_delta. The call graph
+        closure is redone. Returns the mask of functions whose findings may
+        change: i, those whose closed-over facts changed, and their direct
+        callers, which read callee facts at each call site.
+        """
+        self.lines = lines
+        edited = self.functions[i]
+        old_end = edited.span.end_line
+        for j, node in enumerate(self.functions):
+            if j != i and node.span.start_line >= old_end and line_delta:
+                node.span.start_line += line_delta
+                node.span.end_line += line_delta
+                node.events = [(line + line_delta, writes, callees, transfers)
+                               for line, writes, callees, transfers in node.events]
+                self._dataflow.pop(j, None)
+
+        edited.span.end_line += line_delta
+        node = FunctionNode(edited.span)
+        self.functions[i] = node
+        self._index_function(i, node)
+        self._dataflow.pop(i, None)
+
+        old = (self.total_reads, self.total_writes, self.total_transfers, self.total_sender_check)
+        self.total_reads, self.total_writes, self.total_transfers, self.total_sender_check = self._close_over_calls()
+        changed = 1 << i
+        for j, facts in enumerate(zip(*old)):
+            if facts != (self.total_reads[j], self.total_writes[j], self.total_transfers[j], self.total_sender_check[j]):
+                changed |= 1 << j
+        callers = 0
+        for j, node in enumerate(self.functions):
+            if node.callees & changed:
+                callers |= 1 << j
+        return changed | callers
+
+    def variable_names(self, mask: int) -> List[str]:
+        return [self.variables[i] for i in self.bits(mask)]
+
+    def is_reentrancy_guarded(self, node: FunctionNode) -> bool:
+        return any(
+            modifier.lower() in REENTRANCY_GUARD_NAMES
+            or any(marker in modifier.lower() for marker in REENTRANCY_GUARD_MARKERS)
+            for modifier in node.span.modifiers
+        )
+
+    def is_access_controlled(self, i: int) -> bool:
+        """Guarded by an only* or msg.sender-checking modifier, or a sender check in its body or callees"""
+        node = self.functions[i]
+        return self.total_sender_check[i] or any(
+            modifier.startswith('only') or modifier in self.sender_check_modifiers
+            for modifier in node.span.modifiers
+        )
+
+    def dataflow(self, i: int) -> FunctionDataflow:
+        """Control-flow graph and solved taint/call-check facts of a function, built on first use"""
+        if i not in self._dataflow:
+            span = self.functions[i].span
+            text = '\n'.join(self.lines[span.start_line - 1:span.end_line])
+            header = PARSER_REGEXES['function_header'].search(text, 0, declaration_end(text))
+            parameters = []
+            body, first_line = '', span.start_line
+            if header:
+                for declaration in header.group(3).split(','):
+                    words = INDEX_REGEXES['parameter_name'].findall(declaration)
+                    if len(words) > 1 and words[-1] not in PARAMETER_KEYWORDS:
+                        parameters.append(words[-1])
+                body = text[header.end():match_braces(text).get(header.end() - 1, len(text))]
+                first_line = span.start_line + text.count('\n', 0, header.end())
+            self._dataflow[i] = FunctionDataflow(body, first_line, parameters, self.functions[i].is_entry_point)
+        return self._dataflow[i]
+
+    def stale_writes(self, i: int) -> Optional[Tuple[int, int, int]]:
+        """
+        First value transfer of a function (direct or through an internal call)
+        and the state written after it: (transfer line, first write line, written
+        variables mask), or None when every write precedes the transfer.
+        """
+        transfer_line = None
+        first_write = 0
+        stale = 0
+        for line, writes, callees, transfers in self.functions[i].events:
+            for callee in self.bits(callees):
+                writes |= self.total_writes[callee]
+                transfers = transfers or self.total_transfers[callee]
+            if transfer_line is not None and writes:
+                first_write = first_write or line
+                stale |= writes
+            if transfers and transfer_line is None:
+                transfer_line = line
+        return (transfer_line, first_write, stale) if stale else None
+
+    def _index_function(self, i: int, node: FunctionNode) -> None:
+        """Record reads, writes, internal calls and value transfers line by line"""
+        contract = node.span.contract
+        own_bit = 1 << i
+        for line_number in range(node.span.start_line, node.span.end_line + 1):
+            line = self.lines[line_number - 1]
+            if not line.strip():
+                continue
+
+            reads = 0
+            for match in INDEX_REGEXES['identifier'].finditer(line):
+                reads |= self.variable_bits.get(match.group(), 0)
+            node.reads |= reads
+
+            writes = 0
+            if reads:
+                for pattern in ('assignment_target', 'increment_target', 'delete_target', 'array_mutation'):
+                    for match in INDEX_REGEXES[pattern].finditer(line):
+                        target = match.group(1) or (match.group(2) if pattern == 'increment_target' else None)
+                        writes |= self.variable_bits.get(target, 0)
+                node.writes |= writes
+
+            callees = 0
+            for match in INDEX_REGEXES['internal_call'].finditer(line):
+                name = match.group(1)
+                # Prefer the caller's own contract, else any contract (inherited or library code)
+                callees |= self._functions_by_member.get((contract, name)) or self._functions_by_name.get(name, 0)
+            callees &= ~own_bit
+            node.callees |= callees
+
+            transfers = bool(INDEX_REGEXES['value_transfer'].search(line))
+            node.sender_check = node.sender_check or checks_sender(line)
+            node.low_level_calls = node.low_level_calls or bool(INDEX_REGEXES['low_level_call'].search(line))
+
+            if writes or callees or transfers:
+                node.events.append((line_number, writes, callees, transfers))
+
+    def _close_over_calls(self) -> Tuple[List[int], List[int], List[bool], List[bool]]:
+        """
+        Propagate reads, writes, value transfers and sender checks from callees
+        to callers until nothing changes. Each pass is linear in the call
+        edges and the number of passes is bounded by the call depth.
+        """
+        reads = [node.reads for node in self.functions]
+        writes = [node.writes for node in self.functions]
+        transfers = [any(event[3] for event in node.events) for node in self.functions]
+        checks = [node.sender_check for node in self.functions]
+
+        changed = True
+        while changed:
+            changed = False
+            # Callees tend to be declared before callers, so walk in declaration order
+            for i, node in enumerate(self.functions):
+                if not node.callees:
+                    continue
+                r, w, t, c = reads[i], writes[i], transfers[i], checks[i]
+                for j in self.bits(node.callees):
+                    r |= reads[j]
+                    w |= writes[j]
+                    t = t or transfers[j]
+                    c = c or checks[j]
+                if (r, w, t, c) != (reads[i], writes[i], transfers[i], checks[i]):
+                    reads[i], writes[i], transfers[i], checks[i] = r, w, t, c
+                    changed = True
+
+        return reads, writes, transfers, checks
+
+    def _sender_check_modifiers(self, stripped: str) -> set:
+        """Names of modifiers whose body checks msg.sender"""
+        closing = match_braces(stripped)
+        names = set()
+        for match in INDEX_REGEXES['modifier_declaration'].finditer(stripped, 0, declaration_end(stripped)):
+            if match.group(2) != '{':
+                continue
+            body = stripped[match.end() - 1:closing.get(match.end() - 1, match.end())]
+            if checks_sender(body):
+                names.add(match.group(1))
+        return names
@@ -0,0 +1,167 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.models.schemas import ContractInfo, KnownLibraryMatch
+from app.services.solidity_parser import SolidityParser, ContractUnit
+from app.services.vulnerability_detector import VulnerabilityDetector
+from app.services.request_profiler import RuleStats, merge_rule_stats
+from app.utils.source_buffer import SourceBuffer
+
+# Parser and detector for whichever process runs analyze_unit, built on first use
+_unit_services: Dict[str, Any] = {}
+
+def analyze_unit(unit_code: str, analysis_code: Optional[str], name: str, kind: str,
+                 start_line: int, end_line: int,
+                 profile_rules: bool = False) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Optional[RuleStats]]:
+    """
+    Parse and pattern-scan one contract unit. Runs in a pool worker for large
+    files, so it takes and returns plain data only. Per-rule stats are
+    returned when profile_rules is set.
+    """
+    if not _unit_services:
+        _unit_services.update(parser=SolidityParser(), detector=VulnerabilityDetector())
+    parser = _unit_services['parser']
+    detector = _unit_services['detector']
+
+    contract_info = parser.parse_contract(unit_code, f"{name}.sol")
+    info = contract_info.model_dump()
+    info.update(name=name, kind=kind, startLine=start_line, endLine=end_line)
+
+    findings = []
+    rule_stats = {} if profile_rules else None
+    if analysis_code is not None:
+        raw_findings = detector.scan(analysis_code, contract_info, line_offset=start_line - 1, rule_stats=rule_stats)
+        findings = detector.serialize(raw_findings, name)
+
+    return info, findings, rule_stats
+
+@dataclass
+class UnitAnalysis:
+    """Per-contract results of a source file, merged back in source order"""
+    contracts: List[Dict[str, Any]] = field(default_factory=list)
+    vulnerabilities: List[Dict[str, Any]] = field(default_factory=list)
+    # (unit, unit source with library code masked) for every unit worth an AI review
+    review_units: List[Tuple[ContractUnit, SourceBuffer]] = field(default_factory=list)
+    split: bool = False
+    # Per-rule detector cost, when profiling was requested
+    rule_stats: Optional[RuleStats] = None
+
+class ContractUnitAnalyzer:
+    """Split multi-contract files into units and analyze them in parallel worker processes"""
+
+    def __init__(self, parser: SolidityParser, detector: VulnerabilityDetector,
+                 workers: Optional[int] = None, min_lines: Optional[int] = None):
+        self.parser = parser
+        self.detector = detector
+        self.workers = workers if workers is not None else int(
+            os.getenv("CONTRACT_ANALYSIS_WORKERS", str(min(4, os.cpu_count() or 1)))
+        )
+        # Smaller files are analyzed inline; process hand-off would cost more than it saves
+        self.min_lines = min_lines if min_lines is not None else int(os.getenv("CONTRACT_SPLIT_MIN_LINES", "1500"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def plan(self, source: SourceBuffer, analysis_code: SourceBuffer, known_libraries: List[KnownLibraryMatch],
+             profile_rules: bool = False) -> Tuple[List[ContractUnit], List[tuple]]:
+        """Split the file and build one analyze_unit job per unit"""
+        units = self.parser.split_contracts(source)
+        jobs = []
+        for unit in units:
+            # Interfaces have no bodies and fully vetted library units were masked out
+            scanned = unit.kind != 'interface' and not self._fully_known(unit, known_libraries)
+            jobs.append((
+                source.span(unit.start_line, unit.end_line),
+                analysis_code.span(unit.start_line, unit.end_line) if scanned else None,
+                unit.name,
+                unit.kind,
+                unit.start_line,
+                unit.end_line,
+                profile_rules
+            ))
+        return units, jobs
+
+    def analyze_inline(self, source: SourceBuffer, analysis_code: SourceBuffer, contract_info: ContractInfo,
+                       known_libraries: List[KnownLibraryMatch], profile_rules: bool = False) -> UnitAnalysis:
+        """Analyze every unit in this process"""
+        units, jobs = self.plan(source, analysis_code, known_libraries, profile_rules)
+        results = [analyze_unit(*job) for job in jobs]
+        return self._collect(units, jobs, results, source, analysis_code, contract_info, profile_rules)
+
+    async def analyze(self, source: SourceBuffer, analysis_code: SourceBuffer, contract_info: ContractInfo,
+                      known_libraries: List[KnownLibraryMatch], profile_rules: bool = False) -> UnitAnalysis:
+        """Analyze every unit, fanning out to worker processes for large multi-contract files"""
+        units, jobs = self.plan(source, analysis_code, known_libraries, profile_rules)
+
+        results = None
+        if len(jobs) > 1 and self.workers > 1 and source.line_count >= self.min_lines:
+            try:
+                loop = asyncio.get_running_loop()
+                pool = self._get_pool()
+                results = await asyncio.gather(*(loop.run_in_executor(pool, analyze_unit, *job) for job in jobs))
+            except Exception as e:
+                print(f"Contract worker pool error: {str(e)}")
+                self.shutdown()
+        
+        if results is None:
+            results = [analyze_unit(*job) for job in jobs]
+
+        return self._collect(units, jobs, results, source, analysis_code, contract_info, profile_rules)
+
+    def shutdown(self) -> None:
+        """Stop the worker pool, if one was started"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _collect(self, units: List[ContractUnit], jobs: List[tuple], results: List[tuple],
+                 source: SourceBuffer, analysis_code: SourceBuffer, contract_info: ContractInfo,
+                 profile_rules: bool = False) -> UnitAnalysis:
+        """Merge per-unit results back into one file-level result"""
+        result = UnitAnalysis(
+            contracts=[info for info, _, _ in results],
+            vulnerabilities=[finding for _, findings, _ in results for finding in findings],
+            split=len(units) > 1 and source.line_count >= self.min_lines,
+            rule_stats={} if profile_rules else None
+        )
+        if profile_rules:
+            for _, _, rule_stats in results:
+                merge_rule_stats(result.rule_stats, rule_stats)
+
+        for unit, job in zip(units, jobs):
+            if job[1] is not None:
+                result.review_units.append((unit, SourceBuffer(job[1], source.filename)))
+
+        if not units:
+            # No contract declarations (e.g. Vyper): scan the file as a whole
+            result.vulnerabilities = self.detector.serialize(
+                self.detector.scan(analysis_code, contract_info, rule_stats=result.rule_stats), contract_info.name
+            )
+        else:
+            # Free functions live outside every unit
+            remainder = self.parser.top_level_remainder(analysis_code, units)
+            if remainder is not None:
+                result.vulnerabilities.extend(self.detector.serialize(
+                    self.detector.scan(remainder, contract_info, rule_stats=result.rule_stats), contract_info.name
+                ))
+
+        return result
+
+    def _fully_known(self, unit: ContractUnit, known_libraries: List[KnownLibraryMatch]) -> bool:
+        """Whether a unit lies entirely inside a fully matched known library span"""
+        return any(
+            match.fullyMatched and match.startLine <= unit.start_line and unit.end_line <= match.endLine
+            for match in known_libraries
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Start the pool on first use, after any prefork, from a clean forkserver"""
+        if self._pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(method)
+            )
+        return self._pool
@@ -0,0 +1,426 @@
+import re
+import bisect
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.utils.solidity_text import match_braces
+
+# Dataflow regexes compiled once at import so preforked workers share them copy-on-write
+DATAFLOW_REGEXES = {
+    'control': re.compile(r'(if|for|while)\s*\(|(else|do|unchecked)\b'),
+    'opaque_block': re.compile(r'(?:assembly|try)\b'),
+    'call_options': re.compile(r'(?:\.\s*\w+|\bnew\s+[\w.]+)\s*$'),
+    'catch_clause': re.compile(r'\s*catch\b[^{;]*\{'),
+    'identifier': re.compile(r'(?<![\w.])[A-Za-z_]\w*'),
+    'validated': re.compile(r'(?<![\w.])([A-Za-z_]\w*)(?!\s*[.\[\w])'),
+    'assignment': re.compile(r'(?<![=!<>])(?:[-+*/%&|^]|<<|>>)?=(?![=>])'),
+    'low_level_call': re.compile(r'\.\s*(call|delegatecall|staticcall|send)\s*(?:\{[^{}]*\})?\s*\('),
+    'call_receiver': re.compile(r'(?:\w+\s*\([^()]*\)|[\w.]+(?:\[[^\[\]]*\])*)\s*$'),
+    'indexed_or_member': re.compile(r'[\[.]'),
+    # Calldata of a call that only sends value; string contents are blanked, so "" is the empty string
+    'empty_calldata': re.compile(r'\s*(?:(?:hex\s*)?(?:""|\'\')|new\s+bytes\s*\(\s*0\s*\))?\s*$'),
+    'check': re.compile(r'(?:require|assert)\s*\(|return\b'),
+    'exit': re.compile(r'(?:return|revert|throw)\b'),
+    'revert': re.compile(r'(?:revert|throw)\b')
+}
+
+# Words that look like identifiers but never name a variable
+NON_VARIABLES = frozenset((
+    'memory', 'storage', 'calldata', 'payable', 'address', 'return', 'returns', 'delete', 'new',
+    'emit', 'true', 'false', 'require', 'assert', 'revert'
+))
+
+# Receivers are matched on at most this many characters before the call
+MAX_RECEIVER_LENGTH = 200
+
+@dataclass
+class CallSite:
+    """Low-level call in a function body"""
+    kind: str  # call, delegatecall, staticcall or send
+    line: int
+    receiver: List[str]  # Variables named in the receiver expression
+    result: Optional[str] = None  # Variable the success flag is assigned to
+    checked_inline: bool = False  # Result consumed by the statement itself
+    pays_only: bool = False  # A send, or a call with empty calldata: it only transfers value
+
+@dataclass
+class Statement:
+    """CFG node: one simple statement, or the condition of a branch or loop"""
+    text: str
+    line: int
+    is_condition: bool = False
+    successors: List[int] = field(default_factory=list)
+    defs: List[str] = field(default_factory=list)
+    uses: List[str] = field(default_factory=list)
+    validated: List[str] = field(default_factory=list)  # Compared or passed as a whole in a check
+    calls: List[CallSite] = field(default_factory=list)
+
+    @property
+    def is_check(self) -> bool:
+        """Conditions, require/assert and returns consume the values they name"""
+        return self.is_condition or bool(DATAFLOW_REGEXES['check'].match(self.text))
+
+def solve_forward(statements: List[Statement], predecessors: List[List[int]], entry: int,
+                  entry_fact: int, transfer: Callable[[int, int], int]) -> List[int]:
+    """
+    Worklist solver for forward may-problems over int bitsets, where the
+    meet is union. Returns the fact after each statement. Transfer functions
+    are monotone, so a node is revisited only when a predecessor gains a
+    bit and the work stays near-linear in the size of the function.
+    """
+    out = [0] * len(statements)
+    worklist = deque(range(len(statements)))
+    queued = [True] * len(statements)
+    while worklist:
+        node = worklist.popleft()
+        queued[node] = False
+        fact = entry_fact if node == entry else 0
+        for predecessor in predecessors[node]:
+            fact |= out[predecessor]
+        new_out = transfer(node, fact)
+        if new_out != out[node]:
+            out[node] = new_out
+            for successor in statements[node].successors:
+                if not queued[successor]:
+                    queued[successor] = True
+                    worklist.append(successor)
+    return out
+
+class FunctionDataflow:
+    """
+    Control-flow graph of one function body with two bitset analyses solved
+    over it: taint flowing from the parameters, and low-level call results
+    that can reach a function exit without being checked.
+    """
+
+    def __init__(self, body: str, first_line: int, parameters: List[str], tainted_parameters: bool):
+        self.statements: List[Statement] = []
+        self.exits: List[int] = []
+        # Variable name -> bit, parameters first
+        self.variables: Dict[str, int] = {}
+        for name in parameters:
+            self._bit(name)
+
+        self._body = body
+        self._first_line = first_line
+        self._newlines = [i for i, char in enumerate(body) if char == '\n']
+        self._parens = self._match_parens(body)
+        self._braces = match_braces(body)
+        self._pieces = self._split(body)
+        self._cursor = 0
+
+        self.entry, fallthrough = self._parse_sequence()
+        self.exits.extend(fallthrough)
+        for statement in self.statements:
+            self._describe(statement)
+
+        self.predecessors: List[List[int]] = [[] for _ in self.statements]
+        for node, statement in enumerate(self.statements):
+            for successor in statement.successors:
+                self.predecessors[successor].append(node)
+
+        self.calls = [call for statement in self.statements for call in statement.calls]
+
+        self._parameter_taint = sum(self.variables[name] for name in parameters) if tainted_parameters else 0
+        self.taint = solve_forward(self.statements, self.predecessors, self.entry,
+                                   self._parameter_taint, self._taint_transfer)
+
+        # One bit per call whose result is assigned and checked later, if at all
+        self._pending_calls = [call for call in self.calls if call.result is not None and not call.checked_inline]
+        self._pending_bits = {id(call): 1 << i for i, call in enumerate(self._pending_calls)}
+        self._pending_by_result: Dict[str, int] = {}
+        for call in self._pending_calls:
+            self._pending_by_result[call.result] = self._pending_by_result.get(call.result, 0) | self._pending_bits[id(call)]
+        self.unchecked = solve_forward(self.statements, self.predecessors, self.entry, 0, self._check_transfer)
+
+    def tainted_receivers(self) -> List[Tuple[CallSite, List[str]]]:
+        """
+        Calls whose receiver derives from a parameter, with the tainted
+        variable names. Calls that only pay the receiver (withdraw-to) are left out.
+        """
+        results = []
+        for node, statement in enumerate(self.statements):
+            if not statement.calls:
+                continue
+            tainted = self._parameter_taint if node == self.entry else 0
+            for predecessor in self.predecessors[node]:
+                tainted |= self.taint[predecessor]
+            for call in statement.calls:
+                if call.pays_only:
+                    continue
+                names = [name for name in call.receiver if self.variables.get(name, 0) & tainted]
+                if names:
+                    results.append((call, names))
+        return results
+
+    def unchecked_calls(self) -> List[CallSite]:
+        """Calls whose success flag is discarded, or unchecked on some path to an exit"""
+        reaching = 0
+        for node in self.exits:
+            reaching |= self.unchecked[node]
+        return [
+            call for call in self.calls
+            if not call.checked_inline
+            and (call.result is None or reaching & self._pending_bits[id(call)])
+        ]
+
+    def _taint_transfer(self, node: int, fact: int) -> int:
+        statement = self.statements[node]
+        if statement.is_check:
+            # Values compared or validated are treated as sanitized from here on
+            for name in statement.validated:
+                fact &= ~self.variables.get(name, 0)
+            return fact
+        flows = any(self.variables.get(name, 0) & fact for name in statement.uses)
+        for name in statement.defs:
+            if flows:
+                fact |= self.variables[name]
+            else:
+                fact &= ~self.variables[name]
+        return fact
+
+    def _check_transfer(self, node: int, fact: int) -> int:
+        statement = self.statements[node]
+        if DATAFLOW_REGEXES['revert'].match(statement.text):
+            # Reverting undoes the call, so its result no longer matters
+            return 0
+        for call in statement.calls:
+            fact |= self._pending_bits.get(id(call), 0)
+        if statement.is_check and fact:
+            for name in statement.uses:
+                fact &= ~self._pending_by_result.get(name, 0)
+        return fact
+
+    def _bit(self, name: str) -> int:
+        if name not in self.variables:
+            self.variables[name] = 1 << len(self.variables)
+        return self.variables[name]
+
+    def _match_parens(self, text: str) -> Dict[int, int]:
+        """Map each opening parenthesis offset to its closing offset"""
+        closing: Dict[int, int] = {}
+        stack: List[int] = []
+        for match in re.finditer(r'[()]', text):
+            if match.group() == '(':
+                stack.append(match.start())
+            elif stack:
+                closing[stack.pop()] = match.start()
+        return closing
+
+    def _split(self, body: str) -> List[Tuple[str, str, int]]:
+        """Split a body into (kind, text, offset) pieces: braces, control keywords and statements"""
+        pieces = []
+        position = 0
+        length = len(body)
+        while position < length:
+            char = body[position]
+            if char.isspace() or char == ';':
+                position += 1
+                continue
+            if char in '{}':
+                pieces.append((char, char, position))
+                position += 1
+                continue
+
+            control = DATAFLOW_REGEXES['control'].match(body, position)
+            if control and control.group(1):
+                open_paren = control.end() - 1
+                close = self._parens.get(open_paren, length - 1)
+                pieces.append((control.group(1), body[open_paren + 1:close], open_paren + 1))
+                position = close + 1
+                continue
+            if control:
+                pieces.append((control.group(2), control.group(2), position))
+                position = control.end()
+                continue
+
+            # Simple statement up to the next top-level ';' or brace
+            end = position
+            while end < length and body[end] not in ';}':
+                if body[end] == '(':
+                    end = self._parens.get(end, length - 1)
+                elif body[end] == '{':
+                    # Call options such as .call{value: x} belong to the expression
+                    if not DATAFLOW_REGEXES['call_options'].search(body, max(position, end - MAX_RECEIVER_LENGTH), end):
+                        break
+                    end = self._braces.get(end, length - 1)
+                end += 1
+            if end < length and body[end] == '{' and DATAFLOW_REGEXES['opaque_block'].match(body, position):
+                # Inline assembly and try/catch stay opaque: one node for the whole construct
+                end = self._braces.get(end, length - 1) + 1
+                catch = DATAFLOW_REGEXES['catch_clause'].match(body, end)
+                while catch:
+                    end = self._braces.get(catch.end() - 1, length - 1) + 1
+                    catch = DATAFLOW_REGEXES['catch_clause'].match(body, end)
+            pieces.append(('statement', body[position:end].strip(), position))
+            position = end
+        return pieces
+
+    def _new(self, text: str, offset: int, is_condition: bool = False) -> int:
+        line = self._first_line + bisect.bisect_left(self._newlines, offset)
+        self.statements.append(Statement(text=text, line=line, is_condition=is_condition))
+        return len(self.statements) - 1
+
+    def _connect(self, sources: List[int], target: int) -> None:
+        for source in sources:
+            self.statements[source].successors.append(target)
+
+    def _at(self, kind: str) -> bool:
+        return self._cursor < len(self._pieces) and self._pieces[self._cursor][0] == kind
+
+    def _parse_sequence(self) -> Tuple[int, List[int]]:
+        """Parse statements up to a closing brace; returns (entry, fall-through nodes)"""
+        entry = self._new('', self._pieces[self._cursor][2] if self._cursor < len(self._pieces) else 0)
+        pending = [entry]
+        while self._cursor < len(self._pieces) and not self._at('}'):
+            first, exits = self._parse_statement()
+            self._connect(pending, first)
+            pending = exits
+        return entry, pending
+
+    def _parse_statement(self) -> Tuple[int, List[int]]:
+        """Parse one statement or block; returns (entry, fall-through nodes)"""
+        if self._cursor >= len(self._pieces):
+            node = self._new('', len(self._body))
+            return node, [node]
+
+        kind, text, offset = self._pieces[self._cursor]
+        self._cursor += 1
+
+        if kind == '{':
+            entry, exits = self._parse_sequence()
+            if self._at('}'):
+                self._cursor += 1
+            return entry, exits
+
+        if kind == 'unchecked':
+            return self._parse_statement()
+
+        if kind == 'if':
+            condition = self._new(text, offset, is_condition=True)
+            then_entry, exits = self._parse_statement()
+            self._connect([condition], then_entry)
+            if self._at('else'):
+                self._cursor += 1
+                else_entry, else_exits = self._parse_statement()
+                self._connect([condition], else_entry)
+                return condition, exits + else_exits
+            return condition, exits + [condition]
+
+        if kind in ('for', 'while'):
+            condition = self._new(text, offset, is_condition=True)
+            body_entry, body_exits = self._parse_statement()
+            self._connect([condition], body_entry)
+            self._connect(body_exits, condition)
+            return condition, [condition]
+
+        if kind == 'do':
+            body_entry, body_exits = self._parse_statement()
+            if self._at('while'):
+                _, condition_text, condition_offset = self._pieces[self._cursor]
+                self._cursor += 1
+                condition = self._new(condition_text, condition_offset, is_condition=True)
+                self._connect(body_exits, condition)
+                self._connect([condition], body_entry)
+                return body_entry, [condition]
+            return body_entry, body_exits
+
+        node = self._new(text, offset)
+        if DATAFLOW_REGEXES['exit'].match(text):
+            self.exits.append(node)
+            return node, []
+        return node, [node]
+
+    def _describe(self, statement: Statement) -> None:
+        """Fill in the variables a statement defines and uses, and its low-level calls"""
+        text = statement.text
+        if not text:
+            return
+
+        rhs_start = 0
+        result = None
+        if not statement.is_condition:
+            assignment = self._top_level_assignment(text)
+            if assignment is not None:
+                targets = self._targets(text[:assignment.start()])
+                statement.defs = [name for name in targets if name]
+                for name in statement.defs:
+                    self._bit(name)
+                # The success flag is the first tuple element; an empty slot discards it
+                result = targets[0] if targets else None
+                rhs_start = assignment.end()
+        statement.uses = [
+            name for name in DATAFLOW_REGEXES['identifier'].findall(text, rhs_start) if name not in NON_VARIABLES
+        ]
+        if statement.is_check:
+            # Member reads such as targets.length do not validate the variable itself
+            statement.validated = [
+                name for name in DATAFLOW_REGEXES['validated'].findall(text) if name not in NON_VARIABLES
+            ]
+
+        for match in DATAFLOW_REGEXES['low_level_call'].finditer(text):
+            receiver_match = DATAFLOW_REGEXES['call_receiver'].search(
+                text, max(0, match.start() - MAX_RECEIVER_LENGTH), match.start()
+            )
+            receiver = DATAFLOW_REGEXES['identifier'].findall(receiver_match.group()) if receiver_match else []
+            # A call nested in another expression has its result consumed there
+            prefix = text[rhs_start:match.start()]
+            nested = prefix.count('(') > prefix.count(')')
+            direct = result and match.start() >= rhs_start and not nested
+            kind = match.group(1)
+            arguments = text[match.end():self._closing_paren(text, match.end())]
+            statement.calls.append(CallSite(
+                kind=kind,
+                line=statement.line + text.count('\n', 0, match.start()),
+                receiver=[name for name in receiver if name not in NON_VARIABLES],
+                result=result if direct else None,
+                checked_inline=statement.is_check or nested,
+                pays_only=kind == 'send' or (
+                    kind == 'call' and bool(DATAFLOW_REGEXES['empty_calldata'].match(arguments))
+                )
+            ))
+
+    def _closing_paren(self, text: str, start: int) -> int:
+        """Offset of the parenthesis closing the one just before start, or the end of text"""
+        depth = 0
+        for position in range(start, len(text)):
+            if text[position] == '(':
+                depth += 1
+            elif text[position] == ')':
+                if depth == 0:
+                    return position
+                depth -= 1
+        return len(text)
+
+    def _top_level_assignment(self, text: str) -> Optional[re.Match]:
+        """First assignment operator outside parentheses, brackets and braces"""
+        depth = 0
+        scanned = 0
+        for match in DATAFLOW_REGEXES['assignment'].finditer(text):
+            for char in text[scanned:match.start()]:
+                if char in '([{':
+                    depth += 1
+                elif char in ')]}':
+                    depth -= 1
+            scanned = match.start()
+            if depth == 0:
+                return match
+        return None
+
+    def _targets(self, lhs: str) -> List[str]:
+        """Variables written by an assignment's left-hand side, by position; '' for empty tuple slots"""
+        lhs = lhs.strip()
+        chunks = lhs.strip('()').split(',') if lhs.startswith('(') else [lhs]
+        names = []
+        for chunk in chunks:
+            identifiers = [
+                name for name in DATAFLOW_REGEXES['identifier'].findall(chunk) if name not in NON_VARIABLES
+            ]
+            if not identifiers:
+                names.append('')
+                continue
+            # Indexed or member writes update the root variable; declarations name it last
+            indexed = DATAFLOW_REGEXES['indexed_or_member'].search(chunk)
+            names.append(identifiers[0] if indexed else identifiers[-1])
+        return names
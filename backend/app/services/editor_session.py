@@ -0,0 +1,393 @@
+import os
+import time
+import uuid
+import asyncio
+import itertools
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.models.schemas import TextEdit, VulnerabilityReport
+from app.services.contract_index import ContractIndex, INDEX_REGEXES
+from app.services.solidity_parser import SolidityParser, PARSER_REGEXES, declaration_end
+from app.services.vulnerability_detector import (
+    VulnerabilityDetector,
+    RawFinding,
+    RULE_ABORTED,
+    FUNCTION_RULES,
+    LINE_RULES,
+    FILE_RULES
+)
+from app.utils.source_buffer import SourceBuffer
+from app.utils.solidity_text import strip_line, match_braces
+
+# AI review of a session's text, returning its findings
+Reviewer = Callable[[SourceBuffer, str], Awaitable[List[VulnerabilityReport]]]
+
+class EditorSession:
+    """
+    Open document of an editor session. Keeps the stripped lines with the
+    block-comment state each starts in, the contract index and the findings of
+    the last version, so an edit inside one function body re-lexes only the
+    edited lines, re-indexes only that function and re-runs rules only for the
+    functions and lines it can affect. Anything else rescans the document.
+    """
+
+    def __init__(self, session_id: str, filename: str, text: str,
+                 detector: VulnerabilityDetector, parser: SolidityParser, review: bool = True):
+        self.id = session_id
+        self.filename = filename
+        self.detector = detector
+        self.parser = parser
+        self.version = 0
+        self.last_used = time.monotonic()
+        self.lines: List[str] = text.split('\n')
+
+        self.review_task: Optional[asyncio.Task] = None
+        self.review_status = "idle" if review else "disabled"
+        self.review_version: Optional[int] = None
+        self.ai_findings: List[VulnerabilityReport] = []
+
+        # Outcome of the last update
+        self.incremental = False
+        self.reindexed_functions = 0
+        self.elapsed_ms = 0.0
+
+        self.rebuild()
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+    def rebuild(self) -> None:
+        """Lex, index and scan the whole document"""
+        self.stripped: List[str] = []
+        self.entry_states: List[bool] = []
+        self.unclosed_comment = False
+        in_comment = False
+        for i, line in enumerate(self.lines):
+            self.entry_states.append(in_comment)
+            stripped, in_comment = strip_line(line, in_comment, lambda: self._closes_later(i))
+            self.stripped.append(stripped)
+
+        self.aborted: List[RawFinding] = []
+        self.index = ContractIndex(SourceBuffer(self.text, self.filename), self.parser)
+        self.index.lines = self.stripped
+        self.function_findings = self._run(FUNCTION_RULES)
+        self.line_findings = self._run(LINE_RULES)
+        self._refresh_file_findings()
+        self.reindexed_functions = len(self.index.functions)
+
+    def update(self, changes: Sequence[TextEdit], version: int) -> None:
+        """Apply edits in order, updating in place when each falls inside one function body"""
+        started = time.perf_counter()
+        rescan = False
+        affected = 0
+        changed_lines = set()
+
+        for change in changes:
+            if change.range is None:
+                self.lines = change.text.split('\n')
+                rescan = True
+                continue
+            if rescan:
+                self._splice(change)
+                continue
+
+            function = self._enclosing_function(change.range.start.line + 1, change.range.end.line + 1)
+            closing_column = old_parens = None
+            if function is not None:
+                closing_column = self._closing_column(function, 0)
+                old_parens = self._paren_profile(change.range.start.line, change.range.end.line)
+            first, old_last, new_last = self._splice(change)
+            self.stripped[first:old_last + 1] = [''] * (new_last - first + 1)
+            self.entry_states[first:old_last + 1] = [self.entry_states[first]] * (new_last - first + 1)
+            line_delta = new_last - old_last
+
+            # The block-comment state must settle by the edit's end, parentheses
+            # outside the edit must pair up as before, and the function must
+            # keep its header and closing brace and gain no declarations
+            if (closing_column is None or not self._relex(first, new_last)
+                    or self._paren_profile(first, new_last) != old_parens
+                    or self._closing_column(function, line_delta) != closing_column
+                    or self._declares(first + 1, function[1].span.end_line + line_delta)):
+                rescan = True
+                continue
+
+            self._shift_findings(old_last + 1, line_delta, first + 1)
+            changed_lines = {
+                line + line_delta if line > old_last + 1 else line
+                for line in changed_lines if not first + 1 <= line <= old_last + 1
+            }
+            changed_lines.update(range(first + 1, new_last + 2))
+            affected |= self.index.reindex_function(function[0], self.stripped, line_delta)
+
+        if rescan:
+            self.rebuild()
+            self.incremental = False
+        else:
+            self._rescan_parts(affected, changed_lines)
+            self.incremental = True
+            self.reindexed_functions = bin(affected).count('1')
+
+        self.version = version
+        self.last_used = time.monotonic()
+        self.elapsed_ms = (time.perf_counter() - started) * 1000
+
+    def diagnostics(self) -> List[VulnerabilityReport]:
+        """Pattern findings of the current version, in line order"""
+        findings = sorted(
+            self.function_findings + self.line_findings + self.file_findings,
+            key=lambda finding: (finding.start_line, finding.rule_id)
+        )
+        return self.detector.materialize(findings, self.filename)
+
+    def _run(self, rules: Sequence[str], lines: Optional[Sequence[str]] = None) -> List[RawFinding]:
+        """
+        Run rules on the index. Notes of rules that overran their budget are kept
+        until the next rescan, since their cached findings stay incomplete.
+        """
+        guarded, _ = self.detector.guard_line_length(self.lines if lines is None else lines)
+        findings = []
+        for finding in self.detector.run_rules(self.index, guarded, self.filename, rules=rules):
+            if finding.rule_id != RULE_ABORTED:
+                findings.append(finding)
+            elif finding not in self.aborted:
+                self.aborted.append(finding)
+        return findings
+
+    def _refresh_file_findings(self) -> None:
+        """File rules and line-length notes are redone on every update"""
+        _, notes = self.detector.guard_line_length(self.lines)
+        file_findings = self._run(FILE_RULES)
+        self.file_findings = notes + self.aborted + file_findings
+
+    def _rescan_parts(self, affected: int, changed_lines: set) -> None:
+        """Re-run per-function rules on the affected functions and line rules on the changed lines"""
+        if affected:
+            spans = [self.index.functions[i].span for i in self.index.bits(affected)]
+            # Unbalanced braces can nest spans; findings are matched to spans by line, so nested functions rerun too
+            for i, node in enumerate(self.index.functions):
+                if not affected >> i & 1 and any(
+                        span.start_line <= node.span.start_line <= span.end_line for span in spans):
+                    affected |= 1 << i
+            spans = [self.index.functions[i].span for i in self.index.bits(affected)]
+            self.function_findings = [
+                finding for finding in self.function_findings
+                if not any(span.start_line <= finding.start_line <= span.end_line for span in spans)
+            ]
+            self.index.targets = affected
+            try:
+                self.function_findings.extend(self._run(FUNCTION_RULES))
+            finally:
+                self.index.targets = None
+
+        if changed_lines:
+            self.line_findings = [finding for finding in self.line_findings if finding.start_line not in changed_lines]
+            lines = [
+                line if number in changed_lines else ''
+                for number, line in enumerate(self.lines, 1)
+            ]
+            self.line_findings.extend(self._run(LINE_RULES, lines))
+
+        self._refresh_file_findings()
+
+    def _splice(self, change: TextEdit) -> Tuple[int, int, int]:
+        """
+        Replace a range of lines with the edited text, leaving the stripped
+        lines to the caller. Returns the first line,
+        the last replaced line and the last new line (0-based).
+        """
+        start, end = change.range.start, change.range.end
+        first = min(start.line, len(self.lines) - 1)
+        last = min(end.line, len(self.lines) - 1)
+        new_lines = (self.lines[first][:start.character] + change.text + self.lines[last][end.character:]).split('\n')
+        self.lines[first:last + 1] = new_lines
+        return first, last, first + len(new_lines) - 1
+
+    def _relex(self, first: int, last: int) -> bool:
+        """
+        Re-strip lines first..last (0-based). False when the block-comment state
+        after them changed, which moves comment boundaries beyond the edit.
+        """
+        if self.unclosed_comment:
+            return False
+        in_comment = self.entry_states[first]
+        for i in range(first, last + 1):
+            self.entry_states[i] = in_comment
+            self.stripped[i], in_comment = strip_line(self.lines[i], in_comment, lambda: self._closes_later(i))
+        following = self.entry_states[last + 1] if last + 1 < len(self.lines) else False
+        return in_comment == following and not self.unclosed_comment
+
+    def _closes_later(self, i: int) -> bool:
+        """Whether a block comment opened on line i is closed on a later line"""
+        closes = any('*/' in line for line in itertools.islice(self.lines, i + 1, None))
+        if not closes:
+            # Its /* reads as code, which an edit further down could change
+            self.unclosed_comment = True
+        return closes
+
+    def _enclosing_function(self, first: int, last: int) -> Optional[Tuple[int, object]]:
+        """
+        Indexed function whose body strictly contains lines first..last, past its
+        opening brace. None when there is none, or several (unbalanced braces).
+        """
+        enclosing = None
+        for i, node in enumerate(self.index.functions):
+            span = node.span
+            if span.start_line > last:
+                break
+            if span.end_line < first:
+                continue
+            if enclosing is not None or last >= span.end_line:
+                return None
+            region = self._region(span.start_line, span.end_line)
+            header = PARSER_REGEXES['function_header'].search(region, 0, declaration_end(region))
+            if not header or span.start_line + header.group().count('\n') >= first:
+                return None
+            enclosing = (i, node)
+        return enclosing
+
+    def _closing_column(self, function: Tuple[int, object], line_delta: int) -> Optional[int]:
+        """
+        Column of the brace closing the function, or None unless its header is
+        intact and the brace still falls on the function's last line
+        """
+        i, node = function
+        span = node.span
+        region = self._region(span.start_line, span.end_line + line_delta)
+        header = PARSER_REGEXES['function_header'].search(region, 0, declaration_end(region))
+        if not header or (header.group(1) or header.group(2)) != span.name or header.group(5) != '{':
+            return None
+        closing = match_braces(region).get(header.end() - 1)
+        if closing is None or region.count('\n', 0, closing) != span.end_line + line_delta - span.start_line:
+            return None
+        return closing - region.rfind('\n', 0, closing)
+
+    def _declares(self, start_line: int, end_line: int) -> bool:
+        """Whether lines start_line..end_line declare a function, modifier or contract"""
+        region = self._region(start_line, end_line)
+        end = declaration_end(region)
+        return bool(
+            PARSER_REGEXES['function_header'].search(region, 0, end)
+            or INDEX_REGEXES['modifier_declaration'].search(region, 0, end)
+            or PARSER_REGEXES['contract_unit'].search(region)
+        )
+
+    def _paren_profile(self, first: int, last: int) -> Tuple[int, int]:
+        """
+        (lowest depth, final depth) of the parentheses on stripped lines
+        first..last (0-based). Text with the same profile pairs the parentheses
+        around it the same way, so header matches elsewhere cannot change.
+        """
+        depth = lowest = 0
+        for line in self.stripped[first:last + 1]:
+            for char in line:
+                if char == '(':
+                    depth += 1
+                elif char == ')':
+                    depth -= 1
+                    lowest = min(lowest, depth)
+        return lowest, depth
+
+    def _region(self, start_line: int, end_line: int) -> str:
+        return '\n'.join(self.stripped[start_line - 1:end_line])
+
+    def _shift_findings(self, old_last: int, line_delta: int, first: int) -> None:
+        """Move cached findings below an edit of lines first..old_last (1-based) by line_delta"""
+        def shift(finding: RawFinding) -> RawFinding:
+            if finding.start_line <= old_last or not line_delta:
+                return finding
+            return finding._replace(
+                start_line=finding.start_line + line_delta,
+                end_line=finding.end_line + line_delta,
+                id_key=finding.id_key + line_delta if isinstance(finding.id_key, int) else finding.id_key
+            )
+
+        self.function_findings = [shift(finding) for finding in self.function_findings]
+        self.line_findings = [
+            shift(finding) for finding in self.line_findings if not first <= finding.start_line <= old_last
+        ]
+
+class EditorSessionManager:
+    """
+    Editor sessions held by this worker process. Pattern diagnostics are
+    returned with every edit; the AI review waits until the document has not
+    changed for review_delay seconds and is cancelled by the next edit.
+    """
+
+    def __init__(self, detector: VulnerabilityDetector, parser: SolidityParser,
+                 reviewer: Optional[Reviewer] = None):
+        self.detector = detector
+        self.parser = parser
+        self.reviewer = reviewer
+        self.sessions: Dict[str, EditorSession] = {}
+        self.max_sessions = int(os.getenv("EDITOR_MAX_SESSIONS", "100"))
+        self.idle_ttl = float(os.getenv("EDITOR_SESSION_TTL", "1800"))
+        self.review_delay = float(os.getenv("EDITOR_REVIEW_IDLE_SECONDS", "5"))
+
+    def open(self, filename: str, text: str, review: bool = True) -> EditorSession:
+        """Start a session, evicting idle or least recently used ones"""
+        self._evict()
+        session = EditorSession(
+            uuid.uuid4().hex, filename, text, self.detector, self.parser, review and self.reviewer is not None
+        )
+        self.sessions[session.id] = session
+        self._schedule_review(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[EditorSession]:
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+        return session
+
+    def edit(self, session: EditorSession, version: int, changes: Sequence[TextEdit]) -> EditorSession:
+        """Apply a versioned batch of edits and restart the idle timer of the AI review"""
+        session.update(changes, version)
+        self._schedule_review(session)
+        return session
+
+    def close(self, session_id: str) -> bool:
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._cancel_review(session)
+        return True
+
+    def shutdown(self) -> None:
+        for session_id in list(self.sessions):
+            self.close(session_id)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_used > self.idle_ttl:
+                self.close(session_id)
+        while len(self.sessions) >= self.max_sessions:
+            self.close(min(self.sessions.values(), key=lambda session: session.last_used).id)
+
+    def _schedule_review(self, session: EditorSession) -> None:
+        if session.review_status == "disabled":
+            return
+        self._cancel_review(session)
+        session.review_status = "scheduled"
+        session.review_task = asyncio.ensure_future(self._review_when_idle(session, session.version))
+
+    def _cancel_review(self, session: EditorSession) -> None:
+        if session.review_task is not None and not session.review_task.done():
+            session.review_task.cancel()
+        session.review_task = None
+
+    async def _review_when_idle(self, session: EditorSession, version: int) -> None:
+        await asyncio.sleep(self.review_delay)
+        session.review_status = "running"
+        try:
+            findings = await self.reviewer(SourceBuffer(session.text, session.filename), session.filename)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Editor review error: {str(e)}")
+            session.review_status = "failed"
+            return
+        session.ai_findings = findings
+        session.review_version = version
+        session.review_status = "complete"
@@ -0,0 +1,236 @@
+import re
+from typing import List, Dict, Optional
+
+from app.models.schemas import VulnerabilityReport, VulnerabilityLocation
+from app.utils.interval_tree import IntervalTree
+
+SEVERITY_RANK = {
+    "CRITICAL": 5,
+    "HIGH": 4,
+    "MEDIUM": 3,
+    "LOW": 2,
+    "INFO": 1
+}
+
+# Start and end line of a finding reported without a location (AI findings only).
+# Such findings are never merged: nothing says they are about the same code.
+UNLOCATED_LINE = 0
+
+# Normalized type of the detector's notes about rules it aborted or lines it
+# skipped. Each note names different missing coverage, so none is ever merged.
+COVERAGE_TYPE = "coverage"
+
+class FindingMerger:
+    """Deduplicate and merge findings from AI and pattern-based detection"""
+
+    def __init__(self, line_tolerance: int = 0):
+        # Extra lines either side of a finding that still count as overlap
+        self.line_tolerance = line_tolerance
+
+        # Aliases used by the AI prompt, the pattern detector and the fallback analysis
+        self.type_aliases = {
+            "reentrancy": "reentrancy",
+            "reentrancyattack": "reentrancy",
+            "reentrancyvulnerability": "reentrancy",
+            "crossfunctionreentrancy": "reentrancy",
+            "accesscontrol": "access_control",
+            "authorization": "access_control",
+            "missingaccesscontrol": "access_control",
+            "integeroverflow": "integer_overflow",
+            "integerunderflow": "integer_overflow",
+            "integeroverflowunderflow": "integer_overflow",
+            "arithmetic": "integer_overflow",
+            "overflow": "integer_overflow",
+            "underflow": "integer_overflow",
+            "uncheckedcalls": "unchecked_calls",
+            "uncheckedcall": "unchecked_calls",
+            "uncheckedexternalcall": "unchecked_calls",
+            "uncheckedexternalcalls": "unchecked_calls",
+            "uncheckedcallreturn": "unchecked_calls",
+            "externalcalls": "unchecked_calls",
+            "arbitraryexternalcall": "arbitrary_call",
+            "arbitrarycall": "arbitrary_call",
+            "usercontrolledcalltarget": "arbitrary_call",
+            "delegatecall": "delegatecall",
+            "unsafedelegatecall": "delegatecall",
+            "delegatecalltountrustedcallee": "delegatecall",
+            "gasissues": "gas",
+            "gasoptimization": "gas",
+            "gaslimitdos": "gas",
+            "dos": "gas",
+            "denialofservice": "gas",
+            "logicerror": "logic_error",
+            "logicerrors": "logic_error",
+            "businesslogic": "logic_error",
+            "businesslogicerror": "logic_error",
+            "analysiscoverage": COVERAGE_TYPE
+        }
+
+    def merge(self, findings: List[VulnerabilityReport]) -> List[VulnerabilityReport]:
+        """
+        Cluster findings by normalized type and overlapping line ranges,
+        returning one merged finding per cluster in original order
+        """
+        if len(findings) < 2:
+            return list(findings)
+
+        # Group mergeable finding indexes by normalized type; the rest stay alone
+        groups: Dict[str, List[int]] = {}
+        for index, finding in enumerate(findings):
+            if self.is_mergeable(finding):
+                groups.setdefault(self.normalize_type(finding.type), []).append(index)
+
+        parent = list(range(len(findings)))
+
+        def find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        def union(a: int, b: int) -> None:
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                # Keep the earliest finding as root so output order is stable
+                if root_a < root_b:
+                    parent[root_b] = root_a
+                else:
+                    parent[root_a] = root_b
+
+        for indexes in groups.values():
+            if len(indexes) < 2:
+                continue
+
+            tree = IntervalTree([
+                (*self._line_range(findings[index]), index) for index in indexes
+            ])
+            for index in indexes:
+                start, end = self._line_range(findings[index])
+                for other in tree.overlapping(start - self.line_tolerance, end + self.line_tolerance):
+                    if other != index:
+                        union(index, other)
+
+        clusters: Dict[int, List[VulnerabilityReport]] = {}
+        for index, finding in enumerate(findings):
+            clusters.setdefault(find(index), []).append(finding)
+
+        return [self._merge_cluster(cluster) for cluster in clusters.values()]
+
+    def split_common(self, findings_a: List[VulnerabilityReport], findings_b: List[VulnerabilityReport],
+                     line_map: Dict[int, int]) -> tuple:
+        """
+        Split two contracts' findings into common and unique sets. Findings in A
+        are moved onto B's lines through line_map before matching by type and overlap.
+        Returns (common findings from B, unique to A, unique to B).
+        """
+        trees: Dict[str, list] = {}
+        for index, finding in enumerate(findings_a):
+            start, end = self._line_range(finding)
+            mapped = [line_map[line] for line in (start, end) if line in line_map]
+            if not mapped:
+                continue
+            trees.setdefault(self.normalize_type(finding.type), []).append((min(mapped), max(mapped), index))
+        trees = {key: IntervalTree(intervals) for key, intervals in trees.items()}
+
+        matched_a = set()
+        common: List[VulnerabilityReport] = []
+        unique_b: List[VulnerabilityReport] = []
+
+        for finding in findings_b:
+            tree = trees.get(self.normalize_type(finding.type)) if self.is_mergeable(finding) else None
+            start, end = self._line_range(finding)
+            overlaps = tree.overlapping(start - self.line_tolerance, end + self.line_tolerance) if tree else []
+            if overlaps:
+                matched_a.update(overlaps)
+                common.append(finding)
+            else:
+                unique_b.append(finding)
+
+        unique_a = [finding for index, finding in enumerate(findings_a) if index not in matched_a]
+        return common, unique_a, unique_b
+
+    def same_issue(self, a: VulnerabilityReport, b: VulnerabilityReport) -> bool:
+        """Whether merge would treat two findings as duplicates on their own"""
+        if self.normalize_type(a.type) != self.normalize_type(b.type):
+            return False
+        if not (self.is_mergeable(a) and self.is_mergeable(b)):
+            return False
+        start_a, end_a = self._line_range(a)
+        start_b, end_b = self._line_range(b)
+        return start_a <= end_b + self.line_tolerance and start_b <= end_a + self.line_tolerance
+
+    def normalize_type(self, vuln_type: str) -> str:
+        """Normalize a vulnerability type into a canonical key"""
+        key = re.sub(r'[^a-z0-9]', '', (vuln_type or "").lower())
+        return self.type_aliases.get(key, key or "unknown")
+
+    def is_located(self, finding: VulnerabilityReport) -> bool:
+        """Whether a finding points at source lines"""
+        return finding.location.startLine != UNLOCATED_LINE
+
+    def is_mergeable(self, finding: VulnerabilityReport) -> bool:
+        """Whether a finding may be merged with others: located and not a coverage note"""
+        return self.is_located(finding) and self.normalize_type(finding.type) != COVERAGE_TYPE
+
+    def _line_range(self, finding: VulnerabilityReport) -> tuple:
+        """Get an ordered (start, end) line range for a finding"""
+        start = finding.location.startLine
+        end = finding.location.endLine
+        return (start, end) if start <= end else (end, start)
+
+    def _evidence_key(self, finding: VulnerabilityReport) -> tuple:
+        """Rank findings so the strongest evidence sorts highest"""
+        return (
+            SEVERITY_RANK.get((finding.severity or "").upper(), 0),
+            finding.riskScore,
+            finding.suggestedFix is not None,
+            finding.cweId is not None,
+            len(finding.description or "")
+        )
+
+    def _merge_cluster(self, cluster: List[VulnerabilityReport]) -> VulnerabilityReport:
+        """Merge a cluster of duplicate findings into a single report"""
+        if len(cluster) == 1:
+            finding = cluster[0]
+            if not finding.detectionMethods:
+                finding = finding.model_copy(update={"detectionMethods": [finding.detectionMethod]})
+            return finding
+
+        strongest = max(cluster, key=self._evidence_key)
+
+        detection_methods: List[str] = []
+        references: List[str] = []
+        for finding in cluster:
+            for method in finding.detectionMethods or [finding.detectionMethod]:
+                if method not in detection_methods:
+                    detection_methods.append(method)
+            for reference in finding.references:
+                if reference not in references:
+                    references.append(reference)
+
+        start = min(self._line_range(finding)[0] for finding in cluster)
+        end = max(self._line_range(finding)[1] for finding in cluster)
+
+        return strongest.model_copy(update={
+            "location": VulnerabilityLocation(
+                file=strongest.location.file,
+                startLine=start,
+                endLine=end,
+                function=strongest.location.function or self._first(cluster, lambda f: f.location.function)
+            ),
+            "riskScore": max(finding.riskScore for finding in cluster),
+            "cweId": strongest.cweId or self._first(cluster, lambda f: f.cweId),
+            "potentialLoss": strongest.potentialLoss or self._first(cluster, lambda f: f.potentialLoss),
+            "suggestedFix": strongest.suggestedFix or self._first(cluster, lambda f: f.suggestedFix),
+            "detectionMethod": " + ".join(detection_methods),
+            "detectionMethods": detection_methods,
+            "references": references
+        })
+
+    def _first(self, cluster: List[VulnerabilityReport], getter) -> Optional[object]:
+        """Return the first non-empty value of a field across a cluster"""
+        for finding in cluster:
+            value = getter(finding)
+            if value:
+                return value
+        return None
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from app.models.schemas import CodeFix, VulnerabilityReport
+from app.services.finding_merger import FindingMerger
+from app.utils.source_buffer import SourceBuffer
+from app.utils.solidity_text import strip_comments, strip_comments_and_strings
+
+# Fix cache regexes compiled once at import so preforked workers share them copy-on-write
+FIX_CACHE_REGEXES = {
+    'token': re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|[A-Za-z_$][\w$]*|\d+|\S'),
+    'identifier': re.compile(r'(?<![\w$])[A-Za-z_$][\w$]*(?![\w$])'),
+    'elementary_type': re.compile(r'(?:u?int|bytes|u?fixed)\d*(?:x\d+)?$'),
+    'code_span': re.compile(r'(`[^`]*`)'),
+    'placeholder': re.compile(r'\{\{id(\d+)\}\}')
+}
+
+# Words kept verbatim in fingerprints and fixes: they carry the meaning of an
+# idiom, unlike the names each contract picks for its own variables and functions
+SOLIDITY_WORDS = frozenset((
+    'pragma', 'solidity', 'import', 'contract', 'interface', 'library', 'abstract', 'is', 'function',
+    'modifier', 'event', 'error', 'struct', 'enum', 'mapping', 'constructor', 'fallback', 'receive',
+    'returns', 'return', 'if', 'else', 'for', 'while', 'do', 'break', 'continue', 'emit', 'revert',
+    'require', 'assert', 'new', 'delete', 'try', 'catch', 'unchecked', 'assembly', 'public', 'external',
+    'internal', 'private', 'view', 'pure', 'payable', 'virtual', 'override', 'constant', 'immutable',
+    'memory', 'storage', 'calldata', 'indexed', 'anonymous', 'bool', 'address', 'string', 'byte',
+    'true', 'false', 'this', 'super', 'msg', 'sender', 'value', 'data', 'sig', 'gas', 'tx', 'origin',
+    'gasprice', 'block', 'timestamp', 'number', 'coinbase', 'difficulty', 'prevrandao', 'chainid',
+    'basefee', 'gaslimit', 'call', 'delegatecall', 'staticcall', 'send', 'transfer', 'balance', 'code',
+    'codehash', 'length', 'push', 'pop', 'selfdestruct', 'keccak256', 'sha256', 'ecrecover', 'abi',
+    'encode', 'encodePacked', 'encodeWithSelector', 'encodeWithSignature', 'decode', 'type', 'max',
+    'min', 'wei', 'gwei', 'ether', 'seconds', 'minutes', 'hours', 'days', 'weeks'
+))
+
+CODE_FIELDS = ('originalCode', 'fixedCode')
+PROSE_FIELDS = ('description', 'explanation', 'riskReduction')
+
+@dataclass
+class SnippetFingerprint:
+    """Cache key of a vulnerable snippet and the identifiers its placeholders stand for"""
+    key: str
+    identifiers: List[str]  # Placeholder i stands for identifiers[i], in order of first use
+
+class FixCache:
+    """
+    Fixes shared across contracts, keyed by the finding type and the vulnerable
+    snippet with its contract-chosen identifiers replaced by numbered
+    placeholders. A hit is re-instantiated with the requesting contract's names.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_snippet_lines: int = 40):
+        self.db_path = db_path or os.getenv("HISTORY_DB_PATH", "data/analysis_history.db")
+        self.enabled = os.getenv("SHARED_FIX_CACHE", "true").lower() == "true"
+        self.max_snippet_lines = max_snippet_lines
+        self.finding_merger = FindingMerger()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema on first use"""
+        if not self._initialized:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=10)
+
+        if not self._initialized:
+            connection.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS fix_cache (
+                    fingerprint TEXT PRIMARY KEY,
+                    vuln_type TEXT NOT NULL,
+                    template TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL
+                );
+            """)
+            self._initialized = True
+
+        return connection
+
+    def fingerprint(self, source: SourceBuffer, vuln: VulnerabilityReport) -> Optional[SnippetFingerprint]:
+        """Fingerprint of the finding's lines, or None when they are missing or too long to share"""
+        if not self.enabled:
+            return None
+        start, end = vuln.location.startLine, vuln.location.endLine
+        if start < 1 or end < start or end > source.line_count or end - start >= self.max_snippet_lines:
+            return None
+
+        identifiers: Dict[str, int] = {}
+        tokens = []
+        for token in FIX_CACHE_REGEXES['token'].findall(strip_comments(source.span(start, end))):
+            if self._is_contract_name(token):
+                token = f"{{{{id{identifiers.setdefault(token, len(identifiers))}}}}}"
+            tokens.append(token)
+        if not tokens:
+            return None
+
+        normalized = f"{self.finding_merger.normalize_type(vuln.type)}\n{' '.join(tokens)}"
+        return SnippetFingerprint(
+            key=hashlib.sha256(normalized.encode('utf-8')).hexdigest(),
+            identifiers=list(identifiers)
+        )
+
+    def lookup(self, fingerprint: SnippetFingerprint) -> Optional[CodeFix]:
+        """Cached fix for a snippet, instantiated with the snippet's own identifiers"""
+        connection = self._connect()
+        try:
+            with connection:
+                row = connection.execute(
+                    "SELECT template FROM fix_cache WHERE fingerprint = ?", (fingerprint.key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                connection.execute(
+                    "UPDATE fix_cache SET hits = hits + 1 WHERE fingerprint = ?", (fingerprint.key,)
+                )
+        finally:
+            connection.close()
+
+        template = json.loads(row[0])
+        if any(
+            int(index) >= len(fingerprint.identifiers)
+            for text in template.values()
+            for index in FIX_CACHE_REGEXES['placeholder'].findall(text)
+        ):
+            return None
+
+        def instantiate(match: re.Match) -> str:
+            return fingerprint.identifiers[int(match.group(1))]
+
+        return CodeFix(**{
+            field: FIX_CACHE_REGEXES['placeholder'].sub(instantiate, text)
+            for field, text in template.items()
+        })
+
+    def store(self, fingerprint: SnippetFingerprint, fix: CodeFix, source: SourceBuffer, vuln_type: str) -> bool:
+        """
+        Cache a generated fix. Fixes naming contract identifiers that do not
+        occur in the snippet are not shared, since another contract's snippet
+        could not supply them; identifiers the fix introduces are kept as is.
+        """
+        names = {name: i for i, name in enumerate(fingerprint.identifiers)}
+        contract_names = {
+            name for name in FIX_CACHE_REGEXES['identifier'].findall(strip_comments_and_strings(source.text))
+            if self._is_contract_name(name)
+        }
+        if self._referenced_names(fix) & contract_names - names.keys():
+            return False
+
+        def abstract(match: re.Match) -> str:
+            name = match.group()
+            return f"{{{{id{names[name]}}}}}" if name in names else name
+
+        def abstract_prose(match: re.Match) -> str:
+            return abstract(match) if self._looks_like_code(match.group()) else match.group()
+
+        template = {field: FIX_CACHE_REGEXES['identifier'].sub(abstract, getattr(fix, field)) for field in CODE_FIELDS}
+        for field in PROSE_FIELDS:
+            # Plain English words in prose stay as written, even when a snippet variable shares them
+            template[field] = ''.join(
+                FIX_CACHE_REGEXES['identifier'].sub(abstract if part.startswith('`') else abstract_prose, part)
+                for part in FIX_CACHE_REGEXES['code_span'].split(getattr(fix, field))
+            )
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO fix_cache (fingerprint, vuln_type, template, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (fingerprint.key, vuln_type, json.dumps(template), datetime.now().isoformat())
+                )
+        finally:
+            connection.close()
+        return True
+
+    def _referenced_names(self, fix: CodeFix) -> Set[str]:
+        """Identifiers a fix refers to: everything in its code, code spans and code-like words of its prose"""
+        names = set()
+        for field in CODE_FIELDS:
+            names.update(FIX_CACHE_REGEXES['identifier'].findall(getattr(fix, field)))
+        for field in PROSE_FIELDS:
+            for part in FIX_CACHE_REGEXES['code_span'].split(getattr(fix, field)):
+                words = FIX_CACHE_REGEXES['identifier'].findall(part)
+                names.update(words if part.startswith('`') else filter(self._looks_like_code, words))
+        return names
+
+    def _is_contract_name(self, token: str) -> bool:
+        """Identifier chosen by the contract author rather than the language"""
+        return (
+            (token[0].isalpha() or token[0] in '_$')
+            and token not in SOLIDITY_WORDS
+            and not FIX_CACHE_REGEXES['elementary_type'].match(token)
+        )
+
+    def _looks_like_code(self, word: str) -> bool:
+        """Prose word written as a code name (camelCase, snake_case, digits) rather than plain English"""
+        return not word.isalpha() or (word != word.lower() and word != word.capitalize())
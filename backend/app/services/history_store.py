@@ -0,0 +1,312 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator
+
+from app.models.schemas import AnalysisResponse, FindingsPage, VulnerabilityStats
+
+SEVERITY_CODES = {
+    "CRITICAL": 0,
+    "HIGH": 1,
+    "MEDIUM": 2,
+    "LOW": 3,
+    "INFO": 4
+}
+
+class AnalysisHistoryStore:
+    """SQLite-backed history of analyses with a columnar cache for aggregate queries"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("HISTORY_DB_PATH", "data/analysis_history.db")
+        self._lock = threading.Lock()
+        self._initialized = False
+
+        # Columnar cache of findings, refreshed incrementally from the database.
+        # Strings are dictionary-encoded so every column is a flat typed array.
+        self._finding_severity = array('b')
+        self._finding_risk = array('d')
+        self._finding_type = array('l')
+        self._finding_cwe = array('l')
+        self._finding_contract = array('l')
+        self._analysis_risk = array('d')
+        self._analysis_contract = array('l')
+        self._analysis_prompt_tokens = array('q')
+        self._analysis_completion_tokens = array('q')
+        self._dictionaries: Dict[str, Dict[str, int]] = {"type": {}, "cwe": {}, "contract": {}}
+        self._values: Dict[str, List[str]] = {"type": [], "cwe": [], "contract": []}
+        self._last_finding_id = 0
+        self._last_analysis_id = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema on first use"""
+        if not self._initialized:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=10)
+
+        if not self._initialized:
+            connection.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    contract_hash TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    contract_name TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    risk_score REAL NOT NULL,
+                    total_vulnerabilities INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS findings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    analysis_id INTEGER NOT NULL REFERENCES analyses(id),
+                    contract_hash TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    cwe_id TEXT,
+                    severity TEXT NOT NULL,
+                    risk_score REAL NOT NULL,
+                    start_line INTEGER NOT NULL,
+                    end_line INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_analyses_contract_hash ON analyses(contract_hash);
+                CREATE INDEX IF NOT EXISTS idx_findings_type ON findings(type);
+                CREATE INDEX IF NOT EXISTS idx_findings_cwe ON findings(cwe_id);
+                CREATE INDEX IF NOT EXISTS idx_findings_severity ON findings(severity);
+                CREATE INDEX IF NOT EXISTS idx_findings_contract_hash ON findings(contract_hash);
+            """)
+            self._migrate(connection)
+            self._initialized = True
+
+        return connection
+
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        """Add columns introduced after a database was created"""
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(analyses)")}
+        with connection:
+            for column in ("prompt_tokens", "completion_tokens"):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE analyses ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    def save_analysis(self, contract_hash: str, analysis: AnalysisResponse) -> int:
+        """Persist an analysis result and its findings, returning the analysis id"""
+        # Full report is kept as zlib-compressed JSON; findings are stored as indexed rows
+        payload = zlib.compress(analysis.model_dump_json().encode('utf-8'), 6)
+        token_usage = analysis.tokenUsage
+
+        connection = self._connect()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO analyses (contract_hash, file_name, contract_name, created_at, "
+                    "risk_score, total_vulnerabilities, payload, prompt_tokens, completion_tokens) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        contract_hash,
+                        analysis.fileName,
+                        analysis.contractName,
+                        analysis.analysisTimestamp or datetime.now().isoformat(),
+                        analysis.overallRiskScore,
+                        analysis.totalVulnerabilities,
+                        payload,
+                        token_usage.promptTokens if token_usage else 0,
+                        token_usage.completionTokens if token_usage else 0
+                    )
+                )
+                analysis_id = cursor.lastrowid
+                connection.executemany(
+                    "INSERT INTO findings (analysis_id, contract_hash, type, cwe_id, severity, "
+                    "risk_score, start_line, end_line) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            analysis_id,
+                            contract_hash,
+                            vuln.type,
+                            vuln.cweId,
+                            vuln.severity.upper(),
+                            vuln.riskScore,
+                            vuln.location.startLine,
+                            vuln.location.endLine
+                        )
+                        for vuln in analysis.vulnerabilities
+                    ]
+                )
+            return analysis_id
+        finally:
+            connection.close()
+
+    def get_stats(self, severity: Optional[str] = None, vuln_type: Optional[str] = None,
+                  cwe_id: Optional[str] = None, limit: int = 10) -> VulnerabilityStats:
+        """
+        Compute aggregate statistics with single passes over the columnar cache.
+        With filters, findings are those matching and analyses those of the
+        contracts they were found in.
+        """
+        with self._lock:
+            self._refresh_cache()
+
+            severity_code = SEVERITY_CODES.get(severity.upper(), -1) if severity else None
+            type_code = self._dictionaries["type"].get(vuln_type, -1) if vuln_type else None
+            cwe_code = self._dictionaries["cwe"].get(cwe_id, -1) if cwe_id else None
+
+            if severity_code is None and type_code is None and cwe_code is None:
+                type_counts = Counter(self._finding_type)
+                total_findings = len(self._finding_type)
+                contracts = set(self._analysis_contract)
+                analysis_risks = self._analysis_risk
+                finding_risks = self._finding_risk
+                prompt_tokens = sum(self._analysis_prompt_tokens)
+                completion_tokens = sum(self._analysis_completion_tokens)
+            else:
+                selected = [
+                    i for i in range(len(self._finding_type))
+                    if (severity_code is None or self._finding_severity[i] == severity_code)
+                    and (type_code is None or self._finding_type[i] == type_code)
+                    and (cwe_code is None or self._finding_cwe[i] == cwe_code)
+                ]
+                type_counts = Counter(self._finding_type[i] for i in selected)
+                total_findings = len(selected)
+                contracts = set(self._finding_contract[i] for i in selected)
+                finding_risks = array('d', (self._finding_risk[i] for i in selected))
+                # Risk and tokens of the analyses of the contracts with matching findings
+                analyses = [i for i, code in enumerate(self._analysis_contract) if code in contracts]
+                analysis_risks = array('d', (self._analysis_risk[i] for i in analyses))
+                prompt_tokens = sum(self._analysis_prompt_tokens[i] for i in analyses)
+                completion_tokens = sum(self._analysis_completion_tokens[i] for i in analyses)
+
+            average_risk = sum(analysis_risks) / len(analysis_risks) if analysis_risks else 0.0
+            average_finding_risk = sum(finding_risks) / len(finding_risks) if finding_risks else 0.0
+            type_names = self._values["type"]
+
+            return VulnerabilityStats(
+                totalContracts=len(contracts),
+                totalVulnerabilities=total_findings,
+                averageRiskScore=round(average_risk, 2),
+                averageFindingRiskScore=round(average_finding_risk, 2),
+                commonVulnerabilities=[
+                    {type_names[code]: count} for code, count in type_counts.most_common(limit)
+                ],
+                totalPromptTokens=prompt_tokens,
+                totalCompletionTokens=completion_tokens
+            )
+
+    def export_ndjson(self, kind: str = "analyses") -> Iterator[str]:
+        """Stream stored analyses or findings as newline-delimited JSON"""
+        connection = self._connect()
+        try:
+            if kind == "findings":
+                cursor = connection.execute(
+                    "SELECT id, analysis_id, contract_hash, type, cwe_id, severity, risk_score, "
+                    "start_line, end_line FROM findings ORDER BY id"
+                )
+                columns = [
+                    "id", "analysisId", "contractHash", "type", "cweId", "severity",
+                    "riskScore", "startLine", "endLine"
+                ]
+                for row in cursor:
+                    yield json.dumps(dict(zip(columns, row))) + "\n"
+            else:
+                cursor = connection.execute(
+                    "SELECT id, contract_hash, payload FROM analyses ORDER BY id"
+                )
+                for analysis_id, contract_hash, payload in cursor:
+                    report = zlib.decompress(payload).decode('utf-8')
+                    yield (
+                        f'{{"id": {analysis_id}, "contractHash": "{contract_hash}", '
+                        f'"analysis": {report}}}\n'
+                    )
+        finally:
+            connection.close()
+
+    def find_by_contract_hash(self, contract_hash: str) -> List[Dict[str, Any]]:
+        """Return stored analyses for a contract, newest first"""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT id, payload FROM analyses WHERE contract_hash = ? ORDER BY id DESC",
+                (contract_hash,)
+            ).fetchall()
+        finally:
+            connection.close()
+
+        return [
+            {"id": analysis_id, "analysis": json.loads(zlib.decompress(payload))}
+            for analysis_id, payload in rows
+        ]
+
+    def get_findings(self, analysis_id: int, severity: Optional[str] = None, vuln_type: Optional[str] = None,
+                     offset: int = 0, limit: int = 50) -> Optional[FindingsPage]:
+        """One page of a stored analysis's findings, most severe and riskiest first; None if unknown"""
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT payload FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+
+        vulnerabilities = json.loads(zlib.decompress(row[0]))['vulnerabilities']
+        if severity:
+            vulnerabilities = [vuln for vuln in vulnerabilities if vuln['severity'].upper() == severity.upper()]
+        if vuln_type:
+            vulnerabilities = [vuln for vuln in vulnerabilities if vuln['type'] == vuln_type]
+        vulnerabilities.sort(
+            key=lambda vuln: (SEVERITY_CODES.get(vuln['severity'].upper(), len(SEVERITY_CODES)), -vuln['riskScore'])
+        )
+
+        return FindingsPage(
+            analysisId=analysis_id,
+            total=len(vulnerabilities),
+            offset=offset,
+            limit=limit,
+            vulnerabilities=vulnerabilities[offset:offset + limit]
+        )
+
+    def _encode(self, column: str, value: Optional[str]) -> int:
+        """Dictionary-encode a string value for a cached column"""
+        if value is None:
+            return -1
+        codes = self._dictionaries[column]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._values[column])
+            codes[value] = code
+            self._values[column].append(value)
+        return code
+
+    def _refresh_cache(self) -> None:
+        """Append rows written since the last refresh (possibly by other workers)"""
+        connection = self._connect()
+        try:
+            for analysis_id, contract_hash, risk_score, prompt_tokens, completion_tokens in connection.execute(
+                "SELECT id, contract_hash, risk_score, prompt_tokens, completion_tokens FROM analyses "
+                "WHERE id > ? ORDER BY id",
+                (self._last_analysis_id,)
+            ):
+                self._analysis_contract.append(self._encode("contract", contract_hash))
+                self._analysis_risk.append(risk_score)
+                self._analysis_prompt_tokens.append(prompt_tokens)
+                self._analysis_completion_tokens.append(completion_tokens)
+                self._last_analysis_id = analysis_id
+
+            for finding_id, contract_hash, vuln_type, cwe_id, severity, risk_score in connection.execute(
+                "SELECT id, contract_hash, type, cwe_id, severity, risk_score FROM findings "
+                "WHERE id > ? ORDER BY id",
+                (self._last_finding_id,)
+            ):
+                self._finding_contract.append(self._encode("contract", contract_hash))
+                self._finding_type.append(self._encode("type", vuln_type))
+                self._finding_cwe.append(self._encode("cwe", cwe_id))
+                self._finding_severity.append(SEVERITY_CODES.get(severity, 4))
+                self._finding_risk.append(risk_score)
+                self._last_finding_id = finding_id
+        finally:
+            connection.close()
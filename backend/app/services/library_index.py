@@ -0,0 +1,247 @@
+import os
+import re
+import sys
+import json
+import mmap
+import bisect
+import struct
+import hashlib
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Union
+
+from app.models.schemas import KnownLibraryMatch
+from app.services.solidity_parser import contract_headers, declaration_end
+from app.utils.source_buffer import SourceBuffer
+from app.utils.solidity_text import strip_comments_and_strings, match_braces
+
+INDEX_MAGIC = b"SCKL"
+INDEX_FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIII")  # magic, format version, entry count, metadata offset
+
+LIBRARY_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "known_libraries")
+DEFAULT_INDEX_PATH = os.path.join(LIBRARY_SOURCE_DIR, "index.bin")
+
+@dataclass
+class CodeUnit:
+    """Function-like declaration with its fingerprint and line span"""
+    name: str
+    fingerprint: int
+    start_line: int
+    end_line: int
+
+@dataclass
+class CodeBlock:
+    """Contract, library or interface block and the units declared in it"""
+    kind: str
+    name: str
+    start_line: int
+    end_line: int
+    units: List[CodeUnit] = field(default_factory=list)
+
+class KnownLibraryIndex:
+    """Memory-mapped index of function fingerprints from vetted library versions"""
+
+    def __init__(self, index_path: Optional[str] = None):
+        self.index_path = index_path if index_path is not None else os.getenv("KNOWN_LIBRARY_INDEX", DEFAULT_INDEX_PATH)
+        self._mmap: Optional[mmap.mmap] = None
+        self._fingerprints = None
+        self._entry_ids = None
+        self._metadata: List[Dict[str, str]] = []
+        self._load()
+        # Longer (minified) lines are blanked before matching, like the detector's line-based rules skip them
+        self.max_line_length = int(os.getenv("DETECTOR_MAX_LINE_LENGTH", "4000"))
+
+        self.unit_pattern = re.compile(
+            r'\b(?:function\s+(\w+)|(constructor|fallback|receive)\s*\(|modifier\s+(\w+))[^{;]*([{;])'
+        )
+
+    def _load(self) -> None:
+        """Memory-map the index file if it exists"""
+        if not self.index_path:
+            return
+        if not os.path.exists(self.index_path):
+            print(f"Known library index not found at {self.index_path}")
+            return
+
+        with open(self.index_path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, metadata_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != INDEX_MAGIC or version != INDEX_FORMAT_VERSION:
+            print(f"Unsupported known library index format in {self.index_path}")
+            return
+
+        # Fingerprints and entry ids are read in place from the mapping without copying
+        view = memoryview(self._mmap)
+        fingerprints_end = HEADER.size + count * 8
+        self._fingerprints = view[HEADER.size:fingerprints_end].cast("Q")
+        self._entry_ids = view[fingerprints_end:fingerprints_end + count * 4].cast("I")
+        self._metadata = json.loads(bytes(view[metadata_offset:]).decode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._fingerprints) if self._fingerprints is not None else 0
+
+    def lookup(self, fingerprint: int) -> Optional[Dict[str, str]]:
+        """Binary-search the mapped fingerprint table"""
+        if not self._fingerprints:
+            return None
+        position = bisect.bisect_left(self._fingerprints, fingerprint)
+        if position < len(self._fingerprints) and self._fingerprints[position] == fingerprint:
+            return self._metadata[self._entry_ids[position]]
+        return None
+
+    def find_known_libraries(self, contract_code: Union[str, SourceBuffer]) -> List[KnownLibraryMatch]:
+        """
+        Find spans of vetted library code. A block whose every unit is known is
+        matched whole (state variables and events included); otherwise only the
+        known units are matched.
+        """
+        if not len(self):
+            return []
+
+        matches = []
+        source = SourceBuffer.of(contract_code).blank_long_lines(self.max_line_length)
+        for block in self.extract_blocks(source):
+            known = [(unit, self.lookup(unit.fingerprint)) for unit in block.units]
+            known = [(unit, entry) for unit, entry in known if entry]
+            if not known:
+                continue
+
+            versions = [entry["version"] for _, entry in known]
+            version = max(set(versions), key=versions.count)
+
+            if len(known) == len(block.units):
+                matches.append(KnownLibraryMatch(
+                    name=block.name,
+                    version=version,
+                    startLine=block.start_line,
+                    endLine=block.end_line,
+                    matchedFunctions=[unit.name for unit, _ in known],
+                    fullyMatched=True
+                ))
+            else:
+                for unit, entry in known:
+                    matches.append(KnownLibraryMatch(
+                        name=f"{entry['library']}.{unit.name}",
+                        version=entry["version"],
+                        startLine=unit.start_line,
+                        endLine=unit.end_line,
+                        matchedFunctions=[unit.name],
+                        fullyMatched=False
+                    ))
+
+        return matches
+
+    def mask_known_libraries(self, contract_code: Union[str, SourceBuffer],
+                             matches: List[KnownLibraryMatch]) -> SourceBuffer:
+        """
+        Blank out known library lines so rule scans and LLM prompts skip them.
+        Line numbers are preserved so findings still point at the real source.
+        """
+        source = SourceBuffer.of(contract_code)
+        if not matches:
+            return source
+
+        lines = list(source.lines)
+        for match in matches:
+            for line in range(match.startLine, min(match.endLine, len(lines)) + 1):
+                lines[line - 1] = ""
+            lines[match.startLine - 1] = f"// known library code omitted: {match.name} ({match.version})"
+
+        return SourceBuffer('\n'.join(lines), source.filename)
+
+    def extract_blocks(self, contract_code: Union[str, SourceBuffer]) -> List[CodeBlock]:
+        """Split source into contract-level blocks with fingerprinted units"""
+        source = SourceBuffer.of(contract_code)
+        stripped = strip_comments_and_strings(source.text)
+        closing = match_braces(stripped)
+        # Stripping keeps offsets and newlines, so the source's line table applies
+        line_of = source.line_of
+
+        blocks = []
+        for block_match, open_brace, _ in contract_headers(stripped):
+            close_brace = closing.get(open_brace)
+            if close_brace is None:
+                continue
+
+            block = CodeBlock(
+                kind=block_match.group(2),
+                name=block_match.group(3),
+                start_line=line_of(block_match.start()),
+                end_line=line_of(close_brace)
+            )
+
+            position = open_brace + 1
+            # A unit header runs to a { or ;, so none starts after the block's last one
+            units_end = declaration_end(stripped, position, close_brace)
+            while True:
+                unit_match = self.unit_pattern.search(stripped, position, units_end)
+                if not unit_match:
+                    break
+
+                if unit_match.group(4) == '{':
+                    end = closing.get(unit_match.end() - 1, unit_match.end() - 1)
+                else:
+                    end = unit_match.end() - 1
+
+                name = unit_match.group(1) or unit_match.group(2) or unit_match.group(3)
+                block.units.append(CodeUnit(
+                    name=name,
+                    fingerprint=self.fingerprint(stripped[unit_match.start():end + 1]),
+                    start_line=line_of(unit_match.start()),
+                    end_line=line_of(end)
+                ))
+                position = end + 1
+
+            blocks.append(block)
+
+        return blocks
+
+    def fingerprint(self, unit_source: str) -> int:
+        """Fingerprint a unit from its token stream so formatting does not matter"""
+        normalized = ' '.join(re.findall(r'[A-Za-z_$][\w$]*|\d+|\S', unit_source))
+        return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+    @classmethod
+    def build(cls, source_dir: str = LIBRARY_SOURCE_DIR, output_path: str = DEFAULT_INDEX_PATH) -> int:
+        """
+        Build the index from vetted sources laid out as <source_dir>/<version>/<File>.sol.
+        Returns the number of fingerprints written.
+        """
+        builder = cls(index_path="")
+
+        entries: Dict[int, Dict[str, str]] = {}
+        for version in sorted(os.listdir(source_dir)):
+            version_dir = os.path.join(source_dir, version)
+            if not os.path.isdir(version_dir):
+                continue
+            for filename in sorted(os.listdir(version_dir)):
+                if not filename.endswith('.sol'):
+                    continue
+                with open(os.path.join(version_dir, filename), 'r') as f:
+                    source = f.read()
+                for block in builder.extract_blocks(source):
+                    for unit in block.units:
+                        entries.setdefault(unit.fingerprint, {
+                            "library": block.name,
+                            "version": version,
+                            "function": unit.name
+                        })
+
+        fingerprints = sorted(entries)
+        metadata = [entries[fp] for fp in fingerprints]
+        metadata_bytes = json.dumps(metadata, separators=(',', ':')).encode("utf-8")
+        metadata_offset = HEADER.size + len(fingerprints) * 12
+
+        with open(output_path, "wb") as output:
+            output.write(HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, len(fingerprints), metadata_offset))
+            output.write(struct.pack(f"<{len(fingerprints)}Q", *fingerprints))
+            output.write(struct.pack(f"<{len(fingerprints)}I", *range(len(fingerprints))))
+            output.write(metadata_bytes)
+
+        return len(fingerprints)
+
+if __name__ == "__main__":
+    # Rebuild the shipped index: python -m app.services.library_index [source_dir] [output_path]
+    count = KnownLibraryIndex.build(*sys.argv[1:3])
+    print(f"Wrote {count} library fingerprints")
@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from statistics import median
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.models.schemas import ModelLatencyReport, ModelRoutingDecision
+from app.services.token_budget import TokenCounter
+
+# Prompt types the fallback model answers as well as the primary one, whatever the contract
+LIGHT_STAGES = frozenset(("insights",))
+
+ROUTE_PINNED = "pinned"
+ROUTE_DISABLED = "routing disabled"
+ROUTE_LIGHT_PROMPT = "light prompt"
+ROUTE_HIGH_RISK = "high-risk contract"
+ROUTE_SIMPLE = "low-complexity contract"
+ROUTE_COMPLEX = "complex or large contract"
+ROUTE_OVERSIZED = "prompt exceeds fallback context window"
+ROUTE_ESCALATED = "escalated after fallback error"
+ROUTE_CACHED_PREFIX = "cached conversation prefix"
+
+@dataclass
+class RoutingContext:
+    """Routing inputs of one analysis request, and the decisions taken for its AI calls"""
+    complexity: Optional[str] = None  # Parser complexity: Low, Medium or High
+    high_risk: bool = False
+    decisions: List[ModelRoutingDecision] = field(default_factory=list)
+
+# Routing context of the request running in the current task. Tasks spawned for
+# fixes or per-contract reviews copy the context and so record into the same object.
+current_model_routing: ContextVar[Optional[RoutingContext]] = ContextVar("current_model_routing", default=None)
+
+class ModelRouter:
+    """Picks the model of each AI call from its prompt type, prompt size and the contract's complexity"""
+
+    def __init__(self, token_counter: Optional[TokenCounter] = None, latency_window: int = 200):
+        self.token_counter = token_counter or TokenCounter()
+        self.primary_model = os.getenv("PRIMARY_AI_MODEL", "gpt-4-1106-preview")
+        self.fallback_model = os.getenv("FALLBACK_AI_MODEL", "gpt-3.5-turbo")
+        self.enabled = os.getenv("AI_MODEL_ROUTING", "true").lower() == "true"
+        # Largest analysis or fix prompt a low-complexity contract may send to the fallback model
+        self.small_prompt_tokens = int(os.getenv("AI_ROUTING_SMALL_PROMPT_TOKENS", "3000"))
+
+        # Recent call latencies per (stage, model), for the latency summary
+        self.latency_window = latency_window
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def route(self, stage: str, prompt_tokens: int, completion_reserve: int,
+              pinned: Optional[str] = None, affinity: Optional[str] = None) -> Tuple[str, str]:
+        """
+        (model, reason) for a call. pinned is a model the request already
+        chose (e.g. by triage); it holds for every prompt type except the light
+        ones. affinity is the model whose prompt cache holds the call's prefix,
+        which outweighs everything else. Without a routing context the contract
+        counts as complex.
+        """
+        if not self.enabled:
+            return pinned or self.primary_model, ROUTE_PINNED if pinned else ROUTE_DISABLED
+        if affinity:
+            return affinity, ROUTE_CACHED_PREFIX
+
+        context = current_model_routing.get()
+        if stage in LIGHT_STAGES:
+            model, reason = self.fallback_model, ROUTE_LIGHT_PROMPT
+        elif pinned:
+            return pinned, ROUTE_PINNED
+        elif context is not None and context.high_risk:
+            return self.primary_model, ROUTE_HIGH_RISK
+        elif context is not None and context.complexity == "Low" and prompt_tokens <= self.small_prompt_tokens:
+            model, reason = self.fallback_model, ROUTE_SIMPLE
+        else:
+            return self.primary_model, ROUTE_COMPLEX
+
+        if prompt_tokens + completion_reserve > self.token_counter.context_window(model):
+            return pinned or self.primary_model, ROUTE_OVERSIZED
+        return model, reason
+
+    def record(self, stage: str, model: str, reason: str, prompt_tokens: int, latency_ms: float,
+               ok: bool = True) -> None:
+        """Add a finished call to the current request's decisions and the latency summary"""
+        context = current_model_routing.get()
+        if context is not None:
+            context.decisions.append(ModelRoutingDecision(
+                stage=stage,
+                model=model,
+                reason=reason,
+                promptTokens=prompt_tokens,
+                latencyMs=round(latency_ms, 1),
+                ok=ok
+            ))
+        if ok:
+            with self._lock:
+                window = self._latencies.setdefault((stage, model), deque(maxlen=self.latency_window))
+                window.append(latency_ms)
+
+    def latency_summary(self) -> List[ModelLatencyReport]:
+        """Median latency of recent successful calls per prompt type and model, in this process"""
+        with self._lock:
+            windows = {key: list(window) for key, window in self._latencies.items()}
+        return [
+            ModelLatencyReport(stage=stage, model=model, calls=len(latencies), medianMs=round(median(latencies), 1))
+            for (stage, model), latencies in sorted(windows.items())
+        ]
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# Detector cost per rule: name -> [seconds, runs, hits]. Plain lists so pool
+# workers can return them with their unit results.
+RuleStats = Dict[str, List[float]]
+
+PROFILE_ID_LENGTH = 32
+
+def merge_rule_stats(into: RuleStats, stats: Optional[RuleStats]) -> None:
+    """Add one scan's per-rule stats to a running total"""
+    for rule, (seconds, runs, hits) in (stats or {}).items():
+        total = into.setdefault(rule, [0.0, 0, 0])
+        total[0] += seconds
+        total[1] += runs
+        total[2] += hits
+
+class RequestProfiler:
+    """
+    Opt-in profile of one analysis request: a deterministic CPU profile,
+    wall time and tracemalloc allocation peak per pipeline stage, and
+    per-rule detector cost. cProfile and tracemalloc are process-wide, so
+    only one request is CPU-profiled at a time and its figures include
+    whatever else the event loop ran meanwhile.
+    """
+
+    _cpu_lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = None):
+        self.profile_id = uuid.uuid4().hex
+        self.directory = directory or os.getenv("PROFILE_DIR", "data/profiles")
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.rule_stats: RuleStats = {}
+        self._cpu_profile: Optional[cProfile.Profile] = None
+        self._owns_tracing = False
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if not RequestProfiler._cpu_lock.acquire(blocking=False):
+            print("Profiler busy: recording stage and rule timings only")
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        self._cpu_profile = cProfile.Profile()
+        self._cpu_profile.enable()
+
+    def stop(self) -> None:
+        self._elapsed = time.perf_counter() - self._started
+        if self._cpu_profile is None:
+            return
+
+        self._cpu_profile.disable()
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+        RequestProfiler._cpu_lock.release()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record wall time and, while tracing, the allocation peak of a stage"""
+        tracing = self._owns_tracing and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, {"wallMs": 0.0})
+            record["wallMs"] = round(record["wallMs"] + (time.perf_counter() - started) * 1000, 3)
+            if tracing:
+                peak_kb = (tracemalloc.get_traced_memory()[1] - baseline) / 1024
+                record["peakAllocKb"] = round(max(record.get("peakAllocKb", 0.0), peak_kb), 1)
+
+    def summary(self, top: int = 25) -> Dict[str, Any]:
+        """JSON-ready profile: stages, rules by cost and the hottest functions"""
+        rules = sorted(self.rule_stats.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            "profileId": self.profile_id,
+            "totalWallMs": round(self._elapsed * 1000, 3),
+            "cpuProfiled": self._cpu_profile is not None,
+            "stages": self.stages,
+            "rules": [
+                {"rule": rule, "wallMs": round(seconds * 1000, 3), "runs": int(runs), "hits": int(hits)}
+                for rule, (seconds, runs, hits) in rules
+            ],
+            "functions": self._hottest_functions(top)
+        }
+
+    def save(self) -> str:
+        """Write the JSON summary and, if captured, the pstats file; returns the profile id"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{self.profile_id}.json"), "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        if self._cpu_profile is not None:
+            self._cpu_profile.dump_stats(os.path.join(self.directory, f"{self.profile_id}.prof"))
+        return self.profile_id
+
+    def _hottest_functions(self, top: int) -> List[Dict[str, Any]]:
+        """Functions by cumulative time from the CPU profile"""
+        if self._cpu_profile is None:
+            return []
+        stats = pstats.Stats(self._cpu_profile).stats
+        entries = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+        return [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({function})",
+                "calls": calls,
+                "ownMs": round(own * 1000, 3),
+                "cumulativeMs": round(cumulative * 1000, 3)
+            }
+            for (filename, line, function), (_, calls, own, cumulative, _) in entries
+        ]
+
+# Profiler of the request running in the current task, if it asked for one
+current_profiler: ContextVar[Optional[RequestProfiler]] = ContextVar("current_profiler", default=None)
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage when the current request is being profiled"""
+    profiler = current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+def profile_path(profile_id: str, extension: str, directory: Optional[str] = None) -> Optional[str]:
+    """Path of a stored profile artifact, or None for malformed ids and missing files"""
+    if len(profile_id) != PROFILE_ID_LENGTH or any(c not in "0123456789abcdef" for c in profile_id):
+        return None
+    path = os.path.join(directory or os.getenv("PROFILE_DIR", "data/profiles"), f"{profile_id}.{extension}")
+    return path if os.path.exists(path) else None
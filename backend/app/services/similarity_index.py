@@ -0,0 +1,229 @@
+import os
+import re
+import zlib
+import sqlite3
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Set
+
+from app.models.schemas import VulnerabilityReport, VulnerabilityLocation
+from app.utils.solidity_text import strip_comments
+
+@dataclass
+class SimilarContract:
+    """Near-duplicate contract found in the index"""
+    contract_hash: str
+    similarity: float
+    source: str
+
+class ContractSimilarityIndex:
+    """MinHash/LSH index over normalized token shingles of analyzed contracts"""
+
+    def __init__(self, db_path: Optional[str] = None, num_bins: int = 128, bands: int = 32, shingle_size: int = 5):
+        self.db_path = db_path or os.getenv("HISTORY_DB_PATH", "data/analysis_history.db")
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows_per_band = num_bins // bands
+        self.shingle_size = shingle_size
+        self._initialized = False
+
+        # One-permutation MinHash: the top bits of each shingle hash pick a bin
+        self._bin_shift = 64 - (num_bins.bit_length() - 1)
+        self._value_mask = (1 << self._bin_shift) - 1
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema on first use"""
+        if not self._initialized:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=10)
+
+        if not self._initialized:
+            connection.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS contract_signatures (
+                    contract_hash TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    source BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    contract_hash TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets(band, bucket);
+            """)
+            self._initialized = True
+
+        return connection
+
+    def shingles(self, contract_code: str) -> Set[int]:
+        """Hash every run of shingle_size normalized tokens"""
+        # Comments and whitespace differences should not affect similarity
+        tokens = re.findall(r'[A-Za-z_$][\w$]*|\d+|\S', strip_comments(contract_code))
+
+        if len(tokens) < self.shingle_size:
+            tokens = tokens + [''] * (self.shingle_size - len(tokens))
+
+        return {
+            int.from_bytes(
+                hashlib.blake2b(' '.join(tokens[i:i + self.shingle_size]).encode('utf-8'), digest_size=8).digest(),
+                'big'
+            )
+            for i in range(len(tokens) - self.shingle_size + 1)
+        }
+
+    def signature(self, contract_code: str) -> array:
+        """Compute a densified one-permutation MinHash signature"""
+        empty = self._value_mask + 1
+        bins = [empty] * self.num_bins
+
+        for shingle in self.shingles(contract_code):
+            index = shingle >> self._bin_shift
+            value = shingle & self._value_mask
+            if value < bins[index]:
+                bins[index] = value
+
+        # Densify: empty bins borrow from the next non-empty bin, offset by distance
+        if any(value != empty for value in bins):
+            densified = list(bins)
+            for i in range(self.num_bins):
+                if bins[i] == empty:
+                    distance = 1
+                    while bins[(i + distance) % self.num_bins] == empty:
+                        distance += 1
+                    densified[i] = (bins[(i + distance) % self.num_bins] + distance * empty) & 0xFFFFFFFFFFFFFFFF
+            bins = densified
+
+        return array('Q', bins)
+
+    def estimate_similarity(self, signature_a: array, signature_b: array) -> float:
+        """Estimate Jaccard similarity from two signatures"""
+        matches = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+        return matches / self.num_bins
+
+    def exact_similarity(self, code_a: str, code_b: str) -> float:
+        """Exact Jaccard similarity of two contracts' shingle sets"""
+        shingles_a = self.shingles(code_a)
+        shingles_b = self.shingles(code_b)
+        union = len(shingles_a | shingles_b)
+        return len(shingles_a & shingles_b) / union if union else 1.0
+
+    def add(self, contract_hash: str, contract_code: str, signature: Optional[array] = None) -> None:
+        """Index an analyzed contract"""
+        signature = signature if signature is not None else self.signature(contract_code)
+
+        connection = self._connect()
+        try:
+            with connection:
+                existing = connection.execute(
+                    "SELECT 1 FROM contract_signatures WHERE contract_hash = ?", (contract_hash,)
+                ).fetchone()
+                if existing:
+                    return
+
+                connection.execute(
+                    "INSERT INTO contract_signatures (contract_hash, signature, source) VALUES (?, ?, ?)",
+                    (contract_hash, signature.tobytes(), zlib.compress(contract_code.encode('utf-8'), 6))
+                )
+                connection.executemany(
+                    "INSERT INTO lsh_buckets (band, bucket, contract_hash) VALUES (?, ?, ?)",
+                    [(band, bucket, contract_hash) for band, bucket in enumerate(self._band_buckets(signature))]
+                )
+        finally:
+            connection.close()
+
+    def find_similar(self, contract_code: str, signature: Optional[array] = None,
+                     threshold: float = 0.5, exclude_hash: Optional[str] = None,
+                     limit: int = 5) -> List[SimilarContract]:
+        """Find indexed contracts whose estimated similarity is at least threshold"""
+        signature = signature if signature is not None else self.signature(contract_code)
+        buckets = self._band_buckets(signature)
+
+        # Candidates share at least one band bucket; the index makes this sublinear
+        conditions = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+        parameters = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+
+        connection = self._connect()
+        try:
+            candidates = [
+                row[0] for row in connection.execute(
+                    f"SELECT DISTINCT contract_hash FROM lsh_buckets WHERE {conditions}", parameters
+                )
+                if row[0] != exclude_hash
+            ]
+
+            matches = []
+            for contract_hash in candidates:
+                row = connection.execute(
+                    "SELECT signature, source FROM contract_signatures WHERE contract_hash = ?",
+                    (contract_hash,)
+                ).fetchone()
+                if not row:
+                    continue
+
+                candidate_signature = array('Q')
+                candidate_signature.frombytes(row[0])
+                similarity = self.estimate_similarity(signature, candidate_signature)
+                if similarity >= threshold:
+                    matches.append(SimilarContract(
+                        contract_hash=contract_hash,
+                        similarity=similarity,
+                        source=zlib.decompress(row[1]).decode('utf-8')
+                    ))
+        finally:
+            connection.close()
+
+        matches.sort(key=lambda match: match.similarity, reverse=True)
+        return matches[:limit]
+
+    def remap_prior_findings(self, prior_vulnerabilities: List[Dict[str, Any]], line_map: Dict[int, int],
+                             filename: str) -> List[VulnerabilityReport]:
+        """
+        Carry AI findings from a near-duplicate over to the new contract when
+        every line they cover is unchanged
+        """
+        reused = []
+
+        for vuln_data in prior_vulnerabilities:
+            methods = vuln_data.get("detectionMethods") or [vuln_data.get("detectionMethod", "")]
+            if not any(method.startswith("AI Analysis") for method in methods):
+                continue
+
+            location = vuln_data["location"]
+            start, end = location["startLine"], location["endLine"]
+            if any(line not in line_map for line in range(start, end + 1)):
+                continue
+
+            new_start, new_end = line_map[start], line_map[end]
+            if new_end - new_start != end - start:
+                continue
+
+            vuln_data = dict(vuln_data)
+            vuln_data.update({
+                "location": VulnerabilityLocation(
+                    file=filename,
+                    startLine=new_start,
+                    endLine=new_end,
+                    function=location.get("function")
+                ),
+                "detectionMethod": "AI Analysis (Reused)",
+                "detectionMethods": ["AI Analysis (Reused)"]
+            })
+            reused.append(VulnerabilityReport(**vuln_data))
+
+        return reused
+
+    def _band_buckets(self, signature: array) -> List[int]:
+        """Hash each band of the signature into a bucket id"""
+        rows = self.rows_per_band
+        return [
+            int.from_bytes(
+                hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+                'big'
+            ) >> 1  # Fit SQLite's signed 64-bit INTEGER
+            for band in range(self.bands)
+        ]
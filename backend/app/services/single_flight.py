@@ -0,0 +1,160 @@
+import os
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within a worker only
+    fcntl = None
+
+class AnalysisCoalescer:
+    """
+    Single-flight coalescing of identical concurrent analyses.
+
+    Within a worker, callers with the same key await one shared future. Across
+    uvicorn workers, an flock per key elects one leader; the others wait for the
+    leader's result to appear in a shared result directory.
+    """
+
+    def __init__(self, serialize: Callable[[Any], str], deserialize: Callable[[str], Any],
+                 directory: Optional[str] = None, result_ttl: Optional[float] = None,
+                 poll_interval: float = 0.1, wait_timeout: float = 300.0):
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.directory = directory or os.getenv("SINGLE_FLIGHT_DIR", "data/inflight")
+        # How long a finished result is served to requests that were waiting on it
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "10"))
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._last_sweep = 0.0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run factory once per key, sharing its result with concurrent callers"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_across_workers(key, factory)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a leader without followers does not log a warning
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _run_across_workers(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Elect a leader across processes with a per-key file lock"""
+        if fcntl is None:
+            return await factory()
+
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.directory, f"{digest}.lock")
+        result_path = os.path.join(self.directory, f"{digest}.json")
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            cached = self._read_result(result_path)
+            if cached is not None:
+                return cached
+
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(lock_fd)
+                # Another worker is running this analysis; wait for its result
+                if time.monotonic() > deadline:
+                    return await factory()
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if not self._holds_path(lock_fd, lock_path):
+                # The sweep removed this lock file before we locked it; lock the current one
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+                continue
+
+            try:
+                # The previous leader may have finished between our check and the lock
+                cached = self._read_result(result_path)
+                if cached is not None:
+                    return cached
+
+                result = await factory()
+                self._write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+                self._sweep()
+
+    def _holds_path(self, lock_fd: int, lock_path: str) -> bool:
+        """Whether a locked descriptor is still the file at lock_path, not one the sweep unlinked"""
+        try:
+            return os.stat(lock_path).st_ino == os.fstat(lock_fd).st_ino
+        except OSError:
+            return False
+
+    def _read_result(self, result_path: str) -> Optional[Any]:
+        """Load a recent result written by a leader, if any"""
+        try:
+            if time.time() - os.path.getmtime(result_path) > self.result_ttl:
+                return None
+            with open(result_path, 'r') as f:
+                return self.deserialize(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, result_path: str, result: Any) -> None:
+        """Atomically publish a result for waiting workers"""
+        temp_path = f"{result_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(self.serialize(result))
+            os.replace(temp_path, result_path)
+        except OSError as e:
+            print(f"Single-flight result write error: {str(e)}")
+
+    def _sweep(self) -> None:
+        """Remove expired result files and long-idle lock files, at most once per TTL"""
+        now = time.time()
+        if now - self._last_sweep < self.result_ttl:
+            return
+        self._last_sweep = now
+
+        try:
+            for entry in os.scandir(self.directory):
+                age = now - entry.stat().st_mtime
+                if entry.name.endswith('.json') and age > self.result_ttl:
+                    os.remove(entry.path)
+                elif entry.name.endswith('.lock') and age > self.wait_timeout:
+                    self._remove_idle_lock(entry.path)
+        except OSError:
+            pass
+
+    def _remove_idle_lock(self, lock_path: str) -> None:
+        """Remove a lock file only if no worker holds it; a leader's file stays however old"""
+        try:
+            lock_fd = os.open(lock_path, os.O_RDWR)
+        except OSError:
+            return
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return
+        try:
+            os.remove(lock_path)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
@@ -1,8 +1,76 @@
+import os
 import re
-from typing import List, Dict, Any
-from dataclasses import dataclass
+import bisect
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+from dataclasses import dataclass, field
 
 from app.models.schemas import ContractInfo
+from app.utils.source_buffer import SourceBuffer
+from app.utils.solidity_text import strip_comments_and_strings, match_braces, NextDelimiter
+
+# Parser regexes compiled once at import so preforked workers share them copy-on-write.
+# Unbounded repeats stop at a delimiter and never sit next to one that can match
+# the same text. A pattern whose tail runs to a delimiter it then requires is
+# searched no further than the last such delimiter (see declaration_end), and
+# headers that need one delimiter but may meet another (contract_unit,
+# function_signature) match only up to their name, with the rest found by
+# NextDelimiter, so no failed header rescans the text after it.
+PARSER_REGEXES = {
+    'function_signature': re.compile(r'function\s+(\w+)\s*\('),
+    'parameter': re.compile(r'\b(\w+(?:\[\])?)\s+(\w+)'),
+    'custom_modifier': re.compile(r'\b(?!public|external|private|internal|view|pure|payable|returns)\w+(?=\s*(?:\(|$))'),
+    'returns': re.compile(r'returns\s*\(([^)]+)\)'),
+    'contract_unit': re.compile(r'\b(?:(abstract)\s+)?(contract|library|interface)\s+(\w+)'),
+    'declaration_end': re.compile(r'[{;]'),
+    'parameters_end': re.compile(r'\)'),
+    'inheritance': re.compile(r'\bis\b(.*)', re.DOTALL),
+    'inherited_name': re.compile(r'\b(\w+)\s*(?:\([^()]*\)\s*)?(?:,|$)'),
+    'free_function': re.compile(r'\bfunction\b'),
+    'function_header': re.compile(
+        r'\b(?:function\s+(\w+)|(constructor|fallback|receive))\s*\(((?:[^()]|\([^()]*\))*)\)([^{;]*)([{;])'
+    ),
+    'non_variable_declaration': re.compile(r'(?:function|event|modifier|constructor|struct|enum|using|error|fallback|receive)\b'),
+    'state_variable_declaration': re.compile(
+        r'(mapping\s*\([^;]*\)|\w+(?:\[\d*\])*)\s+((?:(?:public|private|internal|constant|immutable)\s+)*)(\w+)\s*(?:=|;)'
+    ),
+    'returns_clause': re.compile(r'\breturns\s*\((?:[^()]|\([^()]*\))*\)'),
+    'modifier_invocation': re.compile(r'\b([A-Za-z_]\w*)\s*(?:\((?:[^()]|\([^()]*\))*\))?'),
+    'decision_point': re.compile(r'\b(?:if|for|while|require|assert)\b|&&|\|\||\?'),
+    'low_level_call': re.compile(r'\.(?:call|delegatecall|staticcall)\b')
+}
+
+# Header keywords that are not modifier invocations
+FUNCTION_QUALIFIERS = frozenset((
+    'public', 'external', 'private', 'internal', 'view', 'pure', 'payable',
+    'virtual', 'override', 'returns'
+))
+
+def declaration_end(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    """
+    Offset just past the last { or ; of text[start:end]. No declaration
+    header closes beyond it, so header searches stop there rather than let
+    every failed header scan on to the end.
+    """
+    end = len(text) if end is None else end
+    return max(text.rfind('{', start, end), text.rfind(';', start, end)) + 1
+
+def contract_headers(stripped: str) -> Iterator[Tuple[re.Match, int, str]]:
+    """
+    (header match, opening brace offset, header text between name and brace)
+    of each contract, library and interface of stripped text, in order. A
+    header ending in ; declares nothing.
+    """
+    delimiters = NextDelimiter(stripped, PARSER_REGEXES['declaration_end'])
+    position = 0
+    for match in PARSER_REGEXES['contract_unit'].finditer(stripped):
+        if match.start() < position:
+            continue
+        brace = delimiters.find(match.end())
+        if brace == -1:
+            return
+        if stripped[brace] == '{':
+            yield match, brace, stripped[match.end():brace]
+            position = brace + 1
 
 @dataclass
 class FunctionInfo:
@@ -15,6 +83,28 @@ class FunctionInfo:
     modifiers: List[str]
     line_number: int
 
+@dataclass
+class ContractUnit:
+    """Top-level contract, library or interface declared in a source file"""
+    kind: str
+    name: str
+    start_line: int
+    end_line: int
+    abstract: bool = False
+    bases: List[str] = field(default_factory=list)
+
+@dataclass
+class FunctionSpan:
+    """Line span of a function body within its contract"""
+    name: str
+    contract: str
+    start_line: int
+    end_line: int
+    visibility: str
+    mutability: str
+    has_body: bool = True
+    modifiers: List[str] = field(default_factory=list)
+
 @dataclass
 class StateVariableInfo:
     """Information about a state variable"""
@@ -27,6 +117,8 @@ class SolidityParser:
     """Parser for Solidity smart contracts"""
     
     def __init__(self):
+        # Longer (minified) lines are blanked before parsing, like the detector's line-based rules skip them
+        self.max_line_length = int(os.getenv("DETECTOR_MAX_LINE_LENGTH", "4000"))
         self.contract_patterns = {
             'contract_declaration': r'contract\s+(\w+)',
             'function_declaration': r'function\s+(\w+)\s*\([^)]*\)\s*([^{]*)\s*\{',
@@ -36,24 +128,29 @@ class SolidityParser:
             'pragma': r'pragma\s+solidity\s+([^;]+);',
             'import': r'import\s+(?:"[^"]+"|\'[^\']+\'|\{[^}]+\}\s+from\s+(?:"[^"]+"|\'[^\']+\'))',
         }
+        self.contract_patterns = {
+            name: re.compile(pattern) for name, pattern in self.contract_patterns.items()
+        }
     
-    def parse_contract(self, contract_code: str, filename: str = "contract.sol") -> ContractInfo:
+    def parse_contract(self, contract_code: Union[str, SourceBuffer], filename: str = "contract.sol") -> ContractInfo:
         """
         Parse Solidity contract and extract structural information
         """
+        source = SourceBuffer.of(contract_code, filename).blank_long_lines(self.max_line_length)
         try:
-            lines = contract_code.split('\n')
+            lines = source.lines
+            units = self.split_contracts(source)
             
             # Extract basic information
-            contract_name = self._extract_contract_name(contract_code)
-            functions = self._extract_functions(contract_code)
-            state_variables = self._extract_state_variables(contract_code)
-            events = self._extract_events(contract_code)
-            modifiers = self._extract_modifiers(contract_code)
+            contract_name = self._extract_contract_name(units)
+            functions = self._extract_functions(source)
+            state_variables = self.extract_state_variables(source, units)
+            events = self._extract_events(source)
+            modifiers = self._extract_modifiers(source)
             
             # Calculate metrics
             lines_of_code = len([line for line in lines if line.strip() and not line.strip().startswith('//')])
-            complexity = self._calculate_complexity(contract_code, functions)
+            complexity = self._calculate_complexity(source, functions)
             
             return ContractInfo(
                 name=contract_name,
@@ -74,38 +171,166 @@ class SolidityParser:
                 stateVariables=[],
                 events=[],
                 modifiers=[],
-                linesOfCode=len(contract_code.split('\n')),
+                linesOfCode=source.line_count,
                 complexity="Unknown"
             )
     
-    def _extract_contract_name(self, contract_code: str) -> str:
-        """Extract the main contract name"""
-        match = re.search(self.contract_patterns['contract_declaration'], contract_code)
-        return match.group(1) if match else "UnknownContract"
+    def split_contracts(self, contract_code: Union[str, SourceBuffer]) -> List[ContractUnit]:
+        """
+        Split a source file into its top-level contracts, libraries and
+        interfaces. Declarations in comments and strings are ignored.
+        """
+        source = SourceBuffer.of(contract_code)
+        stripped = strip_comments_and_strings(source.text)
+        closing = match_braces(stripped)
+        
+        units = []
+        position = 0
+        for match, open_brace, header in contract_headers(stripped):
+            if match.start() < position:
+                continue
+            
+            close_brace = closing.get(open_brace)
+            if close_brace is None:
+                break
+            
+            bases = []
+            inheritance = PARSER_REGEXES['inheritance'].search(header)
+            if inheritance:
+                bases = PARSER_REGEXES['inherited_name'].findall(inheritance.group(1).strip())
+            
+            units.append(ContractUnit(
+                kind=match.group(2),
+                name=match.group(3),
+                start_line=source.line_of(match.start()),
+                end_line=source.line_of(close_brace),
+                abstract=match.group(1) is not None,
+                bases=bases
+            ))
+            position = close_brace + 1
+        
+        return units
+    
+    def top_level_remainder(self, contract_code: Union[str, SourceBuffer],
+                            units: List[ContractUnit]) -> Union[SourceBuffer, None]:
+        """
+        Source outside every unit, with unit lines blanked so line numbers are
+        kept, when it declares free functions; otherwise None
+        """
+        source = SourceBuffer.of(contract_code)
+        lines = list(source.lines)
+        for unit in units:
+            lines[unit.start_line - 1:unit.end_line] = [""] * (unit.end_line - unit.start_line + 1)
+        
+        remainder = '\n'.join(lines)
+        if not PARSER_REGEXES['free_function'].search(strip_comments_and_strings(remainder)):
+            return None
+        return SourceBuffer(remainder, source.filename)
+    
+    def extract_function_spans(self, contract_code: Union[str, SourceBuffer],
+                               units: List[ContractUnit]) -> List[FunctionSpan]:
+        """Find every function, constructor, fallback and receive with its full line span"""
+        source = SourceBuffer.of(contract_code)
+        stripped = strip_comments_and_strings(source.text)
+        closing = match_braces(stripped)
+        # Units are in source order, so the enclosing unit is found by bisection
+        unit_starts = [unit.start_line for unit in units]
+        
+        spans = []
+        for match in PARSER_REGEXES['function_header'].finditer(stripped, 0, declaration_end(stripped)):
+            start_line = source.line_of(match.start())
+            has_body = match.group(5) == '{'
+            end = closing.get(match.end() - 1, match.end() - 1) if has_body else match.end() - 1
+            
+            qualifiers = match.group(4).split()
+            name = match.group(1) or match.group(2)
+            visibility = next(
+                (q for q in qualifiers if q in ('public', 'external', 'private', 'internal')),
+                'external' if name in ('fallback', 'receive') else 'public' if name == 'constructor' else 'internal'
+            )
+            mutability = next((q for q in qualifiers if q in ('view', 'pure', 'payable')), '')
+            header_tail = PARSER_REGEXES['returns_clause'].sub(' ', match.group(4))
+            modifiers = [
+                invocation.group(1)
+                for invocation in PARSER_REGEXES['modifier_invocation'].finditer(header_tail)
+                if invocation.group(1) not in FUNCTION_QUALIFIERS
+            ]
+            position = bisect.bisect_right(unit_starts, start_line) - 1
+            contract = units[position].name if position >= 0 and start_line <= units[position].end_line else ''
+            
+            spans.append(FunctionSpan(
+                name=name,
+                contract=contract,
+                start_line=start_line,
+                end_line=source.line_of(end),
+                visibility=visibility,
+                mutability=mutability,
+                has_body=has_body,
+                modifiers=modifiers
+            ))
+        
+        return spans
+    
+    def function_focus_ranges(self, span: FunctionSpan, spans: List[FunctionSpan],
+                              units: List[ContractUnit]) -> List[tuple]:
+        """
+        Line ranges for a focused review of one function: its contract's
+        declarations and other functions' signatures, plus the whole function
+        """
+        unit = next((u for u in units if u.name == span.contract and u.start_line <= span.start_line <= u.end_line), None)
+        if unit is None:
+            return [(span.start_line, span.end_line)]
+        
+        hidden = set()
+        for other in spans:
+            if other is not span and other.has_body and unit.start_line <= other.start_line <= unit.end_line:
+                hidden.update(range(other.start_line + 1, other.end_line))
+        
+        ranges = []
+        for line in range(unit.start_line, unit.end_line + 1):
+            if line in hidden:
+                continue
+            if ranges and ranges[-1][1] == line - 1:
+                ranges[-1] = (ranges[-1][0], line)
+            else:
+                ranges.append((line, line))
+        return ranges
+    
+    def _extract_contract_name(self, units: List[ContractUnit]) -> str:
+        """
+        Extract the main contract name: the first concrete contract no other
+        unit inherits from, so flattened dependencies are passed over
+        """
+        inherited = {base for unit in units for base in unit.bases}
+        for candidates in (
+            [u for u in units if u.kind == 'contract' and not u.abstract and u.name not in inherited],
+            [u for u in units if u.kind == 'contract'],
+            units
+        ):
+            if candidates:
+                return candidates[0].name
+        return "UnknownContract"
     
-    def _extract_functions(self, contract_code: str) -> List[Dict[str, Any]]:
+    def _extract_functions(self, source: SourceBuffer) -> List[Dict[str, Any]]:
         """Extract function information"""
         functions = []
-        lines = contract_code.split('\n')
+        lines = source.lines
         
         for i, line in enumerate(lines):
             # Match function declarations
-            func_match = re.search(
-                r'function\s+(\w+)\s*\(([^)]*)\)\s*([^{]*?)\s*\{', 
-                line.strip()
-            )
+            signature = self._match_signature(line.strip())
             
-            if func_match:
-                function_name = func_match.group(1)
-                parameters_str = func_match.group(2).strip()
-                modifiers_str = func_match.group(3).strip()
+            if signature:
+                function_name, parameters_str, modifiers_str = signature
+                parameters_str = parameters_str.strip()
+                modifiers_str = modifiers_str.strip()
                 
                 # Parse parameters
                 parameters = []
                 if parameters_str:
                     param_parts = [p.strip() for p in parameters_str.split(',') if p.strip()]
                     for param in param_parts:
-                        param_match = re.search(r'(\w+(?:\[\])?)\s+(\w+)', param)
+                        param_match = PARSER_REGEXES['parameter'].search(param)
                         if param_match:
                             parameters.append(f"{param_match.group(1)} {param_match.group(2)}")
                 
@@ -130,12 +355,12 @@ class SolidityParser:
                         mutability = "payable"
                     
                     # Extract custom modifiers
-                    modifier_matches = re.findall(r'\b(?!public|external|private|internal|view|pure|payable|returns)\w+(?=\s*(?:\(|$))', modifiers_str)
+                    modifier_matches = PARSER_REGEXES['custom_modifier'].findall(modifiers_str)
                     modifiers.extend(modifier_matches)
                 
                 # Extract return types
                 returns = []
-                returns_match = re.search(r'returns\s*\(([^)]+)\)', modifiers_str)
+                returns_match = PARSER_REGEXES['returns'].search(modifiers_str, 0, modifiers_str.rfind(')') + 1)
                 if returns_match:
                     return_types = [r.strip() for r in returns_match.group(1).split(',')]
                     returns.extend(return_types)
@@ -152,29 +377,93 @@ class SolidityParser:
         
         return functions
     
-    def _extract_state_variables(self, contract_code: str) -> List[Dict[str, Any]]:
-        """Extract state variable information"""
+    def _match_signature(self, line: str) -> Optional[Tuple[str, str, str]]:
+        """(name, parameters, header text up to the brace) of the first function in a line that opens a body"""
+        parameters_end = NextDelimiter(line, PARSER_REGEXES['parameters_end'])
+        delimiters = NextDelimiter(line, PARSER_REGEXES['declaration_end'])
+        for match in PARSER_REGEXES['function_signature'].finditer(line):
+            close = parameters_end.find(match.end())
+            brace = delimiters.find(close + 1) if close != -1 else -1
+            if brace == -1:
+                return None
+            if line[brace] == '{':
+                return match.group(1), line[match.end():close], line[close + 1:brace]
+        return None
+    
+    def extract_state_variables(self, source: SourceBuffer, units: List[ContractUnit]) -> List[Dict[str, Any]]:
+        """Extract state variables declared directly in each contract or library body"""
         variables = []
-        lines = contract_code.split('\n')
-        
-        in_contract = False
-        brace_count = 0
+        # Comments and strings are blanked so braces in them do not shift the depth
+        lines = strip_comments_and_strings(source.text).split('\n')
         
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
-            
-            # Track if we're inside a contract
-            if re.search(r'contract\s+\w+', line_stripped):
-                in_contract = True
+        for unit in units:
+            if unit.kind == 'interface':
                 continue
             
-            if in_contract:
-                # Count braces to track scope
-                brace_count += line_stripped.count('{') - line_stripped.count('}')
+            depth = 0
+            for i in range(unit.start_line - 1, unit.end_line):
+                line_stripped = lines[i].strip()
+                
+                # Count braces to track scope; only the unit body itself is depth 1
+                outer_depth = depth
+                depth += line_stripped.count('{') - line_stripped.count('}')
+                if outer_depth != 1 or depth != 1 or not line_stripped:
+                    continue
                 
-                # Skip if we're inside a function (more than 1 level deep)
-                if brace_count > 1:
+                # Skip declarations that are not state variables
+                if PARSER_REGEXES['non_variable_declaration'].match(line_stripped):
                     continue
                 
-                # Skip comments and empty lines
-                if not line_stripped or line_stripped.startswith('//')
\ No newline at end of file
+                var_match = PARSER_REGEXES['state_variable_declaration'].match(line_stripped)
+                if var_match:
+                    qualifiers = var_match.group(2).split()
+                    visibility = next(
+                        (q for q in qualifiers if q in ('public', 'private', 'internal')),
+                        'internal'
+                    )
+                    variables.append({
+                        'name': var_match.group(3),
+                        'type': var_match.group(1),
+                        'visibility': visibility,
+                        'line_number': i + 1
+                    })
+        
+        return variables
+    
+    def _extract_events(self, source: SourceBuffer) -> List[Dict[str, Any]]:
+        """Extract event declarations"""
+        events = []
+        
+        # A declaration's parameters run to a ), so none starts after the last one
+        for match in self.contract_patterns['event_declaration'].finditer(source.text, 0, source.text.rfind(')') + 1):
+            events.append({
+                'name': match.group(1),
+                'line_number': source.line_of(match.start())
+            })
+        
+        return events
+    
+    def _extract_modifiers(self, source: SourceBuffer) -> List[Dict[str, Any]]:
+        """Extract modifier declarations"""
+        modifiers = []
+        
+        for match in self.contract_patterns['modifier_declaration'].finditer(source.text):
+            modifiers.append({
+                'name': match.group(1),
+                'line_number': source.line_of(match.start())
+            })
+        
+        return modifiers
+    
+    def _calculate_complexity(self, source: SourceBuffer, functions: List[Dict[str, Any]]) -> str:
+        """Estimate contract complexity from branching and function count"""
+        decision_points = len(PARSER_REGEXES['decision_point'].findall(source.text))
+        external_calls = len(PARSER_REGEXES['low_level_call'].findall(source.text))
+        
+        score = decision_points + len(functions) + external_calls * 2
+        
+        if score < 15:
+            return "Low"
+        elif score < 40:
+            return "Medium"
+        return "High"
@@ -0,0 +1,136 @@
+import re
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.models.schemas import StageTokenUsage, TokenUsageReport
+
+# Context window per model, in tokens. Prefixes match dated model versions.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4-1106-preview": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-3.5-turbo": 16385
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Chat format overhead: tokens around every message plus the reply primer
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMER_TOKENS = 3
+
+# Rough BPE approximation used when no tokenizer encoding can be loaded
+ESTIMATE_PATTERN = re.compile(r'\w{1,4}|[^\w\s]|\s+')
+
+@dataclass
+class TokenUsage:
+    """Tokens spent on AI calls by one analysis request, per stage"""
+    stages: Dict[str, StageTokenUsage] = field(default_factory=dict)
+    trimmed_prompts: int = 0
+    estimated: bool = False
+
+    def record(self, stage: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> None:
+        usage = self.stages.setdefault(stage, StageTokenUsage())
+        usage.calls += 1
+        usage.promptTokens += prompt_tokens
+        usage.completionTokens += completion_tokens
+        usage.cachedPromptTokens += cached_tokens
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(usage.promptTokens for usage in self.stages.values())
+
+    @property
+    def cached_prompt_tokens(self) -> int:
+        return sum(usage.cachedPromptTokens for usage in self.stages.values())
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(usage.completionTokens for usage in self.stages.values())
+
+    def report(self) -> TokenUsageReport:
+        return TokenUsageReport(
+            promptTokens=self.prompt_tokens,
+            completionTokens=self.completion_tokens,
+            totalTokens=self.prompt_tokens + self.completion_tokens,
+            cachedPromptTokens=self.cached_prompt_tokens,
+            trimmedPrompts=self.trimmed_prompts,
+            estimated=self.estimated,
+            stages=dict(self.stages)
+        )
+
+# Usage of the analysis running in the current task. Tasks spawned for fixes
+# or per-contract reviews copy the context and so record into the same object.
+current_token_usage: ContextVar[Optional[TokenUsage]] = ContextVar("current_token_usage", default=None)
+
+class TokenCounter:
+    """tiktoken-based token counting with memoized results for repeated text"""
+
+    def __init__(self, cache_size: int = 128, max_cached_length: int = 2_000_000):
+        self.cache_size = cache_size
+        self.max_cached_length = max_cached_length
+        self._encodings: Dict[str, Any] = {}
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def context_window(self, model: str) -> int:
+        """Context window of a model, matching dated versions by prefix"""
+        for name in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+            if model.startswith(name):
+                return MODEL_CONTEXT_WINDOWS[name]
+        return DEFAULT_CONTEXT_WINDOW
+
+    def is_exact(self, model: str) -> bool:
+        """Whether counts for this model come from its real tokenizer"""
+        return self._encoding(model) is not None
+
+    def count(self, text: str, model: str) -> int:
+        """
+        Tokens in a piece of text. Results are memoized, so static prompt
+        templates and a contract sent to several stages are tokenized once.
+        """
+        key = (model, text)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        encoding = self._encoding(model)
+        if encoding is not None:
+            tokens = len(encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = sum(1 for _ in ESTIMATE_PATTERN.finditer(text))
+
+        if len(text) <= self.max_cached_length:
+            with self._lock:
+                self._cache[key] = tokens
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict[str, str]], model: str) -> int:
+        """Prompt tokens of a chat request"""
+        return REPLY_PRIMER_TOKENS + sum(
+            TOKENS_PER_MESSAGE + self.count(message["content"], model) for message in messages
+        )
+
+    def _encoding(self, model: str):
+        """tiktoken encoding for a model, loaded on first use; None when unavailable"""
+        if model not in self._encodings:
+            try:
+                import tiktoken
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # Encodings are downloaded on first use and may be unreachable offline
+                print(f"Tokenizer unavailable for {model}, estimating token counts: {str(e)}")
+                encoding = None
+            self._encodings[model] = encoding
+        return self._encodings[model]
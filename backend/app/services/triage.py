@@ -0,0 +1,93 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from app.services.solidity_parser import SolidityParser
+from app.utils.source_buffer import SourceBuffer
+from app.utils.solidity_text import strip_comments_and_strings
+
+# Triage regexes compiled once at import so preforked workers share them copy-on-write
+TRIAGE_REGEXES = {
+    'value_call': re.compile(r'\.\s*(?:call|send|transfer)\s*[({]'),
+    'interface_call': re.compile(r'\b[A-Z]\w*\s*\(\s*[\w.\[\]]+\s*\)\s*\.\s*\w+\s*\('),
+    'delegatecall': re.compile(r'\.\s*delegatecall\b'),
+    'selfdestruct': re.compile(r'\b(?:selfdestruct|suicide)\s*\('),
+    'assembly': re.compile(r'\bassembly\s*(?:\(\s*"[^"]*"\s*\)\s*)?\{')
+}
+
+# Points per signal, and the most occurrences of each that add to the score
+SIGNAL_WEIGHTS = {
+    'payableFunctions': (2, 2),
+    'externalCalls': (2, 3),
+    'delegatecalls': (4, 1),
+    'selfdestructs': (3, 1),
+    'assemblyBlocks': (1, 2),
+    'stateChangingFunctions': (1, 4),
+    'highSeverityFindings': (3, 2)
+}
+COMPLEXITY_POINTS = {"Low": 0, "Medium": 1, "High": 2}
+
+ROUTE_PATTERN_ONLY = "pattern-only"
+ROUTE_LIGHT = "light"
+ROUTE_FULL = "full"
+
+@dataclass
+class TriageDecision:
+    """How much AI review a contract gets, and the signals that decided it"""
+    route: str
+    score: int
+    signals: Dict[str, int] = field(default_factory=dict)
+    model: Optional[str] = None  # Model for the AI review; None when it is skipped
+
+class TriageGate:
+    """Static risk triage that decides whether a contract is worth a full LLM review"""
+
+    def __init__(self, parser: Optional[SolidityParser] = None):
+        self.parser = parser or SolidityParser()
+        self.enabled = os.getenv("AI_TRIAGE", "true").lower() == "true"
+        # Scores below skip_below get a pattern-only report, below full_at a cheap-model pass
+        self.skip_below = int(os.getenv("AI_TRIAGE_SKIP_BELOW", "2"))
+        self.full_at = int(os.getenv("AI_TRIAGE_FULL_AT", "6"))
+        self.light_model = os.getenv("FALLBACK_AI_MODEL", "gpt-3.5-turbo")
+
+    def assess(self, analysis_code: SourceBuffer, complexity: str,
+               pattern_findings: Iterable[Mapping[str, Any]], full_model: str) -> TriageDecision:
+        """Score a contract from parser and detector signals and pick its review route"""
+        signals = self.signals(analysis_code, pattern_findings)
+
+        score = COMPLEXITY_POINTS.get(complexity, 0)
+        for name, (points, cap) in SIGNAL_WEIGHTS.items():
+            score += points * min(signals[name], cap)
+
+        if not self.enabled or score >= self.full_at:
+            return TriageDecision(ROUTE_FULL, score, signals, full_model)
+        if score < self.skip_below:
+            return TriageDecision(ROUTE_PATTERN_ONLY, score, signals)
+        return TriageDecision(ROUTE_LIGHT, score, signals, self.light_model)
+
+    def signals(self, analysis_code: SourceBuffer, pattern_findings: Iterable[Mapping[str, Any]]) -> Dict[str, int]:
+        """Counts of the features that make a contract worth an expensive review"""
+        stripped = strip_comments_and_strings(analysis_code.text)
+        units = self.parser.split_contracts(analysis_code)
+        spans = [span for span in self.parser.extract_function_spans(analysis_code, units) if span.has_body]
+
+        return {
+            'payableFunctions': sum(1 for span in spans if span.mutability == 'payable'),
+            'externalCalls': (
+                len(TRIAGE_REGEXES['value_call'].findall(stripped))
+                + len(TRIAGE_REGEXES['interface_call'].findall(stripped))
+            ),
+            'delegatecalls': len(TRIAGE_REGEXES['delegatecall'].findall(stripped)),
+            'selfdestructs': len(TRIAGE_REGEXES['selfdestruct'].findall(stripped)),
+            'assemblyBlocks': len(TRIAGE_REGEXES['assembly'].findall(stripped)),
+            'stateChangingFunctions': sum(
+                1 for span in spans
+                if span.visibility in ('public', 'external')
+                and span.mutability not in ('view', 'pure')
+                and span.name != 'constructor'
+            ),
+            'highSeverityFindings': sum(
+                1 for finding in pattern_findings if finding.get('severity') in ('CRITICAL', 'HIGH')
+            )
+        }
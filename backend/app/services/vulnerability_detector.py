@@ -1,9 +1,256 @@
+import os
 import re
+import time
+import bisect
 import hashlib
-from typing import List, Dict, Any, Optional
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, NamedTuple, Tuple, Union, Iterable, Iterator, TypeVar, Sequence, Collection
 from dataclasses import dataclass
 
 from app.models.schemas import VulnerabilityReport, VulnerabilityLocation
+from app.services.contract_index import ContractIndex
+from app.services.request_profiler import RuleStats
+from app.services.solidity_parser import SolidityParser
+from app.utils.source_buffer import SourceBuffer
+
+# Rule regexes compiled once at import so preforked workers share them copy-on-write.
+# Each one matches in time linear in the line: no nested or adjacent unbounded
+# repeats, and matches start only at word boundaries or fixed keywords.
+RULE_REGEXES = {
+    'arithmetic': re.compile(r'\b(\w+)\s*([\+\-\*\/])\s*=|\b\w+\s*([\+\-\*\/])\s*\w+'),
+    'length_loop': re.compile(r'for\s*\([^()]*\.length\)'),
+    'if_condition': re.compile(r'\bif\s*\('),
+    # A single '=', not part of ==, !=, <=, >= or =>
+    'assignment_operator': re.compile(r'(?<![=!<>])=(?![=>])')
+}
+
+# Every this many items a rule loop checks its CPU deadline
+BUDGET_CHECK_INTERVAL = 16
+
+# CPU deadline (thread time) of the rule running in this context, if budgeted
+_rule_deadline: ContextVar[Optional[float]] = ContextVar("_rule_deadline", default=None)
+
+T = TypeVar('T')
+
+class RuleBudgetExceeded(Exception):
+    """Raised inside a rule that ran past its CPU budget"""
+
+def within_budget(items: Iterable[T]) -> Iterator[T]:
+    """Yield items, aborting the running rule once its CPU deadline has passed"""
+    deadline = _rule_deadline.get()
+    if deadline is None:
+        yield from items
+        return
+    for count, item in enumerate(items):
+        if count % BUDGET_CHECK_INTERVAL == 0 and time.thread_time() > deadline:
+            raise RuleBudgetExceeded()
+        yield item
+
+@dataclass(frozen=True)
+class RuleMetadata:
+    """Static report text for a detector rule, shared by every finding of that rule"""
+    id_prefix: str
+    title: str  # Formatted with the finding's params, function, start and end
+    severity: str
+    type: str
+    description: str  # Formatted like title
+    impact: str
+    likelihood: str
+    risk_score: float
+    recommendation: str
+    cwe_id: Optional[str] = None
+    potential_loss: Optional[str] = None
+    references: Tuple[str, ...] = ()
+
+class RawFinding(NamedTuple):
+    """Compact detector hit; report text comes from RULES[rule_id] at materialization"""
+    rule_id: int
+    start_line: int
+    end_line: int
+    id_key: Any  # Line index or function name used for the stable finding id
+    function: Optional[str] = None
+    params: tuple = ()
+
+RULE_REENTRANCY = 0
+RULE_ACCESS_CONTROL_SENSITIVE = 1
+RULE_ACCESS_CONTROL = 2
+RULE_INTEGER_OVERFLOW = 3
+RULE_UNCHECKED_CALL = 4
+RULE_GAS_LIMIT = 5
+RULE_ASSIGNMENT_IN_CONDITION = 6
+RULE_CROSS_FUNCTION_REENTRANCY = 7
+RULE_DELEGATECALL_TO_INPUT = 8
+RULE_USER_CONTROLLED_CALL = 9
+RULE_ABORTED = 10
+RULE_LONG_LINES = 11
+
+# Rule scopes, for callers that re-run rules over part of a file: per-function
+# rules report inside the function they visit, line rules on the line they read,
+# and file rules depend on the whole file
+FUNCTION_RULES = ('reentrancy', 'access_control', 'unchecked_calls', 'tainted_call_targets')
+LINE_RULES = ('gas_issues', 'logic_errors')
+FILE_RULES = ('cross_function_reentrancy', 'integer_issues')
+
+# Function names that suggest privileged operations
+SENSITIVE_FUNCTION_NAMES = ('withdraw', 'transfer', 'mint', 'burn', 'admin', 'owner', 'pause')
+
+RULES = (
+    RuleMetadata(
+        id_prefix="REENTRANCY",
+        title="Reentrancy Vulnerability",
+        severity="CRITICAL",
+        type="Reentrancy",
+        description="State change on line {end} occurs after external call on line {start}, enabling reentrancy attacks",
+        impact="Attacker can recursively call function to drain contract funds",
+        likelihood="High if contract holds valuable assets",
+        risk_score=9.0,
+        recommendation="Move state changes before external calls or use reentrancy guard",
+        cwe_id="CWE-841",
+        potential_loss="Up to entire contract balance",
+        references=("https://consensys.github.io/smart-contract-best-practices/attacks/reentrancy/",)
+    ),
+    RuleMetadata(
+        id_prefix="ACCESS",
+        title="Missing Access Control in {function}()",
+        severity="HIGH",
+        type="Access Control",
+        description="Function {function}() is {0} but lacks proper access control",
+        impact="Unauthorized users can call sensitive functions",
+        likelihood="High - function is publicly accessible",
+        risk_score=8.0,
+        recommendation="Add require() statements or access control modifiers",
+        cwe_id="CWE-284",
+        references=("https://docs.openzeppelin.com/contracts/4.x/access-control",)
+    ),
+    RuleMetadata(
+        id_prefix="ACCESS",
+        title="Missing Access Control in {function}()",
+        severity="MEDIUM",
+        type="Access Control",
+        description="Function {function}() is {0} but lacks proper access control",
+        impact="Unauthorized users can call sensitive functions",
+        likelihood="High - function is publicly accessible",
+        risk_score=5.0,
+        recommendation="Add require() statements or access control modifiers",
+        cwe_id="CWE-284",
+        references=("https://docs.openzeppelin.com/contracts/4.x/access-control",)
+    ),
+    RuleMetadata(
+        id_prefix="OVERFLOW",
+        title="Potential Integer Overflow/Underflow",
+        severity="MEDIUM",
+        type="Integer Overflow",
+        description="Arithmetic operations without overflow protection detected",
+        impact="Integer overflow/underflow can cause unexpected behavior",
+        likelihood="Medium - depends on input validation",
+        risk_score=6.0,
+        recommendation="Use SafeMath library or upgrade to Solidity 0.8.0+",
+        cwe_id="CWE-190",
+        references=("https://docs.openzeppelin.com/contracts/4.x/utilities#math",)
+    ),
+    RuleMetadata(
+        id_prefix="UNCHECKED",
+        title="Unchecked External Call",
+        severity="MEDIUM",
+        type="Unchecked Calls",
+        description="External call return value is not verified",
+        impact="Failed external calls may go unnoticed",
+        likelihood="Medium - depends on external contract behavior",
+        risk_score=5.5,
+        recommendation="Check return value and handle failures appropriately",
+        cwe_id="CWE-252",
+        references=("https://consensys.github.io/smart-contract-best-practices/development-recommendations/general/external-calls/",)
+    ),
+    RuleMetadata(
+        id_prefix="GAS",
+        title="Gas Limit DoS Risk",
+        severity="MEDIUM",
+        type="Gas Issues",
+        description="Loop over dynamic array can cause gas limit issues",
+        impact="Function may become unusable due to gas limit",
+        likelihood="High if array grows large",
+        risk_score=6.5,
+        recommendation="Implement pagination or limit array size",
+        cwe_id="CWE-400",
+        references=("https://consensys.github.io/smart-contract-best-practices/attacks/denial-of-service/",)
+    ),
+    RuleMetadata(
+        id_prefix="LOGIC",
+        title="Assignment in Conditional",
+        severity="LOW",
+        type="Logic Error",
+        description="Assignment operator (=) used in conditional instead of comparison (==)",
+        impact="Logic error may cause unintended behavior",
+        likelihood="High if code executes this path",
+        risk_score=4.0,
+        recommendation="Use comparison operator (==) instead of assignment (=)",
+        cwe_id="CWE-480"
+    ),
+    RuleMetadata(
+        id_prefix="XREENTRANCY",
+        title="Cross-Function Reentrancy via {function}()",
+        severity="HIGH",
+        type="Reentrancy",
+        description="{function}() uses {1}, which {0}() only updates after making an external call; "
+                    "{function}() can be entered from that call while the state is stale",
+        impact="Attacker can re-enter through a second function and act on outdated balances or state",
+        likelihood="Medium - requires the external call to reach an attacker-controlled contract",
+        risk_score=7.5,
+        recommendation="Update state before external calls and apply one reentrancy guard to every function sharing that state",
+        cwe_id="CWE-841",
+        potential_loss="Up to entire contract balance",
+        references=("https://consensys.github.io/smart-contract-best-practices/attacks/reentrancy/",)
+    ),
+    RuleMetadata(
+        id_prefix="DELEGATECALL",
+        title="Delegatecall to User-Supplied Address in {function}()",
+        severity="CRITICAL",
+        type="Delegatecall",
+        description="{function}() delegatecalls an address derived from caller input ({0}), running arbitrary code with this contract's storage",
+        impact="Attacker can overwrite storage, take ownership or self-destruct the contract",
+        likelihood="High - any caller chooses the code that runs",
+        risk_score=9.5,
+        recommendation="Only delegatecall fixed or allowlisted implementation addresses, behind access control",
+        cwe_id="CWE-829",
+        potential_loss="Entire contract and its balance",
+        references=("https://swcregistry.io/docs/SWC-112",)
+    ),
+    RuleMetadata(
+        id_prefix="ARBCALL",
+        title="User-Controlled Call Target in {function}()",
+        severity="HIGH",
+        type="Arbitrary External Call",
+        description="{function}() makes a low-level {1} to an address derived from caller input ({0}) without validating it",
+        impact="Attacker can make the contract call arbitrary contracts, e.g. to spend its token approvals",
+        likelihood="Medium - depends on the calldata and value the caller controls",
+        risk_score=7.0,
+        recommendation="Validate call targets against an allowlist or restrict the function to trusted callers",
+        cwe_id="CWE-20",
+        references=("https://swcregistry.io/docs/SWC-107",)
+    ),
+    RuleMetadata(
+        id_prefix="ABORTED",
+        title="Pattern Rule Aborted: {0}",
+        severity="INFO",
+        type="Analysis Coverage",
+        description="The {0} rule used up its {1} ms CPU budget and was stopped; none of its findings are reported",
+        impact="Vulnerabilities this rule looks for may be missing from the report",
+        likelihood="Unknown - the rule did not finish",
+        risk_score=0.0,
+        recommendation="Review this contract manually, or raise DETECTOR_RULE_BUDGET_MS for trusted input"
+    ),
+    RuleMetadata(
+        id_prefix="LONGLINES",
+        title="Lines Too Long for Pattern Rules",
+        severity="INFO",
+        type="Analysis Coverage",
+        description="{0} line(s) longer than {1} characters, the first on line {start}, were skipped by the line-based rules",
+        impact="Overflow, gas and logic issues on those lines may be missing from the report",
+        likelihood="Unknown - the lines were not scanned",
+        risk_score=0.0,
+        recommendation="Scan the unflattened, formatted source, or raise DETECTOR_MAX_LINE_LENGTH"
+    )
+)
 
 @dataclass
 class VulnerabilityPattern:
@@ -20,26 +267,181 @@ class VulnerabilityDetector:
     """Pattern-based vulnerability detection for smart contracts"""
     
     def __init__(self):
+        self.parser = SolidityParser()
         self.patterns = self._initialize_patterns()
         self.gas_patterns = self._initialize_gas_patterns()
+        # CPU milliseconds each rule may spend per scan, and the longest line the line-based rules read
+        self.rule_budget_ms = int(os.getenv("DETECTOR_RULE_BUDGET_MS", "2000"))
+        self.max_line_length = int(os.getenv("DETECTOR_MAX_LINE_LENGTH", "4000"))
+        
+        # Rule checks in run order, named for profiling
+        self.rule_checks = (
+            ("reentrancy", self._detect_reentrancy),
+            ("cross_function_reentrancy", self._detect_cross_function_reentrancy),
+            ("access_control", self._detect_access_control),
+            ("integer_issues", self._detect_integer_issues),
+            ("unchecked_calls", self._detect_unchecked_calls),
+            ("tainted_call_targets", self._detect_tainted_call_targets),
+            ("gas_issues", self._detect_gas_issues),
+            ("logic_errors", self._detect_logic_errors)
+        )
     
-    def detect_vulnerabilities(self, contract_code: str, contract_info: Dict) -> List[VulnerabilityReport]:
+    def detect_vulnerabilities(self, contract_code: Union[str, SourceBuffer], contract_info: Dict) -> List[VulnerabilityReport]:
         """
         Main vulnerability detection function using pattern matching
         """
-        vulnerabilities = []
-        lines = contract_code.split('\n')
+        contract_name = self._contract_name(contract_info)
+        return self.materialize(self.scan(contract_code, contract_info), contract_name)
+    
+    def scan(self, contract_code: Union[str, SourceBuffer], contract_info: Dict,
+             line_offset: int = 0, rule_stats: Optional[RuleStats] = None) -> List[RawFinding]:
+        """
+        Run every rule and return compact raw findings without building reports.
+        line_offset shifts findings when scanning one unit cut out of a larger file.
+        When rule_stats is given, each rule's wall time and hit count are added to it.
+        Rules that overrun their CPU budget and lines too long to scan are
+        reported as INFO findings.
+        """
+        source = SourceBuffer.of(contract_code)
+        filename = self._contract_name(contract_info)
+        lines, vulnerabilities = self.guard_line_length(source.lines)
+        
+        # Run pattern-based detection; the index skips the same over-long lines as the rules
+        index_source = source.blank_long_lines(self.max_line_length)
+        if rule_stats is None:
+            index = ContractIndex(index_source, self.parser)
+        else:
+            started = time.perf_counter()
+            index = ContractIndex(index_source, self.parser)
+            stats = rule_stats.setdefault("contract_index", [0.0, 0, 0])
+            stats[0] += time.perf_counter() - started
+            stats[1] += 1
+        vulnerabilities.extend(self.run_rules(index, lines, filename, rule_stats))
         
-        # Run pattern-based detection
-        vulnerabilities.extend(self._detect_reentrancy(lines, contract_info.get('name', 'Unknown')))
-        vulnerabilities.extend(self._detect_access_control(lines, contract_info.get('name', 'Unknown')))
-        vulnerabilities.extend(self._detect_integer_issues(lines, contract_info.get('name', 'Unknown')))
-        vulnerabilities.extend(self._detect_unchecked_calls(lines, contract_info.get('name', 'Unknown')))
-        vulnerabilities.extend(self._detect_gas_issues(lines, contract_info.get('name', 'Unknown')))
-        vulnerabilities.extend(self._detect_logic_errors(lines, contract_info.get('name', 'Unknown')))
+        if line_offset:
+            # Line-keyed ids shift too, so they match a scan of the whole file
+            vulnerabilities = [
+                finding._replace(
+                    start_line=finding.start_line + line_offset,
+                    end_line=finding.end_line + line_offset,
+                    id_key=finding.id_key + line_offset if isinstance(finding.id_key, int) else finding.id_key
+                )
+                for finding in vulnerabilities
+            ]
         
         return vulnerabilities
     
+    def guard_line_length(self, lines: Sequence[str]) -> Tuple[Sequence[str], List[RawFinding]]:
+        """
+        Lines for the line-based rules, with over-long ones (minified or
+        flattened code) blanked, and the finding reporting them if there are any
+        """
+        if self.max_line_length <= 0:
+            return lines, []
+        long_lines = [i for i, line in enumerate(lines) if len(line) > self.max_line_length]
+        if not long_lines:
+            return lines, []
+        return (
+            ['' if len(line) > self.max_line_length else line for line in lines],
+            [RawFinding(RULE_LONG_LINES, long_lines[0] + 1, long_lines[0] + 1, 'long_lines', None,
+                        (len(long_lines), self.max_line_length))]
+        )
+    
+    def run_rules(self, index: ContractIndex, lines: Sequence[str], filename: str,
+                  rule_stats: Optional[RuleStats] = None,
+                  rules: Optional[Collection[str]] = None) -> List[RawFinding]:
+        """
+        Run the named rules (all by default) over a built index. Per-function
+        rules only visit index.targets when it is set.
+        """
+        vulnerabilities = []
+        for rule, check in self.rule_checks:
+            if rules is not None and rule not in rules:
+                continue
+            if rule_stats is None:
+                vulnerabilities.extend(self._run_rule(rule, check, lines, filename, index))
+                continue
+            started = time.perf_counter()
+            hits = self._run_rule(rule, check, lines, filename, index)
+            stats = rule_stats.setdefault(rule, [0.0, 0, 0])
+            stats[0] += time.perf_counter() - started
+            stats[1] += 1
+            stats[2] += len(hits)
+            vulnerabilities.extend(hits)
+        return vulnerabilities
+    
+    def _run_rule(self, rule: str, check, lines: Sequence[str], filename: str,
+                  index: ContractIndex) -> List[RawFinding]:
+        """Run one rule under its CPU budget; an overrun replaces the rule's hits with an abort finding"""
+        if self.rule_budget_ms <= 0:
+            return check(lines, filename, index)
+        
+        token = _rule_deadline.set(time.thread_time() + self.rule_budget_ms / 1000)
+        try:
+            return check(lines, filename, index)
+        except RuleBudgetExceeded:
+            print(f"Detector rule {rule} aborted: exceeded {self.rule_budget_ms} ms CPU budget on {filename}")
+            return [RawFinding(RULE_ABORTED, 1, 1, f'aborted_{rule}', None, (rule, self.rule_budget_ms))]
+        finally:
+            _rule_deadline.reset(token)
+    
+    def materialize(self, findings: List[RawFinding], filename: str) -> List[VulnerabilityReport]:
+        """
+        Build response models from raw findings. Field values come from trusted
+        rule metadata, so pydantic validation is skipped.
+        """
+        return self.build_reports(self.serialize(findings, filename))
+    
+    def build_reports(self, serialized: List[Dict[str, Any]]) -> List[VulnerabilityReport]:
+        """Build response models from dicts produced by serialize()"""
+        reports = []
+        for data in serialized:
+            data = dict(data, location=VulnerabilityLocation.model_construct(**data['location']))
+            reports.append(VulnerabilityReport.model_construct(**data))
+        return reports
+    
+    def serialize(self, findings: List[RawFinding], filename: str) -> List[Dict[str, Any]]:
+        """Serialize raw findings straight to report-shaped dicts"""
+        serialized = []
+        for finding in findings:
+            rule = RULES[finding.rule_id]
+            fields = {
+                'function': finding.function,
+                'start': finding.start_line,
+                'end': finding.end_line
+            }
+            key = f'{filename}_{finding.id_key}'
+            serialized.append({
+                'id': f"{rule.id_prefix}_{hashlib.md5(key.encode()).hexdigest()[:8]}",
+                'title': rule.title.format(*finding.params, **fields),
+                'severity': rule.severity,
+                'type': rule.type,
+                'description': rule.description.format(*finding.params, **fields),
+                'location': {
+                    'file': filename,
+                    'startLine': finding.start_line,
+                    'endLine': finding.end_line,
+                    'function': finding.function
+                },
+                'impact': rule.impact,
+                'likelihood': rule.likelihood,
+                'riskScore': rule.risk_score,
+                'cweId': rule.cwe_id,
+                'recommendation': rule.recommendation,
+                'detectionMethod': "Pattern Matching",
+                'detectionMethods': [],
+                'potentialLoss': rule.potential_loss,
+                'suggestedFix': None,
+                'references': list(rule.references)
+            })
+        return serialized
+    
+    def _contract_name(self, contract_info: Any) -> str:
+        """Accept either the parser's ContractInfo model or a plain dict"""
+        if hasattr(contract_info, 'name'):
+            return contract_info.name
+        return contract_info.get('name', 'Unknown')
+    
     def _initialize_patterns(self) -> List[VulnerabilityPattern]:
         """Initialize vulnerability detection patterns"""
         return [
@@ -56,7 +458,7 @@ class VulnerabilityDetector:
                 name="Missing Access Control",
                 type="Access Control",
                 severity="HIGH",
-                pattern=r"function\s+\w+.*\)\s+(?:external|public)(?!.*(?:onlyOwner|require|modifier))",
+                pattern=r"function\s+\w+\s*\([^)]*\)[^{;]*\b(?:external|public)\b(?![^{;]*\b(?:onlyOwner|require|modifier)\b)",
                 description="Public/external functions lack access control",
                 recommendation="Add appropriate access control modifiers",
                 cwe_id="CWE-284"
@@ -104,127 +506,85 @@ class VulnerabilityDetector:
             )
         ]
     
-    def _detect_reentrancy(self, lines: List[str], filename: str) -> List[VulnerabilityReport]:
-        """Detect reentrancy vulnerabilities"""
+    def _detect_reentrancy(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
+        """Detect state written after a value transfer, once per function"""
         vulnerabilities = []
-        current_function = None
-        has_external_call = False
-        external_call_line = 0
-        state_change_after_call = False
         
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
-            
-            # Track current function
-            if re.match(r'function\s+\w+', line_stripped):
-                current_function = re.search(r'function\s+(\w+)', line_stripped)
-                current_function = current_function.group(1) if current_function else "unknown"
-                has_external_call = False
-                state_change_after_call = False
-                external_call_line = 0
-            
-            # Check for external calls
-            if re.search(r'\.call\{value:|\.send\(|\.transfer\(', line_stripped):
-                has_external_call = True
-                external_call_line = i + 1
-            
-            # Check for state changes after external call
-            if has_external_call and re.search(r'\w+\s*[\+\-\*\/]?=|\w+\[.*\]\s*=', line_stripped):
-                state_change_after_call = True
-                
-                # Found potential reentrancy
-                vulnerability = VulnerabilityReport(
-                    id=f"REENTRANCY_{hashlib.md5(f'{filename}_{i}'.encode()).hexdigest()[:8]}",
-                    title="Reentrancy Vulnerability",
-                    severity="CRITICAL",
-                    type="Reentrancy",
-                    description=f"State change on line {i+1} occurs after external call on line {external_call_line}, enabling reentrancy attacks",
-                    location=VulnerabilityLocation(
-                        file=filename,
-                        startLine=external_call_line,
-                        endLine=i + 1,
-                        function=current_function
-                    ),
-                    impact="Attacker can recursively call function to drain contract funds",
-                    likelihood="High if contract holds valuable assets",
-                    riskScore=9.0,
-                    recommendation="Move state changes before external calls or use reentrancy guard",
-                    detectionMethod="Pattern Matching",
-                    potentialLoss="Up to entire contract balance",
-                    cweId="CWE-841",
-                    references=["https://consensys.github.io/smart-contract-best-practices/attacks/reentrancy/"]
+        for i, node in within_budget(index.target_functions()):
+            if index.is_reentrancy_guarded(node):
+                continue
+            stale = index.stale_writes(i)
+            if stale:
+                transfer_line, write_line, _ = stale
+                vulnerabilities.append(
+                    RawFinding(RULE_REENTRANCY, transfer_line, write_line, write_line - 1, node.span.name)
                 )
-                vulnerabilities.append(vulnerability)
-                break  # Only report once per function
         
         return vulnerabilities
     
-    def _detect_access_control(self, lines: List[str], filename: str) -> List[VulnerabilityReport]:
-        """Detect access control issues"""
+    def _detect_cross_function_reentrancy(self, lines: List[str], filename: str,
+                                          index: ContractIndex) -> List[RawFinding]:
+        """Detect entry points that touch state another function leaves stale across a value transfer"""
         vulnerabilities = []
+        reported = 0
         
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
+        for i, node in enumerate(within_budget(index.functions)):
+            if index.is_reentrancy_guarded(node):
+                continue
+            stale = index.stale_writes(i)
+            if not stale:
+                continue
+            stale_mask = stale[2]
             
-            # Check for public/external functions without access control
-            func_match = re.search(r'function\s+(\w+).*\)\s+(external|public)', line_stripped)
-            if func_match:
-                function_name = func_match.group(1)
-                visibility = func_match.group(2)
-                
-                # Skip view/pure functions and constructors
-                if 'view' in line_stripped or 'pure' in line_stripped or function_name == 'constructor':
+            # Other entry points of the same contract not reported yet
+            candidates = index.contract_functions[node.span.contract] & index.entry_points & ~(1 << i) & ~reported
+            for j in within_budget(index.bits(candidates)):
+                other = index.functions[j]
+                if (other.span.mutability in ('view', 'pure') or index.is_reentrancy_guarded(other)
+                        or index.is_access_controlled(j)):
                     continue
-                
-                # Look ahead for access control in next few lines
-                has_access_control = False
-                check_lines = min(5, len(lines) - i - 1)
-                
-                for j in range(1, check_lines + 1):
-                    next_line = lines[i + j].strip()
-                    if re.search(r'require\s*\(.*msg\.sender|onlyOwner|modifier\s+\w+', next_line):
-                        has_access_control = True
-                        break
-                    if next_line.startswith('function') or next_line == '}':
-                        break
-                
-                # Check if function performs sensitive operations
-                is_sensitive = any(sensitive in function_name.lower() 
-                                 for sensitive in ['withdraw', 'transfer', 'mint', 'burn', 'admin', 'owner', 'pause'])
-                
-                if not has_access_control and (is_sensitive or visibility == 'external'):
-                    severity = "HIGH" if is_sensitive else "MEDIUM"
-                    risk_score = 8.0 if is_sensitive else 5.0
-                    
-                    vulnerability = VulnerabilityReport(
-                        id=f"ACCESS_{hashlib.md5(f'{filename}_{function_name}'.encode()).hexdigest()[:8]}",
-                        title=f"Missing Access Control in {function_name}()",
-                        severity=severity,
-                        type="Access Control",
-                        description=f"Function {function_name}() is {visibility} but lacks proper access control",
-                        location=VulnerabilityLocation(
-                            file=filename,
-                            startLine=i + 1,
-                            endLine=i + 1,
-                            function=function_name
-                        ),
-                        impact="Unauthorized users can call sensitive functions",
-                        likelihood="High - function is publicly accessible",
-                        riskScore=risk_score,
-                        recommendation="Add require() statements or access control modifiers",
-                        detectionMethod="Pattern Matching",
-                        cweId="CWE-284",
-                        references=["https://docs.openzeppelin.com/contracts/4.x/access-control"]
-                    )
-                    vulnerabilities.append(vulnerability)
+                shared = (index.total_reads[j] | index.total_writes[j]) & stale_mask
+                if shared:
+                    reported |= 1 << j
+                    variables = ', '.join(index.variable_names(shared))
+                    vulnerabilities.append(RawFinding(
+                        RULE_CROSS_FUNCTION_REENTRANCY, other.span.start_line, other.span.start_line,
+                        other.span.start_line - 1, other.span.name, (node.span.name, variables)
+                    ))
+        
+        return vulnerabilities
+    
+    def _detect_access_control(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
+        """Detect public/external state-changing functions without access control"""
+        vulnerabilities = []
+        
+        for i, node in within_budget(index.target_functions()):
+            span = node.span
+            # Skip internal functions, view/pure functions, constructors, fallback and receive
+            if (not node.is_entry_point or span.mutability in ('view', 'pure')
+                    or span.name in ('constructor', 'fallback', 'receive')):
+                continue
+            
+            # Modifiers, sender checks anywhere in the body and in internal callees all count
+            if index.is_access_controlled(i):
+                continue
+            
+            # Check if function performs sensitive operations
+            is_sensitive = any(sensitive in span.name.lower() for sensitive in SENSITIVE_FUNCTION_NAMES)
+            
+            if is_sensitive or span.visibility == 'external':
+                rule_id = RULE_ACCESS_CONTROL_SENSITIVE if is_sensitive else RULE_ACCESS_CONTROL
+                vulnerabilities.append(
+                    RawFinding(rule_id, span.start_line, span.start_line, span.name, span.name, (span.visibility,))
+                )
         
         return vulnerabilities
     
-    def _detect_integer_issues(self, lines: List[str], filename: str) -> List[VulnerabilityReport]:
+    def _detect_integer_issues(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
         """Detect integer overflow/underflow issues"""
         vulnerabilities = []
         
-        for i, line in enumerate(lines):
+        for i, line in enumerate(within_budget(lines)):
             line_stripped = line.strip()
             
             # Skip if SafeMath is used or Solidity 0.8.0+
@@ -232,143 +592,95 @@ class VulnerabilityDetector:
                 continue
             
             # Check for arithmetic operations
-            arithmetic_ops = re.findall(r'(\w+)\s*([\+\-\*\/])\s*=|\w+\s*([\+\-\*\/])\s*\w+', line_stripped)
+            arithmetic_ops = RULE_REGEXES['arithmetic'].findall(line_stripped)
             
             if arithmetic_ops:
-                vulnerability = VulnerabilityReport(
-                    id=f"OVERFLOW_{hashlib.md5(f'{filename}_{i}'.encode()).hexdigest()[:8]}",
-                    title="Potential Integer Overflow/Underflow",
-                    severity="MEDIUM",
-                    type="Integer Overflow",
-                    description="Arithmetic operations without overflow protection detected",
-                    location=VulnerabilityLocation(
-                        file=filename,
-                        startLine=i + 1,
-                        endLine=i + 1
-                    ),
-                    impact="Integer overflow/underflow can cause unexpected behavior",
-                    likelihood="Medium - depends on input validation",
-                    riskScore=6.0,
-                    recommendation="Use SafeMath library or upgrade to Solidity 0.8.0+",
-                    detectionMethod="Pattern Matching",
-                    cweId="CWE-190",
-                    references=["https://docs.openzeppelin.com/contracts/4.x/utilities#math"]
-                )
-                vulnerabilities.append(vulnerability)
+                vulnerabilities.append(RawFinding(RULE_INTEGER_OVERFLOW, i + 1, i + 1, i))
                 break  # Only report once per contract
         
         return vulnerabilities
     
-    def _detect_unchecked_calls(self, lines: List[str], filename: str) -> List[VulnerabilityReport]:
-        """Detect unchecked external calls"""
+    def _detect_unchecked_calls(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
+        """Detect low-level calls whose success flag is ignored on some path"""
         vulnerabilities = []
         
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
-            
-            # Check for external calls
-            call_match = re.search(r'\.call\(|\.delegatecall\(|\.staticcall\(', line_stripped)
-            if call_match:
-                # Check if return value is handled
-                is_checked = False
-                
-                # Check current line for return value handling
-                if re.search(r'require\s*\(.*\.call|bool\s+\w+\s*=.*\.call|\(bool\s+\w+,', line_stripped):
-                    is_checked = True
-                
-                # Check next few lines for require() or if() statements
-                if not is_checked:
-                    check_lines = min(3, len(lines) - i - 1)
-                    for j in range(1, check_lines + 1):
-                        next_line = lines[i + j].strip()
-                        if re.search(r'require\s*\(|if\s*\(', next_line):
-                            is_checked = True
-                            break
-                
-                if not is_checked:
-                    vulnerability = VulnerabilityReport(
-                        id=f"UNCHECKED_{hashlib.md5(f'{filename}_{i}'.encode()).hexdigest()[:8]}",
-                        title="Unchecked External Call",
-                        severity="MEDIUM",
-                        type="Unchecked Calls",
-                        description="External call return value is not verified",
-                        location=VulnerabilityLocation(
-                            file=filename,
-                            startLine=i + 1,
-                            endLine=i + 1
-                        ),
-                        impact="Failed external calls may go unnoticed",
-                        likelihood="Medium - depends on external contract behavior",
-                        riskScore=5.5,
-                        recommendation="Check return value and handle failures appropriately",
-                        detectionMethod="Pattern Matching",
-                        cweId="CWE-252",
-                        references=["https://consensys.github.io/smart-contract-best-practices/development-recommendations/general/external-calls/"]
-                    )
-                    vulnerabilities.append(vulnerability)
+        for i, node in within_budget(index.target_functions()):
+            if not node.low_level_calls:
+                continue
+            for call in index.dataflow(i).unchecked_calls():
+                vulnerabilities.append(RawFinding(RULE_UNCHECKED_CALL, call.line, call.line, call.line - 1))
+        
+        return vulnerabilities
+    
+    def _detect_tainted_call_targets(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
+        """Detect low-level calls and delegatecalls to addresses taken from caller input"""
+        vulnerabilities = []
+        
+        for i, node in within_budget(index.target_functions()):
+            # Only entry points have caller-supplied parameters; trusted callers may pick targets
+            if not node.low_level_calls or not node.is_entry_point or index.is_access_controlled(i):
+                continue
+            for call, names in index.dataflow(i).tainted_receivers():
+                rule_id = RULE_DELEGATECALL_TO_INPUT if call.kind == 'delegatecall' else RULE_USER_CONTROLLED_CALL
+                vulnerabilities.append(RawFinding(
+                    rule_id, call.line, call.line, call.line - 1, node.span.name, (', '.join(names), call.kind)
+                ))
         
         return vulnerabilities
     
-    def _detect_gas_issues(self, lines: List[str], filename: str) -> List[VulnerabilityReport]:
+    def _detect_gas_issues(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
         """Detect gas-related issues"""
         vulnerabilities = []
         
-        for i, line in enumerate(lines):
+        for i, line in enumerate(within_budget(lines)):
             line_stripped = line.strip()
             
             # Check for loops over dynamic arrays
-            loop_match = re.search(r'for\s*\([^)]*\.length\)', line_stripped)
+            loop_match = RULE_REGEXES['length_loop'].search(line_stripped)
             if loop_match:
-                vulnerability = VulnerabilityReport(
-                    id=f"GAS_{hashlib.md5(f'{filename}_{i}'.encode()).hexdigest()[:8]}",
-                    title="Gas Limit DoS Risk",
-                    severity="MEDIUM",
-                    type="Gas Issues",
-                    description="Loop over dynamic array can cause gas limit issues",
-                    location=VulnerabilityLocation(
-                        file=filename,
-                        startLine=i + 1,
-                        endLine=i + 1
-                    ),
-                    impact="Function may become unusable due to gas limit",
-                    likelihood="High if array grows large",
-                    riskScore=6.5,
-                    recommendation="Implement pagination or limit array size",
-                    detectionMethod="Pattern Matching",
-                    cweId="CWE-400",
-                    references=["https://consensys.github.io/smart-contract-best-practices/attacks/denial-of-service/"]
-                )
-                vulnerabilities.append(vulnerability)
+                vulnerabilities.append(RawFinding(RULE_GAS_LIMIT, i + 1, i + 1, i))
         
         return vulnerabilities
     
-    def _detect_logic_errors(self, lines: List[str], filename: str) -> List[VulnerabilityReport]:
+    def _detect_logic_errors(self, lines: List[str], filename: str, index: ContractIndex) -> List[RawFinding]:
         """Detect common logic errors"""
         vulnerabilities = []
         
-        for i, line in enumerate(lines):
+        for i, line in enumerate(within_budget(lines)):
             line_stripped = line.strip()
             
             # Check for assignment in conditions (common mistake)
-            if re.search(r'if\s*\([^)]*=(?!=)[^)]*\)', line_stripped):
-                vulnerability = VulnerabilityReport(
-                    id=f"LOGIC_{hashlib.md5(f'{filename}_{i}'.encode()).hexdigest()[:8]}",
-                    title="Assignment in Conditional",
-                    severity="LOW",
-                    type="Logic Error",
-                    description="Assignment operator (=) used in conditional instead of comparison (==)",
-                    location=VulnerabilityLocation(
-                        file=filename,
-                        startLine=i + 1,
-                        endLine=i + 1
-                    ),
-                    impact="Logic error may cause unintended behavior",
-                    likelihood="High if code executes this path",
-                    riskScore=4.0,
-                    recommendation="Use comparison operator (==) instead of assignment (=)",
-                    detectionMethod="Pattern Matching",
-                    cweId="CWE-480"
-                )
-                vulnerabilities.append(vulnerability)
+            if self._assignment_in_condition(line_stripped):
+                vulnerabilities.append(RawFinding(RULE_ASSIGNMENT_IN_CONDITION, i + 1, i + 1, i))
         
-        return vulnerabilities
\ No newline at end of file
+        return vulnerabilities
+    
+    def _assignment_in_condition(self, line: str) -> bool:
+        """
+        Whether an if (...) condition on the line contains a single '='. Parentheses
+        are matched in one pass, so nested calls in a condition are handled and
+        the check stays linear however many conditions a minified line holds.
+        """
+        openings = [match.end() - 1 for match in RULE_REGEXES['if_condition'].finditer(line)]
+        if not openings:
+            return False
+        assignments = [match.start() for match in RULE_REGEXES['assignment_operator'].finditer(line)]
+        if not assignments:
+            return False
+        
+        closing = {}
+        stack = []
+        for position, char in enumerate(line):
+            if char == '(':
+                stack.append(position)
+            elif char == ')' and stack:
+                closing[stack.pop()] = position
+        
+        for opening in openings:
+            end = closing.get(opening)
+            if end is None:
+                continue
+            first = bisect.bisect_left(assignments, opening)
+            if first < len(assignments) and assignments[first] < end:
+                return True
+        return False
@@ -3,6 +3,13 @@
 Utility functions and helpers
 """
 
-# Add utility functions here as needed
+from .interval_tree import IntervalTree
+from .json_stream import IncrementalJSONParser, parse_json_object
+from .source_buffer import SourceBuffer
 
-__all__ = []
\ No newline at end of file
+__all__ = [
+    "IntervalTree",
+    "IncrementalJSONParser",
+    "parse_json_object",
+    "SourceBuffer"
+]
\ No newline at end of file
@@ -0,0 +1,5 @@
+import hashlib
+
+def compute_contract_hash(contract_code: str) -> str:
+    """Stable content hash used to identify a contract across analyses"""
+    return hashlib.sha256(contract_code.encode('utf-8')).hexdigest()
@@ -0,0 +1,63 @@
+from typing import Any, Generic, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class IntervalTree(Generic[T]):
+    """Static interval tree over closed integer intervals
+
+    Intervals are sorted by start and laid out as an implicit balanced
+    tree over that array, with each subtree augmented by its maximum end.
+    Building is O(n log n) and an overlap query is O(log n + k).
+    """
+
+    def __init__(self, intervals: Sequence[Tuple[int, int, T]]):
+        ordered = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self._starts: List[int] = [item[0] for item in ordered]
+        self._ends: List[int] = [item[1] for item in ordered]
+        self._payloads: List[T] = [item[2] for item in ordered]
+        self._max_end: List[int] = [0] * len(ordered)
+        if ordered:
+            self._build(0, len(ordered))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def _build(self, lo: int, hi: int) -> int:
+        """Fill subtree max-end values for the range [lo, hi)"""
+        mid = (lo + hi) // 2
+        max_end = self._ends[mid]
+        if lo < mid:
+            max_end = max(max_end, self._build(lo, mid))
+        if mid + 1 < hi:
+            max_end = max(max_end, self._build(mid + 1, hi))
+        self._max_end[mid] = max_end
+        return max_end
+
+    def overlapping(self, start: int, end: int) -> List[T]:
+        """Return payloads of every interval overlapping [start, end]"""
+        results: List[T] = []
+        if not self._starts:
+            return results
+
+        stack = [(0, len(self._starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            # Nothing in this subtree reaches the query
+            if self._max_end[mid] < start:
+                continue
+
+            stack.append((lo, mid))
+            if self._starts[mid] <= end:
+                if self._ends[mid] >= start:
+                    results.append(self._payloads[mid])
+                # Right subtree starts are >= this start, so only descend if they can still overlap
+                stack.append((mid + 1, hi))
+
+        return results
+
+    def items(self) -> List[Tuple[int, int, Any]]:
+        """Return all intervals in start order"""
+        return list(zip(self._starts, self._ends, self._payloads))
@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, List, Optional
+
+class IncrementalJSONParser:
+    """Incremental parser for a model's JSON object response
+
+    Chunks are fed as they stream in. Every object inside the top-level
+    array named by item_key is decoded as soon as its closing brace arrives,
+    so callers can act on it before the response is complete. Text before
+    the first brace (prose, code fences) and after the object closes is
+    ignored, and a truncated response keeps every item finished before the cut.
+    """
+
+    def __init__(self, item_key: str = "vulnerabilities"):
+        self.item_key = item_key
+        self.items: List[Dict[str, Any]] = []
+        self.complete = False
+
+        self._buffer: List[str] = []
+        self._length = 0
+        self._object_start: Optional[int] = None
+        # Open containers, '{' or '['; the top-level object is _stack[0]
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return the items it completed"""
+        completed: List[Dict[str, Any]] = []
+        if self.complete or not chunk:
+            return completed
+
+        base = self._length
+        self._buffer.append(chunk)
+        self._length += len(chunk)
+        text = None
+
+        for i, char in enumerate(chunk):
+            position = base + i
+
+            if self._object_start is None:
+                if char == '{':
+                    self._object_start = position
+                    self._stack.append('{')
+                    self._expect_key = True
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key:
+                        text = text or ''.join(self._buffer)
+                        self._key = self._decode(text[self._string_start:position + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char in '{[':
+                self._stack.append(char)
+                if char == '{' and self._in_item_array(len(self._stack) - 1):
+                    self._item_start = position
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == '}' and self._item_start is not None and self._in_item_array(len(self._stack)):
+                    text = text or ''.join(self._buffer)
+                    item = self._decode(text[self._item_start:position + 1])
+                    self._item_start = None
+                    if isinstance(item, dict):
+                        self.items.append(item)
+                        completed.append(item)
+                if not self._stack:
+                    self.complete = True
+                    self._buffer = [''.join(self._buffer)[self._object_start:position + 1]]
+                    break
+            elif len(self._stack) == 1:
+                if char == ':':
+                    self._expect_key = False
+                elif char == ',':
+                    self._expect_key = True
+
+        return completed
+
+    def result(self) -> Dict[str, Any]:
+        """
+        The whole object once it has closed and decodes cleanly; otherwise the
+        items completed so far under item_key
+        """
+        if self.complete:
+            data = self._decode(self._buffer[0])
+            if isinstance(data, dict):
+                return data
+        return {self.item_key: list(self.items)}
+
+    def _in_item_array(self, depth: int) -> bool:
+        """Whether the container at this stack depth is the item array"""
+        return depth == 2 and self._stack[1] == '[' and self._key == self.item_key
+
+    def _decode(self, text: str) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+def parse_json_object(text: str, item_key: str = "vulnerabilities") -> Dict[str, Any]:
+    """Parse a complete response with IncrementalJSONParser"""
+    parser = IncrementalJSONParser(item_key)
+    parser.feed(text or "")
+    return parser.result()
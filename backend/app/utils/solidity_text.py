@@ -0,0 +1,156 @@
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Starts of comments and string literals. Each literal's end is found by a scan
+# that never passes it twice, rather than one alternation whose lazy /*.*?\*/
+# rescans to the end of the text for every unclosed /*.
+LITERAL_START = re.compile(r'//|/\*|["\']')
+# String body up to (not including) the closing quote; an escape may continue it past a newline
+STRING_BODY = {
+    quote: re.compile(r'(?:\\.|[^%s\\\n])*' % quote, re.DOTALL)
+    for quote in '"\''
+}
+
+def literal_spans(text: str, open_comment_closes: Optional[Callable[[], bool]] = None
+                  ) -> Iterator[Tuple[int, int, bool]]:
+    """
+    (start, end, is_string) of each comment and string literal of text, in one
+    left-to-right pass. A /* with no */ after it is code, unless
+    open_comment_closes() says it is closed past the end of text; then the
+    comment runs to the end.
+    """
+    last_close = text.rfind('*/')
+    # Per quote, the end of the last failed string scan: a quote before it was
+    # escaped in that scan, so a string opened there fails the same way
+    failed_until = {'"': -1, "'": -1}
+    open_closes: Optional[bool] = None
+    position = 0
+    while True:
+        match = LITERAL_START.search(text, position)
+        if not match:
+            return
+        start = match.start()
+        token = match.group()
+
+        if token == '//':
+            end = text.find('\n', start)
+            end = len(text) if end == -1 else end
+            yield start, end, False
+            position = end
+        elif token == '/*':
+            if start + 2 <= last_close:
+                end = text.find('*/', start + 2) + 2
+                yield start, end, False
+                position = end
+                continue
+            if open_closes is None:
+                open_closes = open_comment_closes is not None and open_comment_closes()
+            if open_closes:
+                yield start, len(text), False
+                return
+            # Never closed: not a comment, so scanning resumes at the '*'
+            position = start + 1
+        else:
+            if start < failed_until[token]:
+                position = start + 1
+                continue
+            end = STRING_BODY[token].match(text, start + 1).end()
+            if end < len(text) and text[end] == token:
+                yield start, end + 1, True
+                position = end + 1
+            else:
+                failed_until[token] = end
+                position = start + 1
+
+def strip_comments_and_strings(contract_code: str) -> str:
+    """Blank comments and string contents while keeping offsets and newlines"""
+    parts = []
+    position = 0
+    for start, end, is_string in literal_spans(contract_code):
+        parts.append(contract_code[position:start])
+        if is_string:
+            parts.append(contract_code[start] + ' ' * (end - start - 2) + contract_code[end - 1])
+        else:
+            parts.append(re.sub(r'[^\n]', ' ', contract_code[start:end]))
+        position = end
+    parts.append(contract_code[position:])
+    return ''.join(parts)
+
+def strip_line(line: str, in_comment: bool, closes_later: Callable[[], bool]) -> Tuple[str, bool]:
+    """
+    Blank the comments and string contents of one line, like
+    strip_comments_and_strings does for a whole file. in_comment says whether
+    the line starts inside a block comment; returns the stripped line and
+    whether the next line does. closes_later reports whether a block comment
+    left open on this line is closed on a later one (otherwise its /* is code).
+    """
+    prefix = ''
+    if in_comment:
+        close = line.find('*/')
+        if close == -1:
+            return ' ' * len(line), True
+        prefix = ' ' * (close + 2)
+        line = line[close + 2:]
+
+    parts = [prefix]
+    position = 0
+    open_comment = False
+    for start, end, is_string in literal_spans(line, closes_later):
+        parts.append(line[position:start])
+        if is_string:
+            parts.append(line[start] + ' ' * (end - start - 2) + line[end - 1])
+        else:
+            parts.append(' ' * (end - start))
+            open_comment = line.startswith('/*', start) and line.find('*/', start + 2) == -1
+        position = end
+    parts.append(line[position:])
+    return ''.join(parts), open_comment
+
+def strip_comments(contract_code: str) -> str:
+    """Remove comments, keeping string literals and every newline so line numbers hold"""
+    parts = []
+    position = 0
+    for start, end, is_string in literal_spans(contract_code):
+        if is_string:
+            continue
+        parts.append(contract_code[position:start])
+        parts.append('\n' * contract_code.count('\n', start, end))
+        position = end
+    parts.append(contract_code[position:])
+    return ''.join(parts)
+
+class NextDelimiter:
+    """
+    Offset of the first delimiter at or after a position. Lookups from
+    increasing positions before the same delimiter share one forward scan, so
+    matching a header regex's tail this way stays linear where a tail like
+    [^{;]*\\{ would rescan it from every failed header.
+    """
+
+    def __init__(self, text: str, pattern: "re.Pattern[str]", endpos: Optional[int] = None):
+        self.text = text
+        self.pattern = pattern
+        self.endpos = len(text) if endpos is None else endpos
+        self._searched_from: Optional[int] = None
+        self._found = -1
+
+    def find(self, position: int) -> int:
+        """Offset of the next delimiter, or -1 if there is none"""
+        if self._searched_from is not None and self._searched_from <= position \
+                and (self._found == -1 or position <= self._found):
+            return self._found
+        match = self.pattern.search(self.text, position, self.endpos)
+        self._searched_from = position
+        self._found = match.start() if match else -1
+        return self._found
+
+def match_braces(stripped: str) -> Dict[int, int]:
+    """Map each opening brace offset to its closing brace offset"""
+    closing: Dict[int, int] = {}
+    stack: List[int] = []
+    for match in re.finditer(r'[{}]', stripped):
+        if match.group() == '{':
+            stack.append(match.start())
+        elif stack:
+            closing[stack.pop()] = match.start()
+    return closing
@@ -0,0 +1,98 @@
+import bisect
+from array import array
+from typing import Optional, Tuple, Union
+
+from app.utils.helpers import compute_contract_hash
+
+class SourceBuffer:
+    """Immutable contract source with a line-start offset table
+
+    Built once per request and passed through parsing, detection, prompt
+    building and location mapping so the text is decoded and split once.
+    Offsets are 0-based; line numbers are 1-based like finding locations.
+    """
+
+    __slots__ = ("text", "filename", "_line_starts", "_lines", "_hash")
+
+    def __init__(self, text: str, filename: Optional[str] = None):
+        self.text = text
+        self.filename = filename
+        self._lines: Optional[Tuple[str, ...]] = None
+        self._hash: Optional[str] = None
+
+        starts = array('Q', [0])
+        position = text.find('\n')
+        while position != -1:
+            starts.append(position + 1)
+            position = text.find('\n', position + 1)
+        self._line_starts = starts
+
+    @classmethod
+    def of(cls, source: Union[str, "SourceBuffer"], filename: Optional[str] = None) -> "SourceBuffer":
+        """Wrap raw text, or return an existing buffer unchanged"""
+        if isinstance(source, cls):
+            return source
+        return cls(source, filename)
+
+    @classmethod
+    def from_bytes(cls, content: bytes, filename: Optional[str] = None) -> "SourceBuffer":
+        """Decode an uploaded file"""
+        return cls(content.decode('utf-8'), filename)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @property
+    def line_count(self) -> int:
+        return len(self._line_starts)
+
+    @property
+    def lines(self) -> Tuple[str, ...]:
+        """All lines, split on first use and shared by every consumer"""
+        if self._lines is None:
+            self._lines = tuple(self.text.split('\n'))
+        return self._lines
+
+    @property
+    def content_hash(self) -> str:
+        """Contract hash, computed once per request"""
+        if self._hash is None:
+            self._hash = compute_contract_hash(self.text)
+        return self._hash
+
+    def blank_long_lines(self, max_length: int) -> "SourceBuffer":
+        """
+        This buffer with lines longer than max_length (minified or flattened
+        code) blanked, or itself when there are none. Line numbers hold.
+        """
+        if max_length <= 0 or all(len(line) <= max_length for line in self.lines):
+            return self
+        return SourceBuffer(
+            '\n'.join('' if len(line) > max_length else line for line in self.lines),
+            self.filename
+        )
+
+    def line(self, line_number: int) -> str:
+        """Text of one line without splitting the whole source"""
+        if self._lines is not None:
+            return self._lines[line_number - 1]
+        start = self._line_starts[line_number - 1]
+        end = self._line_starts[line_number] - 1 if line_number < len(self._line_starts) else len(self.text)
+        return self.text[start:end]
+
+    def line_of(self, offset: int) -> int:
+        """Line number containing a character offset, by binary search"""
+        return bisect.bisect_right(self._line_starts, offset)
+
+    def offset_of(self, line_number: int) -> int:
+        """Character offset where a line starts"""
+        return self._line_starts[line_number - 1]
+
+    def span(self, start_line: int, end_line: int) -> str:
+        """Text of an inclusive line range"""
+        start = self._line_starts[start_line - 1]
+        end = self._line_starts[end_line] - 1 if end_line < len(self._line_starts) else len(self.text)
+        return self.text[start:end]
@@ -0,0 +1,38 @@
+import difflib
+from typing import Dict, List, Tuple, Union
+
+from app.utils.source_buffer import SourceBuffer
+
+def map_unchanged_lines(old_code: Union[str, SourceBuffer],
+                        new_code: Union[str, SourceBuffer]) -> Tuple[Dict[int, int], List[Tuple[int, int]]]:
+    """
+    Diff two sources line by line.
+
+    Returns a mapping of unchanged old line numbers to new line numbers and the
+    inclusive (start, end) ranges of new lines that were added or modified.
+    A deletion counts as a change to the new lines on either side of it, so
+    sources that differ always have at least one changed range. Line numbers
+    are 1-based.
+    """
+    old_lines = SourceBuffer.of(old_code).lines
+    new_lines = SourceBuffer.of(new_code).lines
+
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    line_map: Dict[int, int] = {}
+    changed_ranges: List[Tuple[int, int]] = []
+    next_old_line = 0
+    next_new_line = 0
+
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        if new_start > next_new_line:
+            changed_ranges.append((next_new_line + 1, new_start))
+        elif old_start > next_old_line:
+            # Lines removed between new lines new_start and new_start + 1
+            changed_ranges.append((max(1, new_start), max(1, min(new_start + 1, len(new_lines)))))
+        for offset in range(size):
+            line_map[old_start + offset + 1] = new_start + offset + 1
+        next_old_line = old_start + size
+        next_new_line = new_start + size
+
+    return line_map, changed_ranges
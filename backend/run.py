@@ -5,18 +5,124 @@ Smart Contract AI Auditor - Backend Runner
 
 import os
 import sys
+import gc
+import time
+import signal
+import socket
+import subprocess
 import uvicorn
 from dotenv import load_dotenv
 
 # Add the app directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
+def print_import_profile(top: int = 25):
+    """Print the slowest imports of the application using python -X importtime"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True
+    )
+    
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "Import failed")
+        sys.exit(1)
+    
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        entries.append((int(cumulative_us), int(self_us), module.rstrip()))
+    
+    total = max((cumulative for cumulative, _, _ in entries), default=0)
+    print(f"⏱️  Import profile for app.main (total {total / 1000:.1f} ms)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, self_us, module in sorted(entries, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}")
+
+def serve_preforked(config: dict, workers: int):
+    """
+    Import the app and build its services once in this master process, then
+    fork workers that share the read-only structures copy-on-write.
+    uvicorn's own multi-worker mode spawns fresh interpreters instead.
+    Workers that exit unexpectedly are replaced by fresh forks.
+    """
+    from app.main import create_app
+    app = create_app()
+    
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((config['host'], config['port']))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    
+    # Move everything built so far out of the GC's reach so collections in
+    # workers do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    
+    def spawn_worker() -> int:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            server = uvicorn.Server(uvicorn.Config(
+                app,
+                log_level=config['log_level'],
+                access_log=config['access_log']
+            ))
+            server.run(sockets=[sock])
+            os._exit(0)
+        return pid
+    
+    # Worker pid -> time it was started
+    children = {}
+    stopping = False
+    
+    def stop_workers(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+    
+    for _ in range(workers):
+        children[spawn_worker()] = time.monotonic()
+    
+    # Replace workers that exit unexpectedly until asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; starting a replacement")
+        # A worker that dies right away would otherwise be respawned in a tight loop
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        if not stopping:
+            children[spawn_worker()] = time.monotonic()
+
 def main():
     """Main entry point for the application"""
     
     # Load environment variables
     load_dotenv()
     
+    if '--profile-imports' in sys.argv:
+        print_import_profile()
+        return
+    
     # Check for required environment variables
     required_vars = ['OPENAI_API_KEY']
     missing_vars = []
@@ -36,9 +142,10 @@ def main():
     
     # Configuration
     config = {
-        'app': 'app.main:app',
-        'host': '0.0.0.0',
-        'port': 8000,
+        'app': 'app.main:create_app',
+        'factory': True,
+        'host': os.getenv('HOST', '0.0.0.0'),
+        'port': int(os.getenv('PORT', '8000')),
         'reload': True,
         'log_level': 'info',
         'access_log': True
@@ -48,7 +155,7 @@ def main():
     if os.getenv('APP_ENV') == 'production':
         config.update({
             'reload': False,
-            'workers': 4
+            'workers': int(os.getenv('WORKERS', '4'))
         })
     
     print("🚀 Starting Smart Contract AI Auditor Backend...")
@@ -58,12 +165,17 @@ def main():
     print("\n💡 Sample endpoints:")
     print("   POST /analyze - Upload and analyze contracts")
     print("   GET /sample-contracts - Get demo contracts")
+    print("\n⏱️  Import profile: python run.py --profile-imports")
+    print("🔍 Offline scan without the server: python scan.py <path> --format sarif")
     print("\n⚠️  Press Ctrl+C to stop the server")
     print("=" * 50)
     
     try:
-        # Start the server
-        uvicorn.run(**config)
+        # Start the server; preforking shares startup work between workers
+        if config.get('workers', 1) > 1 and hasattr(os, 'fork'):
+            serve_preforked(config, config['workers'])
+        else:
+            uvicorn.run(**config)
     except KeyboardInterrupt:
         print("\n\n🛑 Server stopped by user")
     except Exception as e:
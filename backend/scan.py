@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Smart Contract AI Auditor - Offline Scanner
+
+Scans a tree of Solidity files without the API server. Parsing and pattern
+detection run across a process pool; an optional AI review runs in this
+process with bounded concurrency. Results stream out as JSONL or SARIF.
+
+    python scan.py contracts/ --format sarif --output results.sarif --fail-on HIGH
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from dotenv import load_dotenv
+
+from app.services.solidity_parser import SolidityParser
+from app.services.vulnerability_detector import VulnerabilityDetector
+from app.services.library_index import KnownLibraryIndex
+from app.services.contract_units import ContractUnitAnalyzer
+from app.services.finding_merger import SEVERITY_RANK
+from app.services.token_budget import TokenUsage, current_token_usage
+from app.services.request_profiler import merge_rule_stats
+from app.utils.source_buffer import SourceBuffer
+
+SKIPPED_DIRECTORIES = {'.git', 'node_modules', 'cache', 'artifacts', 'out', '__pycache__'}
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_LEVELS = {
+    "CRITICAL": "error",
+    "HIGH": "error",
+    "MEDIUM": "warning",
+    "LOW": "note",
+    "INFO": "note"
+}
+
+# Per-process services, built once by the pool initializer
+_worker_services: Dict[str, Any] = {}
+
+def init_worker(include_source: bool, profile_rules: bool = False) -> None:
+    """Build the parser, detector and library index once per worker process"""
+    parser = SolidityParser()
+    _worker_services.update({
+        'parser': parser,
+        'unit_analyzer': ContractUnitAnalyzer(parser, VulnerabilityDetector(), workers=0),
+        'library_index': KnownLibraryIndex(),
+        'include_source': include_source,
+        'profile_rules': profile_rules
+    })
+
+def scan_file(path: str, display_path: str) -> Dict[str, Any]:
+    """Parse and pattern-scan one file inside a worker process"""
+    try:
+        with open(path, 'rb') as f:
+            source = SourceBuffer.from_bytes(f.read(), display_path)
+    except (OSError, UnicodeDecodeError) as e:
+        return {"file": display_path, "error": str(e)}
+
+    parser = _worker_services['parser']
+    unit_analyzer = _worker_services['unit_analyzer']
+    library_index = _worker_services['library_index']
+
+    contract_info = parser.parse_contract(source, os.path.basename(path))
+    known_libraries = library_index.find_known_libraries(source)
+    analysis_code = library_index.mask_known_libraries(source, known_libraries)
+
+    # Findings go straight to dicts; no pydantic models are built in workers.
+    # Files already run one per process, so contracts are analyzed inline.
+    unit_analysis = unit_analyzer.analyze_inline(
+        source, analysis_code, contract_info, known_libraries, profile_rules=_worker_services['profile_rules']
+    )
+
+    result = {
+        "file": display_path,
+        "contractHash": source.content_hash,
+        "contractInfo": contract_info.model_dump(),
+        "contracts": unit_analysis.contracts,
+        "knownLibraries": [match.model_dump() for match in known_libraries],
+        "vulnerabilities": unit_analysis.vulnerabilities
+    }
+    if _worker_services['include_source']:
+        result["analysisCode"] = analysis_code.text
+    if unit_analysis.rule_stats is not None:
+        result["ruleStats"] = unit_analysis.rule_stats
+    return result
+
+def iter_solidity_files(paths: List[str]) -> Iterator[tuple]:
+    """Yield (path, display path) for every .sol file under the given paths, lazily"""
+    for root_path in paths:
+        if os.path.isfile(root_path):
+            yield root_path, root_path
+            continue
+
+        for directory, subdirectories, filenames in os.walk(root_path):
+            subdirectories[:] = sorted(d for d in subdirectories if d not in SKIPPED_DIRECTORIES)
+            for filename in sorted(filenames):
+                if filename.endswith('.sol'):
+                    path = os.path.join(directory, filename)
+                    yield path, os.path.relpath(path, root_path)
+
+class JsonlWriter:
+    """One JSON object per scanned file"""
+
+    def __init__(self, output: TextIO):
+        self.output = output
+
+    def write(self, result: Dict[str, Any]) -> None:
+        self.output.write(json.dumps(result, separators=(',', ':')) + "\n")
+        self.output.flush()
+
+    def close(self) -> None:
+        pass
+
+class SarifWriter:
+    """
+    SARIF 2.1.0 log written incrementally. Results are streamed as they arrive
+    and the rule table, which is only known at the end, is written last.
+    """
+
+    def __init__(self, output: TextIO):
+        self.output = output
+        self.rules: Dict[str, Dict[str, Any]] = {}
+        # Files that could not be scanned, reported as tool execution notifications
+        self.notifications: List[Dict[str, Any]] = []
+        self.first_result = True
+        self.output.write(f'{{"version":"2.1.0","$schema":"{SARIF_SCHEMA}","runs":[{{"results":[')
+
+    def write(self, result: Dict[str, Any]) -> None:
+        if result.get("error"):
+            print(f"Scan error in {result['file']}: {result['error']}", file=sys.stderr)
+            self.notifications.append({
+                "level": "error",
+                "message": {"text": f"Scan failed: {result['error']}"},
+                "locations": [{
+                    "physicalLocation": {"artifactLocation": {"uri": result["file"].replace(os.sep, '/')}}
+                }]
+            })
+            return
+
+        for vuln in result["vulnerabilities"]:
+            rule_id = self._rule_id(vuln)
+            self.rules.setdefault(rule_id, {
+                "id": rule_id,
+                "name": vuln["type"],
+                "shortDescription": {"text": vuln["type"]},
+                "helpUri": vuln["references"][0] if vuln.get("references") else None,
+                "properties": {"tags": ["security", vuln["cweId"]] if vuln.get("cweId") else ["security"]}
+            })
+
+            physical_location = {"artifactLocation": {"uri": result["file"].replace(os.sep, '/')}}
+            # Unlocated AI findings (line 0) point at the file alone
+            if vuln["location"]["startLine"] >= 1:
+                physical_location["region"] = {
+                    "startLine": vuln["location"]["startLine"],
+                    "endLine": vuln["location"]["endLine"]
+                }
+
+            sarif_result = {
+                "ruleId": rule_id,
+                "level": SARIF_LEVELS.get(vuln["severity"], "warning"),
+                "message": {"text": f"{vuln['title']}: {vuln['description']}"},
+                "locations": [{"physicalLocation": physical_location}],
+                "partialFingerprints": {"findingId": vuln["id"]},
+                "properties": {
+                    "severity": vuln["severity"],
+                    "security-severity": str(vuln["riskScore"]),
+                    "detectionMethod": vuln["detectionMethod"],
+                    "recommendation": vuln["recommendation"]
+                }
+            }
+
+            self.output.write(("" if self.first_result else ",") + json.dumps(sarif_result, separators=(',', ':')))
+            self.first_result = False
+
+        self.output.flush()
+
+    def close(self) -> None:
+        rules = [
+            {key: value for key, value in rule.items() if value is not None}
+            for rule in self.rules.values()
+        ]
+        driver = {
+            "name": "Smart Contract AI Auditor",
+            "rules": rules
+        }
+        invocations = [{
+            "executionSuccessful": not self.notifications,
+            "toolExecutionNotifications": self.notifications
+        }]
+        self.output.write(
+            f'],"tool":{{"driver":{json.dumps(driver, separators=(",", ":"))}}},'
+            f'"invocations":{json.dumps(invocations, separators=(",", ":"))}}}]}}\n'
+        )
+        self.output.flush()
+
+    def _rule_id(self, vuln: Dict[str, Any]) -> str:
+        """Stable rule id from the vulnerability type"""
+        return ''.join(part.capitalize() for part in vuln["type"].replace('/', ' ').split()) or "Unknown"
+
+class AIReviewer:
+    """Optional AI stage run in the parent process with bounded concurrency"""
+
+    def __init__(self, concurrency: int):
+        from app.services.ai_analyzer import AIAnalyzer
+        from app.services.finding_merger import FindingMerger
+        from app.models.schemas import ContractInfo, VulnerabilityReport
+
+        self.ai_analyzer = AIAnalyzer()
+        self.finding_merger = FindingMerger()
+        self.contract_info_model = ContractInfo
+        self.report_model = VulnerabilityReport
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def review(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Add AI findings to a pattern-scan result and merge duplicates"""
+        analysis_code = result.pop("analysisCode", None)
+        if result.get("error") or analysis_code is None:
+            return result
+
+        contract_info = self.contract_info_model(**result["contractInfo"])
+        token_usage = TokenUsage()
+        current_token_usage.set(token_usage)
+        async with self.slots:
+            ai_analysis = await self.ai_analyzer.analyze_contract(
+                SourceBuffer(analysis_code, result["file"]),
+                os.path.basename(result["file"]),
+                contract_info
+            )
+
+        pattern_vulnerabilities = [self.report_model(**vuln) for vuln in result["vulnerabilities"]]
+        merged = self.finding_merger.merge(ai_analysis["vulnerabilities"] + pattern_vulnerabilities)
+        result["vulnerabilities"] = [vuln.model_dump() for vuln in merged]
+        result["aiModel"] = ai_analysis.get("analysis_metadata", {}).get("model", self.ai_analyzer.model)
+        result["tokenUsage"] = token_usage.report().model_dump()
+        return result
+
+async def run_scan(paths: List[str], writer, workers: int, reviewer: Optional[AIReviewer],
+                   fail_on: Optional[str], rule_stats: Optional[Dict[str, list]] = None) -> Dict[str, int]:
+    """
+    Feed files to the process pool through a bounded window so memory stays
+    flat regardless of tree size, writing each result as soon as it is ready.
+    Per-rule detector cost is added to rule_stats when it is given. A file
+    that fails is written as an error record and does not stop the scan.
+    """
+    loop = asyncio.get_running_loop()
+    window = workers * 4
+    threshold = SEVERITY_RANK.get(fail_on, 0) if fail_on else None
+    totals = {"files": 0, "errors": 0, "findings": 0, "failing": 0}
+    initargs = (reviewer is not None, rule_stats is not None)
+
+    def new_pool(max_workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=initargs)
+
+    # The pool in use is the last one; a worker that dies breaks its pool for good
+    pools = [new_pool(workers)]
+    try:
+        async def scan_in_pool(path: str, display_path: str) -> Dict[str, Any]:
+            pool = pools[-1]
+            try:
+                return await loop.run_in_executor(pool, scan_file, path, display_path)
+            except BrokenProcessPool:
+                # Every file in flight fails with the one that killed the worker: replace
+                # the pool, and rescan this file alone so only the culprit fails again
+                if pools[-1] is pool:
+                    pool.shutdown(wait=False)
+                    pools.append(new_pool(workers))
+                isolated = new_pool(1)
+                try:
+                    return await loop.run_in_executor(isolated, scan_file, path, display_path)
+                finally:
+                    isolated.shutdown(wait=False)
+
+        async def scan_one(path: str, display_path: str) -> Dict[str, Any]:
+            # A file that fails (or kills its worker) becomes an error record; the scan goes on
+            try:
+                result = await scan_in_pool(path, display_path)
+            except Exception as e:
+                return {"file": display_path, "error": f"{type(e).__name__}: {str(e)}"}
+            if reviewer is not None:
+                try:
+                    result = await reviewer.review(result)
+                except Exception as e:
+                    # Pattern findings still stand without the AI review
+                    result.pop("analysisCode", None)
+                    result["aiError"] = f"{type(e).__name__}: {str(e)}"
+                    print(f"AI review error in {display_path}: {result['aiError']}", file=sys.stderr)
+            return result
+
+        def record(result: Dict[str, Any]) -> None:
+            totals["files"] += 1
+            if result.get("error"):
+                totals["errors"] += 1
+            if rule_stats is not None:
+                merge_rule_stats(rule_stats, result.pop("ruleStats", None))
+            for vuln in result.get("vulnerabilities", []):
+                totals["findings"] += 1
+                if threshold is not None and SEVERITY_RANK.get(vuln["severity"], 0) >= threshold:
+                    totals["failing"] += 1
+            writer.write(result)
+
+        pending = set()
+        for path, display_path in iter_solidity_files(paths):
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    record(task.result())
+            pending.add(asyncio.ensure_future(scan_one(path, display_path)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                record(task.result())
+    finally:
+        pools[-1].shutdown()
+
+    return totals
+
+def main():
+    """Command-line entry point"""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Scan Solidity files offline for vulnerabilities")
+    parser.add_argument("paths", nargs="+", help="Files or directories to scan")
+    parser.add_argument("--format", choices=["jsonl", "sarif"], default="jsonl", help="Output format")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scanner processes")
+    parser.add_argument("--ai", action="store_true", help="Also run the AI review on each file")
+    parser.add_argument("--ai-concurrency", type=int, default=4, help="Concurrent AI requests")
+    parser.add_argument("--fail-on", choices=list(SEVERITY_RANK), help="Exit with status 1 on findings at or above this severity")
+    parser.add_argument("--profile-rules", action="store_true", help="Report time spent in each detector rule")
+    args = parser.parse_args()
+
+    if args.ai and not os.getenv('OPENAI_API_KEY'):
+        print("❌ ERROR: --ai requires OPENAI_API_KEY", file=sys.stderr)
+        sys.exit(2)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    writer = SarifWriter(output) if args.format == "sarif" else JsonlWriter(output)
+    reviewer = AIReviewer(args.ai_concurrency) if args.ai else None
+    rule_stats = {} if args.profile_rules else None
+
+    try:
+        totals = asyncio.run(run_scan(args.paths, writer, max(1, args.workers), reviewer, args.fail_on, rule_stats))
+        writer.close()
+    except KeyboardInterrupt:
+        print("\n🛑 Scan stopped by user", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        f"🔍 Scanned {totals['files']} files: {totals['findings']} findings, {totals['errors']} errors",
+        file=sys.stderr
+    )
+
+    if rule_stats:
+        print(f"{'rule':<20}{'total ms':>12}{'runs':>8}{'hits':>8}", file=sys.stderr)
+        for rule, (seconds, runs, hits) in sorted(rule_stats.items(), key=lambda item: item[1][0], reverse=True):
+            print(f"{rule:<20}{seconds * 1000:>12.1f}{int(runs):>8}{int(hits):>8}", file=sys.stderr)
+
+    if totals["failing"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
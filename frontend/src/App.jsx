@@ -1,11 +1,13 @@
-import React, { useState, useCallback } from 'react';
+import React, { useState, useCallback, useMemo } from 'react';
 import { Shield, Upload, FileText, AlertTriangle, CheckCircle, Info } from 'lucide-react';
 import FileUpload from './components/FileUpload';
 import Dashboard from './components/Dashboard';
 import VulnerabilityCard from './components/VulnerabilityCard';
 import RiskScore from './components/RiskScore';
 import ReportViewer from './components/ReportViewer';
+import VirtualList from './components/VirtualList';
 import { analyzeContract, getSampleContracts } from './services/api';
+import { getSeverityCounts, sortBySeverity, generateTextReport, downloadFile } from './utils/report';
 import './App.css';
 
 function App() {
@@ -15,6 +17,13 @@ function App() {
   const [selectedTab, setSelectedTab] = useState('upload');
   const [sampleContracts, setSampleContracts] = useState([]);
 
+  // Derived once per result rather than on every render
+  const severityCounts = useMemo(() => getSeverityCounts(analysisResult), [analysisResult]);
+  const sortedVulnerabilities = useMemo(
+    () => sortBySeverity(analysisResult?.vulnerabilities),
+    [analysisResult]
+  );
+
   // Handle file upload and analysis
   const handleFileAnalysis = useCallback(async (file) => {
     setIsAnalyzing(true);
@@ -255,6 +264,15 @@ function App() {
                 score={analysisResult.overallRiskScore}
                 totalVulnerabilities={analysisResult.totalVulnerabilities}
               />
+
+              {/* Triage note when the AI review was skipped or done with a cheaper model */}
+              {analysisResult.triage && analysisResult.triage.route !== 'full' && (
+                <div className="mt-4 p-3 bg-blue-50 border border-blue-200 rounded-lg text-sm text-blue-800">
+                  {analysisResult.triage.route === 'pattern-only'
+                    ? 'Pattern-only report: static triage found too few risk signals to warrant an AI review.'
+                    : `Light review: static triage found few risk signals, so ${analysisResult.triage.model} reviewed this contract.`}
+                </div>
+              )}
             </div>
 
             {/* Vulnerability Summary */}
@@ -264,11 +282,11 @@ function App() {
               </h3>
               <div className="grid grid-cols-2 md:grid-cols-5 gap-4">
                 {[
-                  { label: 'Critical', count: analysisResult.vulnerabilities.filter(v => v.severity === 'CRITICAL').length, color: 'bg-red-100 text-red-800' },
-                  { label: 'High', count: analysisResult.vulnerabilities.filter(v => v.severity === 'HIGH').length, color: 'bg-orange-100 text-orange-800' },
-                  { label: 'Medium', count: analysisResult.vulnerabilities.filter(v => v.severity === 'MEDIUM').length, color: 'bg-yellow-100 text-yellow-800' },
-                  { label: 'Low', count: analysisResult.vulnerabilities.filter(v => v.severity === 'LOW').length, color: 'bg-blue-100 text-blue-800' },
-                  { label: 'Info', count: analysisResult.vulnerabilities.filter(v => v.severity === 'INFO').length, color: 'bg-gray-100 text-gray-800' }
+                  { label: 'Critical', count: severityCounts.CRITICAL, color: 'bg-red-100 text-red-800' },
+                  { label: 'High', count: severityCounts.HIGH, color: 'bg-orange-100 text-orange-800' },
+                  { label: 'Medium', count: severityCounts.MEDIUM, color: 'bg-yellow-100 text-yellow-800' },
+                  { label: 'Low', count: severityCounts.LOW, color: 'bg-blue-100 text-blue-800' },
+                  { label: 'Info', count: severityCounts.INFO, color: 'bg-gray-100 text-gray-800' }
                 ].map((item, index) => (
                   <div key={index} className="text-center">
                     <div className={`inline-flex items-center justify-center w-12 h-12 rounded-full ${item.color} mb-2`}>
@@ -297,21 +315,18 @@ function App() {
                   </p>
                 </div>
               ) : (
-                <div className="space-y-4">
-                  {analysisResult.vulnerabilities
-                    .sort((a, b) => {
-                      const severityOrder = { 'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3, 'INFO': 4 };
-                      return severityOrder[a.severity] - severityOrder[b.severity];
-                    })
-                    .map((vulnerability, index) => (
+                <VirtualList
+                  items={sortedVulnerabilities}
+                  renderItem={(vulnerability) => (
+                    <div className="pb-4">
                       <VulnerabilityCard
-                        key={index}
                         vulnerability={vulnerability}
                         getSeverityColor={getSeverityColor}
                         getSeverityIcon={getSeverityIcon}
                       />
-                    ))}
-                </div>
+                    </div>
+                  )}
+                />
               )}
             </div>
 
@@ -360,42 +375,11 @@ function App() {
                 </button>
                 <button
                   onClick={() => {
-                    // Create a formatted text report
-                    let report = `SMART CONTRACT SECURITY ANALYSIS REPORT\n`;
-                    report += `==========================================\n\n`;
-                    report += `Contract: ${analysisResult.contractName}\n`;
-                    report += `File: ${analysisResult.fileName}\n`;
-                    report += `Analysis Date: ${new Date(analysisResult.analysisTimestamp).toLocaleString()}\n`;
-                    report += `Overall Risk Score: ${analysisResult.overallRiskScore}/10\n`;
-                    report += `Total Vulnerabilities: ${analysisResult.totalVulnerabilities}\n\n`;
-                    
-                    if (analysisResult.vulnerabilities.length > 0) {
-                      report += `VULNERABILITIES FOUND:\n`;
-                      report += `=====================\n\n`;
-                      
-                      analysisResult.vulnerabilities.forEach((vuln, index) => {
-                        report += `${index + 1}. ${vuln.title}\n`;
-                        report += `   Severity: ${vuln.severity}\n`;
-                        report += `   Type: ${vuln.type}\n`;
-                        report += `   Location: Line ${vuln.location.startLine}`;
-                        if (vuln.location.function) {
-                          report += ` in function ${vuln.location.function}()`;
-                        }
-                        report += `\n`;
-                        report += `   Description: ${vuln.description}\n`;
-                        report += `   Impact: ${vuln.impact}\n`;
-                        report += `   Recommendation: ${vuln.recommendation}\n\n`;
-                      });
-                    } else {
-                      report += `No vulnerabilities detected. Contract appears secure.\n`;
-                    }
-                    
-                    const blob = new Blob([report], { type: 'text/plain' });
-                    const url = URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    a.download = `${analysisResult.contractName}_report.txt`;
-                    a.click();
+                    downloadFile(
+                      generateTextReport(analysisResult),
+                      `${analysisResult.contractName}_report.txt`,
+                      'text/plain'
+                    );
                   }}
                   className="bg-gray-600 text-white px-4 py-2 rounded-md hover:bg-gray-700 transition-colors"
                 >
@@ -1,9 +1,32 @@
 // File: frontend/src/components/Dashboard.jsx
-import React from 'react';
+import React, { useMemo } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { TrendingUp, Shield, AlertTriangle, CheckCircle } from 'lucide-react';
+import { getSeverityCounts } from '../utils/report';
 
 const Dashboard = ({ analysisData }) => {
+  const severityData = useMemo(() => {
+    const counts = getSeverityCounts(analysisData);
+    return [
+      { name: 'Critical', value: counts.CRITICAL, color: '#DC2626' },
+      { name: 'High', value: counts.HIGH, color: '#EA580C' },
+      { name: 'Medium', value: counts.MEDIUM, color: '#D97706' },
+      { name: 'Low', value: counts.LOW, color: '#2563EB' },
+    ].filter(d => d.value > 0);
+  }, [analysisData]);
+
+  const typeData = useMemo(() => {
+    const vulnerabilityTypes = analysisData?.vulnerabilities?.reduce((acc, vuln) => {
+      acc[vuln.type] = (acc[vuln.type] || 0) + 1;
+      return acc;
+    }, {}) || {};
+
+    return Object.entries(vulnerabilityTypes).map(([type, count]) => ({
+      type,
+      count
+    }));
+  }, [analysisData]);
+
   if (!analysisData) {
     return (
       <div className="text-center py-8">
@@ -13,23 +36,6 @@ const Dashboard = ({ analysisData }) => {
     );
   }
 
-  const severityData = [
-    { name: 'Critical', value: analysisData.vulnerabilities?.filter(v => v.severity === 'CRITICAL').length || 0, color: '#DC2626' },
-    { name: 'High', value: analysisData.vulnerabilities?.filter(v => v.severity === 'HIGH').length || 0, color: '#EA580C' },
-    { name: 'Medium', value: analysisData.vulnerabilities?.filter(v => v.severity === 'MEDIUM').length || 0, color: '#D97706' },
-    { name: 'Low', value: analysisData.vulnerabilities?.filter(v => v.severity === 'LOW').length || 0, color: '#2563EB' },
-  ];
-
-  const vulnerabilityTypes = analysisData.vulnerabilities?.reduce((acc, vuln) => {
-    acc[vuln.type] = (acc[vuln.type] || 0) + 1;
-    return acc;
-  }, {}) || {};
-
-  const typeData = Object.entries(vulnerabilityTypes).map(([type, count]) => ({
-    type,
-    count
-  }));
-
   return (
     <div className="space-y-6">
       {/* Stats Overview */}
@@ -93,7 +99,7 @@ const Dashboard = ({ analysisData }) => {
           <ResponsiveContainer width="100%" height={250}>
             <PieChart>
               <Pie
-                data={severityData.filter(d => d.value > 0)}
+                data={severityData}
                 dataKey="value"
                 nameKey="name"
                 cx="50%"
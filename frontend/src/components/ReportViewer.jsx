@@ -1,10 +1,25 @@
-import React, { useState } from 'react';
+import React, { useState, useMemo } from 'react';
 import { Download, Eye, FileText, Share, Printer } from 'lucide-react';
+import VirtualList from './VirtualList';
+import { getSeverityCounts, generateTextReport, downloadFile } from '../utils/report';
+
+const severityBadgeClass = (severity) => (
+  severity === 'CRITICAL' ? 'bg-red-100 text-red-800' :
+  severity === 'HIGH' ? 'bg-orange-100 text-orange-800' :
+  severity === 'MEDIUM' ? 'bg-yellow-100 text-yellow-800' :
+  'bg-blue-100 text-blue-800'
+);
 
 const ReportViewer = ({ analysisResult }) => {
   const [viewMode, setViewMode] = useState('summary');
   const [exportFormat, setExportFormat] = useState('json');
 
+  const severityCounts = useMemo(() => getSeverityCounts(analysisResult), [analysisResult]);
+  const topVulnerabilities = useMemo(
+    () => [...(analysisResult?.vulnerabilities || [])].sort((a, b) => b.riskScore - a.riskScore).slice(0, 5),
+    [analysisResult]
+  );
+
   if (!analysisResult) {
     return (
       <div className="text-center py-8">
@@ -14,69 +29,6 @@ const ReportViewer = ({ analysisResult }) => {
     );
   }
 
-  const generateTextReport = () => {
-    let report = `SMART CONTRACT SECURITY ANALYSIS REPORT\n`;
-    report += `==========================================\n\n`;
-    report += `Contract Name: ${analysisResult.contractName}\n`;
-    report += `File: ${analysisResult.fileName}\n`;
-    report += `Analysis Date: ${new Date(analysisResult.analysisTimestamp).toLocaleString()}\n`;
-    report += `Overall Risk Score: ${analysisResult.overallRiskScore}/10\n`;
-    report += `Total Vulnerabilities: ${analysisResult.totalVulnerabilities}\n\n`;
-    
-    // Contract Information
-    report += `CONTRACT INFORMATION:\n`;
-    report += `====================\n`;
-    report += `Lines of Code: ${analysisResult.contractInfo?.linesOfCode || 'N/A'}\n`;
-    report += `Complexity: ${analysisResult.contractInfo?.complexity || 'N/A'}\n`;
-    report += `Functions: ${analysisResult.contractInfo?.functions?.length || 0}\n`;
-    report += `State Variables: ${analysisResult.contractInfo?.stateVariables?.length || 0}\n`;
-    report += `Events: ${analysisResult.contractInfo?.events?.length || 0}\n`;
-    report += `Modifiers: ${analysisResult.contractInfo?.modifiers?.length || 0}\n\n`;
-    
-    // Vulnerabilities
-    if (analysisResult.vulnerabilities && analysisResult.vulnerabilities.length > 0) {
-      report += `VULNERABILITIES FOUND:\n`;
-      report += `=====================\n\n`;
-      
-      analysisResult.vulnerabilities.forEach((vuln, index) => {
-        report += `${index + 1}. ${vuln.title}\n`;
-        report += `   Severity: ${vuln.severity}\n`;
-        report += `   Type: ${vuln.type}\n`;
-        report += `   Risk Score: ${vuln.riskScore}/10\n`;
-        report += `   Location: Line ${vuln.location.startLine}`;
-        if (vuln.location.function) {
-          report += ` in function ${vuln.location.function}()`;
-        }
-        report += `\n`;
-        report += `   Description: ${vuln.description}\n`;
-        report += `   Impact: ${vuln.impact}\n`;
-        report += `   Recommendation: ${vuln.recommendation}\n`;
-        if (vuln.potentialLoss) {
-          report += `   Potential Loss: ${vuln.potentialLoss}\n`;
-        }
-        report += `\n`;
-      });
-    } else {
-      report += `No vulnerabilities detected. Contract appears secure.\n\n`;
-    }
-    
-    // AI Insights
-    if (analysisResult.aiInsights && analysisResult.aiInsights.length > 0) {
-      report += `AI INSIGHTS:\n`;
-      report += `============\n\n`;
-      
-      analysisResult.aiInsights.forEach((insight, index) => {
-        report += `${index + 1}. ${insight.category}: ${insight.insight}\n`;
-        report += `   Confidence: ${Math.round(insight.confidence * 100)}%\n\n`;
-      });
-    }
-    
-    report += `Report generated by Smart Contract AI Auditor\n`;
-    report += `Visit: https://smartcontractauditor.com\n`;
-    
-    return report;
-  };
-
   const downloadReport = () => {
     let content, filename, mimeType;
     
@@ -87,7 +39,7 @@ const ReportViewer = ({ analysisResult }) => {
         mimeType = 'application/json';
         break;
       case 'txt':
-        content = generateTextReport();
+        content = generateTextReport(analysisResult);
         filename = `${analysisResult.contractName}_report.txt`;
         mimeType = 'text/plain';
         break;
@@ -95,15 +47,7 @@ const ReportViewer = ({ analysisResult }) => {
         return;
     }
     
-    const blob = new Blob([content], { type: mimeType });
-    const url = URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = filename;
-    document.body.appendChild(a);
-    a.click();
-    document.body.removeChild(a);
-    URL.revokeObjectURL(url);
+    downloadFile(content, filename, mimeType);
   };
 
   const shareReport = async () => {
@@ -276,13 +220,13 @@ const ReportViewer = ({ analysisResult }) => {
                 <div className="flex justify-between">
                   <dt className="text-gray-600">Critical:</dt>
                   <dd className="text-red-600 font-medium">
-                    {analysisResult.vulnerabilities.filter(v => v.severity === 'CRITICAL').length}
+                    {severityCounts.CRITICAL}
                   </dd>
                 </div>
                 <div className="flex justify-between">
                   <dt className="text-gray-600">High:</dt>
                   <dd className="text-orange-600 font-medium">
-                    {analysisResult.vulnerabilities.filter(v => v.severity === 'HIGH').length}
+                    {severityCounts.HIGH}
                   </dd>
                 </div>
               </dl>
@@ -293,28 +237,20 @@ const ReportViewer = ({ analysisResult }) => {
           <div>
             <h4 className="font-medium text-gray-900 mb-3">Top Security Issues</h4>
             <div className="space-y-2">
-              {analysisResult.vulnerabilities
-                .sort((a, b) => b.riskScore - a.riskScore)
-                .slice(0, 5)
-                .map((vuln, index) => (
-                  <div key={index} className="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
-                    <div>
-                      <span className="font-medium text-gray-900">{vuln.title}</span>
-                      <span className="text-sm text-gray-600 ml-2">({vuln.type})</span>
-                    </div>
-                    <div className="flex items-center space-x-2">
-                      <span className={`inline-flex items-center px-2 py-1 rounded-full text-xs font-medium ${
-                        vuln.severity === 'CRITICAL' ? 'bg-red-100 text-red-800' :
-                        vuln.severity === 'HIGH' ? 'bg-orange-100 text-orange-800' :
-                        vuln.severity === 'MEDIUM' ? 'bg-yellow-100 text-yellow-800' :
-                        'bg-blue-100 text-blue-800'
-                      }`}>
-                        {vuln.severity}
-                      </span>
-                      <span className="text-sm text-gray-600">{vuln.riskScore}/10</span>
-                    </div>
+              {topVulnerabilities.map((vuln, index) => (
+                <div key={index} className="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
+                  <div>
+                    <span className="font-medium text-gray-900">{vuln.title}</span>
+                    <span className="text-sm text-gray-600 ml-2">({vuln.type})</span>
                   </div>
-                ))}
+                  <div className="flex items-center space-x-2">
+                    <span className={`inline-flex items-center px-2 py-1 rounded-full text-xs font-medium ${severityBadgeClass(vuln.severity)}`}>
+                      {vuln.severity}
+                    </span>
+                    <span className="text-sm text-gray-600">{vuln.riskScore}/10</span>
+                  </div>
+                </div>
+              ))}
             </div>
           </div>
           
@@ -361,10 +297,10 @@ Modifiers: ${analysisResult.contractInfo?.modifiers?.join(', ') || 'N/A'}
 Risk Assessment:
 - Overall Risk Score: ${analysisResult.overallRiskScore}/10
 - Total Vulnerabilities: ${analysisResult.totalVulnerabilities}
-- Critical: ${analysisResult.vulnerabilities.filter(v => v.severity === 'CRITICAL').length}
-- High: ${analysisResult.vulnerabilities.filter(v => v.severity === 'HIGH').length}
-- Medium: ${analysisResult.vulnerabilities.filter(v => v.severity === 'MEDIUM').length}
-- Low: ${analysisResult.vulnerabilities.filter(v => v.severity === 'LOW').length}`}
+- Critical: ${severityCounts.CRITICAL}
+- High: ${severityCounts.HIGH}
+- Medium: ${severityCounts.MEDIUM}
+- Low: ${severityCounts.LOW}`}
               </pre>
             </div>
           </div>
@@ -373,67 +309,66 @@ Risk Assessment:
           {analysisResult.vulnerabilities && analysisResult.vulnerabilities.length > 0 && (
             <div className="mb-8">
               <h4 className="font-medium text-gray-900 mb-3">Vulnerability Details</h4>
-              <div className="space-y-6">
-                {analysisResult.vulnerabilities.map((vuln, index) => (
-                  <div key={index} className="border border-gray-200 rounded-lg p-4">
-                    <div className="flex items-center justify-between mb-3">
-                      <h5 className="font-medium text-gray-900">{index + 1}. {vuln.title}</h5>
-                      <span className={`inline-flex items-center px-2 py-1 rounded-full text-xs font-medium ${
-                        vuln.severity === 'CRITICAL' ? 'bg-red-100 text-red-800' :
-                        vuln.severity === 'HIGH' ? 'bg-orange-100 text-orange-800' :
-                        vuln.severity === 'MEDIUM' ? 'bg-yellow-100 text-yellow-800' :
-                        'bg-blue-100 text-blue-800'
-                      }`}>
-                        {vuln.severity}
-                      </span>
-                    </div>
-                    
-                    <dl className="grid grid-cols-1 md:grid-cols-2 gap-4 text-sm">
-                      <div>
-                        <dt className="font-medium text-gray-900">Type:</dt>
-                        <dd className="text-gray-700">{vuln.type}</dd>
+              <VirtualList
+                items={analysisResult.vulnerabilities}
+                estimatedItemHeight={320}
+                renderItem={(vuln, index) => (
+                  <div className="pb-6">
+                    <div className="border border-gray-200 rounded-lg p-4">
+                      <div className="flex items-center justify-between mb-3">
+                        <h5 className="font-medium text-gray-900">{index + 1}. {vuln.title}</h5>
+                        <span className={`inline-flex items-center px-2 py-1 rounded-full text-xs font-medium ${severityBadgeClass(vuln.severity)}`}>
+                          {vuln.severity}
+                        </span>
                       </div>
-                      <div>
-                        <dt className="font-medium text-gray-900">Risk Score:</dt>
-                        <dd className="text-gray-700">{vuln.riskScore}/10</dd>
-                      </div>
-                      <div>
-                        <dt className="font-medium text-gray-900">Location:</dt>
-                        <dd className="text-gray-700">
-                          Line {vuln.location.startLine}
-                          {vuln.location.startLine !== vuln.location.endLine && `-${vuln.location.endLine}`}
-                          {vuln.location.function && ` in ${vuln.location.function}()`}
-                        </dd>
-                      </div>
-                      <div>
-                        <dt className="font-medium text-gray-900">Detection Method:</dt>
-                        <dd className="text-gray-700">{vuln.detectionMethod}</dd>
-                      </div>
-                    </dl>
-                    
-                    <div className="mt-4 space-y-3">
-                      <div>
-                        <dt className="font-medium text-gray-900 mb-1">Description:</dt>
-                        <dd className="text-gray-700 text-sm">{vuln.description}</dd>
-                      </div>
-                      <div>
-                        <dt className="font-medium text-gray-900 mb-1">Impact:</dt>
-                        <dd className="text-gray-700 text-sm">{vuln.impact}</dd>
-                      </div>
-                      <div>
-                        <dt className="font-medium text-gray-900 mb-1">Recommendation:</dt>
-                        <dd className="text-gray-700 text-sm">{vuln.recommendation}</dd>
-                      </div>
-                      {vuln.potentialLoss && (
+                      
+                      <dl className="grid grid-cols-1 md:grid-cols-2 gap-4 text-sm">
                         <div>
-                          <dt className="font-medium text-gray-900 mb-1">Potential Loss:</dt>
-                          <dd className="text-red-700 text-sm font-medium">{vuln.potentialLoss}</dd>
+                          <dt className="font-medium text-gray-900">Type:</dt>
+                          <dd className="text-gray-700">{vuln.type}</dd>
                         </div>
-                      )}
+                        <div>
+                          <dt className="font-medium text-gray-900">Risk Score:</dt>
+                          <dd className="text-gray-700">{vuln.riskScore}/10</dd>
+                        </div>
+                        <div>
+                          <dt className="font-medium text-gray-900">Location:</dt>
+                          <dd className="text-gray-700">
+                            {vuln.location.startLine > 0 ? `Line ${vuln.location.startLine}` : 'Line not given'}
+                            {vuln.location.startLine !== vuln.location.endLine && `-${vuln.location.endLine}`}
+                            {vuln.location.function && ` in ${vuln.location.function}()`}
+                          </dd>
+                        </div>
+                        <div>
+                          <dt className="font-medium text-gray-900">Detection Method:</dt>
+                          <dd className="text-gray-700">{vuln.detectionMethod}</dd>
+                        </div>
+                      </dl>
+                      
+                      <div className="mt-4 space-y-3">
+                        <div>
+                          <dt className="font-medium text-gray-900 mb-1">Description:</dt>
+                          <dd className="text-gray-700 text-sm">{vuln.description}</dd>
+                        </div>
+                        <div>
+                          <dt className="font-medium text-gray-900 mb-1">Impact:</dt>
+                          <dd className="text-gray-700 text-sm">{vuln.impact}</dd>
+                        </div>
+                        <div>
+                          <dt className="font-medium text-gray-900 mb-1">Recommendation:</dt>
+                          <dd className="text-gray-700 text-sm">{vuln.recommendation}</dd>
+                        </div>
+                        {vuln.potentialLoss && (
+                          <div>
+                            <dt className="font-medium text-gray-900 mb-1">Potential Loss:</dt>
+                            <dd className="text-red-700 text-sm font-medium">{vuln.potentialLoss}</dd>
+                          </div>
+                        )}
+                      </div>
                     </div>
                   </div>
-                ))}
-              </div>
+                )}
+              />
             </div>
           )}
           
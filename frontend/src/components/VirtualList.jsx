@@ -0,0 +1,115 @@
+import React, { useState, useRef, useMemo, useEffect, useCallback } from 'react';
+
+// Index of the last offset at or before position (offsets are ascending)
+const findIndex = (offsets, position) => {
+  let low = 0;
+  let high = offsets.length - 1;
+  while (low < high) {
+    const mid = Math.ceil((low + high) / 2);
+    if (offsets[mid] <= position) {
+      low = mid;
+    } else {
+      high = mid - 1;
+    }
+  }
+  return low;
+};
+
+const MeasuredRow = ({ rowKey, observer, children }) => {
+  const ref = useRef(null);
+
+  useEffect(() => {
+    const node = ref.current;
+    if (!node || !observer) {
+      return undefined;
+    }
+    observer.observe(node);
+    return () => observer.unobserve(node);
+  }, [observer]);
+
+  return (
+    <div ref={ref} data-row-key={rowKey}>
+      {children}
+    </div>
+  );
+};
+
+/**
+ * Scrollable list that only mounts the rows in view (plus a few either side).
+ * Rows may differ in height and change size, e.g. when a card expands: each
+ * mounted row is measured and unmeasured rows are assumed estimatedItemHeight.
+ */
+const VirtualList = ({
+  items,
+  renderItem,
+  getKey = (item, index) => index,
+  estimatedItemHeight = 160,
+  height = 640,
+  overscan = 4,
+  className = ''
+}) => {
+  const [scrollTop, setScrollTop] = useState(0);
+  const [measureVersion, setMeasureVersion] = useState(0);
+  const heights = useRef(new Map());
+  const [observer, setObserver] = useState(null);
+
+  useEffect(() => {
+    if (typeof ResizeObserver === 'undefined') {
+      return undefined;
+    }
+    const resizeObserver = new ResizeObserver((entries) => {
+      let changed = false;
+      entries.forEach((entry) => {
+        const key = entry.target.dataset.rowKey;
+        const measured = entry.target.offsetHeight;
+        if (heights.current.get(key) !== measured) {
+          heights.current.set(key, measured);
+          changed = true;
+        }
+      });
+      if (changed) {
+        setMeasureVersion((version) => version + 1);
+      }
+    });
+    setObserver(resizeObserver);
+    return () => resizeObserver.disconnect();
+  }, []);
+
+  const keys = useMemo(() => items.map((item, index) => String(getKey(item, index))), [items, getKey]);
+
+  // offsets[i] is the top of row i; offsets[items.length] is the full height
+  const offsets = useMemo(() => {
+    const tops = new Array(keys.length + 1);
+    tops[0] = 0;
+    keys.forEach((key, index) => {
+      tops[index + 1] = tops[index] + (heights.current.get(key) ?? estimatedItemHeight);
+    });
+    return tops;
+    // measureVersion invalidates the offsets when a row is (re)measured
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [keys, estimatedItemHeight, measureVersion]);
+
+  const handleScroll = useCallback((event) => setScrollTop(event.currentTarget.scrollTop), []);
+
+  const start = Math.max(0, findIndex(offsets, scrollTop) - overscan);
+  const end = Math.min(items.length, findIndex(offsets, scrollTop + height) + 1 + overscan);
+  const totalHeight = offsets[items.length];
+
+  return (
+    <div
+      className={className}
+      style={{ maxHeight: height, overflowY: 'auto' }}
+      onScroll={handleScroll}
+    >
+      <div style={{ paddingTop: offsets[start], paddingBottom: totalHeight - offsets[end] }}>
+        {items.slice(start, end).map((item, offset) => (
+          <MeasuredRow key={keys[start + offset]} rowKey={keys[start + offset]} observer={observer}>
+            {renderItem(item, start + offset)}
+          </MeasuredRow>
+        ))}
+      </div>
+    </div>
+  );
+};
+
+export default VirtualList;
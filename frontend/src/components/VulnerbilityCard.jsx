@@ -53,7 +53,8 @@ const VulnerabilityCard = ({ vulnerability, getSeverityColor, getSeverityIcon })
               <div className="flex items-center">
                 <span className="font-medium">Location:</span>
                 <span className="ml-1">
-                  {vulnerability.location.file} (Line {vulnerability.location.startLine}
+                  {vulnerability.location.file} ({vulnerability.location.startLine > 0
+                    ? `Line ${vulnerability.location.startLine}` : 'line not given'}
                   {vulnerability.location.startLine !== vulnerability.location.endLine && 
                     `-${vulnerability.location.endLine}`}
                   {vulnerability.location.function && ` in ${vulnerability.location.function}()`})
@@ -236,7 +237,8 @@ Type: ${vulnerability.type}
 Risk Score: ${vulnerability.riskScore}/10
 
 Location: 
-${vulnerability.location.file} (Lines ${vulnerability.location.startLine}-${vulnerability.location.endLine})
+${vulnerability.location.file} (${vulnerability.location.startLine > 0
+  ? `Lines ${vulnerability.location.startLine}-${vulnerability.location.endLine}` : 'line not given'})
 ${vulnerability.location.function ? `Function: ${vulnerability.location.function}()` : ''}
 
 Description:
@@ -52,9 +52,13 @@ api.interceptors.response.use(
 /**
  * Analyze a smart contract file
  * @param {File} file - The contract file to analyze
+ * @param {Object} [options] - Analysis options
+ * @param {string} [options.analysisType] - 'quick', 'comprehensive' or 'deep'
+ * @param {boolean} [options.includeGasAnalysis] - Report gas issues
+ * @param {boolean} [options.includeBusinessLogic] - Report business logic errors
  * @returns {Promise<Object>} Analysis results
  */
-export const analyzeContract = async (file) => {
+export const analyzeContract = async (file, options = {}) => {
   try {
     // Validate file before sending
     if (!file) {
@@ -72,6 +76,11 @@ export const analyzeContract = async (file) => {
     // Create FormData for file upload
     const formData = new FormData();
     formData.append('file', file);
+    Object.entries(options).forEach(([key, value]) => {
+      if (value !== undefined) {
+        formData.append(key, String(value));
+      }
+    });
 
     // Make request with proper headers for file upload
     const response = await api.post('/analyze', formData, {
@@ -99,6 +108,90 @@ export const analyzeContract = async (file) => {
   }
 };
 
+/**
+ * Analyze a smart contract file, receiving findings as soon as they are known
+ * @param {File} file - The contract file to analyze
+ * @param {Object} [options] - Analysis options, as for analyzeContract
+ * @param {Function} [onVulnerability] - Called with each finding as it streams in
+ * @returns {Promise<Object>} Analysis results
+ */
+export const analyzeContractStream = async (file, options = {}, onVulnerability = () => {}) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  Object.entries(options).forEach(([key, value]) => {
+    if (value !== undefined) {
+      formData.append(key, String(value));
+    }
+  });
+
+  const response = await fetch(`${api.defaults.baseURL}/analyze/stream`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || 'Analysis failed. Please try again.');
+  }
+
+  // Newline-delimited JSON events: findings first, then the full result
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  let result = null;
+
+  const handleLine = (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    const { event, data } = JSON.parse(line);
+    if (event === 'vulnerability') {
+      onVulnerability(data);
+    } else if (event === 'result') {
+      result = data;
+    } else if (event === 'error') {
+      throw new Error(data.detail);
+    }
+  };
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split('\n');
+    buffered = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffered);
+
+  if (!result) {
+    throw new Error('Invalid response from server');
+  }
+  return result;
+};
+
+/**
+ * Get one page of a stored analysis's findings, most severe first
+ * @param {number} analysisId - analysisId of a persisted analysis result
+ * @param {Object} [options] - Filters and paging
+ * @param {string} [options.severity] - Only findings of this severity
+ * @param {string} [options.type] - Only findings of this vulnerability type
+ * @param {number} [options.offset] - Findings to skip
+ * @param {number} [options.limit] - Findings per page (max 500)
+ * @returns {Promise<Object>} Page with total, offset, limit and vulnerabilities
+ */
+export const getFindings = async (analysisId, options = {}) => {
+  try {
+    const response = await api.get(`/history/${analysisId}/findings`, { params: options });
+    return response.data;
+  } catch (error) {
+    console.error('Failed to fetch findings:', error);
+    throw new Error('Failed to load findings');
+  }
+};
+
 /**
  * Get sample vulnerable contracts
  * @returns {Promise<Object>} List of sample contracts
@@ -175,6 +268,8 @@ export { api };
 // Default export
 export default {
   analyzeContract,
+  analyzeContractStream,
+  getFindings,
   getSampleContracts,
   getSampleContract,
   healthCheck,
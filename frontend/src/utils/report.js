@@ -0,0 +1,140 @@
+// Helpers shared by the views that summarize or export an analysis result
+
+export const SEVERITY_ORDER = { CRITICAL: 0, HIGH: 1, MEDIUM: 2, LOW: 3, INFO: 4 };
+
+/**
+ * Findings per severity. Uses the counts computed by the server and only
+ * counts the list itself (in one pass) for results that lack them.
+ * @param {Object} analysisResult - Analysis response
+ * @returns {{CRITICAL: number, HIGH: number, MEDIUM: number, LOW: number, INFO: number}}
+ */
+export const getSeverityCounts = (analysisResult) => {
+  const vulnerabilities = analysisResult?.vulnerabilities || [];
+  const serverCounts = {
+    CRITICAL: analysisResult?.criticalCount || 0,
+    HIGH: analysisResult?.highCount || 0,
+    MEDIUM: analysisResult?.mediumCount || 0,
+    LOW: analysisResult?.lowCount || 0,
+    INFO: analysisResult?.infoCount || 0,
+  };
+  const serverTotal = Object.values(serverCounts).reduce((sum, count) => sum + count, 0);
+  if (serverTotal === vulnerabilities.length) {
+    return serverCounts;
+  }
+
+  const counts = { CRITICAL: 0, HIGH: 0, MEDIUM: 0, LOW: 0, INFO: 0 };
+  vulnerabilities.forEach((vuln) => {
+    if (vuln.severity in counts) {
+      counts[vuln.severity] += 1;
+    }
+  });
+  return counts;
+};
+
+/**
+ * Copy of the findings ordered most severe first, then by risk score
+ * @param {Array} vulnerabilities - Findings to sort (left unmodified)
+ * @returns {Array} Sorted copy
+ */
+export const sortBySeverity = (vulnerabilities = []) => (
+  [...vulnerabilities].sort((a, b) => (
+    (SEVERITY_ORDER[a.severity] ?? 5) - (SEVERITY_ORDER[b.severity] ?? 5) || b.riskScore - a.riskScore
+  ))
+);
+
+/**
+ * Plain-text report of an analysis result. Lines are collected and joined
+ * once, so reports with thousands of findings build in linear time.
+ * @param {Object} analysisResult - Analysis response
+ * @returns {string} Report text
+ */
+export const generateTextReport = (analysisResult) => {
+  const lines = [
+    'SMART CONTRACT SECURITY ANALYSIS REPORT',
+    '==========================================',
+    '',
+    `Contract Name: ${analysisResult.contractName}`,
+    `File: ${analysisResult.fileName}`,
+    `Analysis Date: ${new Date(analysisResult.analysisTimestamp).toLocaleString()}`,
+    `Overall Risk Score: ${analysisResult.overallRiskScore}/10`,
+    `Total Vulnerabilities: ${analysisResult.totalVulnerabilities}`,
+    '',
+  ];
+
+  // Contract Information
+  lines.push(
+    'CONTRACT INFORMATION:',
+    '====================',
+    `Lines of Code: ${analysisResult.contractInfo?.linesOfCode || 'N/A'}`,
+    `Complexity: ${analysisResult.contractInfo?.complexity || 'N/A'}`,
+    `Functions: ${analysisResult.contractInfo?.functions?.length || 0}`,
+    `State Variables: ${analysisResult.contractInfo?.stateVariables?.length || 0}`,
+    `Events: ${analysisResult.contractInfo?.events?.length || 0}`,
+    `Modifiers: ${analysisResult.contractInfo?.modifiers?.length || 0}`,
+    '',
+  );
+
+  // Vulnerabilities
+  if (analysisResult.vulnerabilities && analysisResult.vulnerabilities.length > 0) {
+    lines.push('VULNERABILITIES FOUND:', '=====================', '');
+
+    analysisResult.vulnerabilities.forEach((vuln, index) => {
+      // Line 0: the AI reported the finding without a location
+      const line = vuln.location.startLine > 0 ? `Line ${vuln.location.startLine}` : 'Line not given';
+      const location = vuln.location.function
+        ? `${line} in function ${vuln.location.function}()`
+        : line;
+      lines.push(
+        `${index + 1}. ${vuln.title}`,
+        `   Severity: ${vuln.severity}`,
+        `   Type: ${vuln.type}`,
+        `   Risk Score: ${vuln.riskScore}/10`,
+        `   Location: ${location}`,
+        `   Description: ${vuln.description}`,
+        `   Impact: ${vuln.impact}`,
+        `   Recommendation: ${vuln.recommendation}`,
+      );
+      if (vuln.potentialLoss) {
+        lines.push(`   Potential Loss: ${vuln.potentialLoss}`);
+      }
+      lines.push('');
+    });
+  } else {
+    lines.push('No vulnerabilities detected. Contract appears secure.', '');
+  }
+
+  // AI Insights
+  if (analysisResult.aiInsights && analysisResult.aiInsights.length > 0) {
+    lines.push('AI INSIGHTS:', '============', '');
+
+    analysisResult.aiInsights.forEach((insight, index) => {
+      lines.push(
+        `${index + 1}. ${insight.category}: ${insight.insight}`,
+        `   Confidence: ${Math.round(insight.confidence * 100)}%`,
+        '',
+      );
+    });
+  }
+
+  lines.push('Report generated by Smart Contract AI Auditor', 'Visit: https://smartcontractauditor.com', '');
+
+  return lines.join('\n');
+};
+
+/**
+ * Save text content as a file download
+ * @param {string} content - File content
+ * @param {string} filename - Suggested file name
+ * @param {string} mimeType - Content type
+ */
+export const downloadFile = (content, filename, mimeType) => {
+  const blob = new Blob([content], { type: mimeType });
+  const url = URL.createObjectURL(blob);
+  const a = document.createElement('a');
+  a.href = url;
+  a.download = filename;
+  document.body.appendChild(a);
+  a.click();
+  document.body.removeChild(a);
+  URL.revokeObjectURL(url);
+};